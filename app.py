@@ -6,9 +6,14 @@ Main Flask application that serves as entry point for all training types.
 Provides landing page with training type selection and registers blueprints
 for each training type.
 """
-from flask import Flask, render_template, send_file
+from flask import Flask, make_response, render_template
+from werkzeug.security import safe_join
 import os
 from config import Config
+from modules.upload_store import StreamingUploadRequest
+from modules.file_serving import serve_file, serve_static, static_url_defaults
+from modules.instrumentation import start_request_trace, finish_request_trace
+from modules.structured_logging import get_logger, configure_logging
 
 # Import training type blueprints
 from trainings.type_a.routes import type_a_bp
@@ -17,8 +22,21 @@ from trainings.type_c.routes import type_c_bp
 from trainings.type_d.routes import type_d_bp
 
 app = Flask(__name__)
+# Hash, type-check and store uploaded file parts while the body is parsed (see upload_store)
+app.request_class = StreamingUploadRequest
 app.config.from_object(Config)
 Config.init_app(app)
+# Flask's own log records go through the structured log queue as well
+configure_logging(app)
+log = get_logger(__name__)
+
+# Time each request and its report stages: Server-Timing header, slow-request log, /metrics
+app.before_request(start_request_trace)
+app.after_request(finish_request_trace)
+
+# Static files: content-versioned URLs (?v=<hash>) served as immutable, with ETags and ranges
+app.view_functions['static'] = serve_static
+app.url_defaults(static_url_defaults)
 
 # Register blueprints for each training type
 app.register_blueprint(type_a_bp, url_prefix='/type-a')
@@ -26,6 +44,21 @@ app.register_blueprint(type_b_bp, url_prefix='/type-b')
 app.register_blueprint(type_c_bp, url_prefix='/type-c')
 app.register_blueprint(type_d_bp, url_prefix='/type-d')
 
+# Generate reports on background worker threads fed by the shared job queue
+if Config.ASYNC_JOBS:
+    from modules.job_queue import job_queue
+    job_queue.start(app)
+
+# Expire and evict old reports and uploads to stay within the storage quota
+if Config.STORAGE_RETENTION_ENABLED:
+    from modules.retention import storage_manager
+    storage_manager.start()
+
+# Heavy dependencies load on first use; optionally warm them up off the request path
+if Config.WARMUP_ON_STARTUP:
+    from modules.warmup import start_background_warm_up
+    start_background_warm_up()
+
 # File size and upload validation
 @app.before_request
 def limit_remote_addr():
@@ -35,6 +68,10 @@ def limit_remote_addr():
         abort(413)  # Request Entity Too Large
 
 # Register error handlers
+@app.errorhandler(400)
+def bad_request(error):
+    return render_template('error.html', error=error.description), 400
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('error.html', error="Page not found"), 404
@@ -45,7 +82,18 @@ def internal_error(error):
 
 @app.errorhandler(413)
 def file_too_large(error):
-    return render_template('error.html', error="File too large"), 413
+    return render_template('error.html', error=f"Upload too large: {error.description}"), 413
+
+@app.errorhandler(415)
+def unsupported_file_type(error):
+    return render_template('error.html', error=f"Unsupported file type: {error.description}"), 415
+
+@app.errorhandler(503)
+def service_unavailable(error):
+    response = make_response(render_template('error.html', error=error.description), 503)
+    if getattr(error, 'retry_after', None) is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
 # Add security headers for production
 @app.after_request
@@ -58,35 +106,149 @@ def after_request(response):
 @app.route('/')
 def home():
     """Main landing page with training type selection."""
-    print("📋 Home page accessed")
+    log.debug('home_viewed')
     return render_template('home.html')
 
+def _capacity():
+    """Admission and job queue stats, and whether either is saturated."""
+    from modules.job_queue import job_queue
+    from modules.admission import admission
+    capacity = admission.stats()
+    jobs = job_queue.stats()
+    return capacity, jobs, capacity["saturated"] or (Config.ASYNC_JOBS and jobs["saturated"])
+
 @app.route('/health')
 def health():
-    """Health check endpoint."""
+    """Liveness check: always 200 while the process serves requests, with capacity and cache stats."""
     from flask import jsonify
     from datetime import datetime
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    from modules.template_cache import template_registry
+    from modules.upload_store import get_upload_store
+    from modules.worker_pool import pool_stats
+    from modules.chart_service import chart_service
+    from modules.warmup import warm_up_status
+    from modules.retention import storage_manager
+    from modules.structured_logging import logging_stats
+    capacity, jobs, saturated = _capacity()
+    return jsonify({
+        "status": "healthy",
+        "saturated": saturated,
+        "timestamp": datetime.now().isoformat(),
+        "template_cache": template_registry.stats(),
+        "upload_store": get_upload_store().stats(),
+        "image_pool": pool_stats(),
+        "chart_service": chart_service.stats(),
+        "warm_up": warm_up_status(),
+        "jobs": jobs,
+        "admission": capacity,
+        "storage": storage_manager.stats(),
+        "logging": logging_stats()
+    })
+
+@app.route('/ready')
+def ready():
+    """Readiness check: 503 while report generation or the job backlog is saturated (shed new work)."""
+    from flask import jsonify
+    capacity, jobs, saturated = _capacity()
+    response = jsonify({
+        "status": "saturated" if saturated else "ready",
+        "admission_saturated": capacity["saturated"],
+        "jobs_saturated": Config.ASYNC_JOBS and jobs["saturated"],
+    })
+    if saturated:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(Config.ADMISSION_RETRY_AFTER)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of this process: request/stage durations, sizes, images, capacity."""
+    from modules.instrumentation import render_metrics
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/admin/heaviest')
+def heaviest_generations():
+    """Heaviest recent report generations of this process by memory and by CPU (sampled); needs ADMIN_TOKEN."""
+    import hmac
+    from flask import abort, jsonify, request
+    from modules.resource_accounting import heaviest
+    if not Config.ADMIN_TOKEN:
+        abort(404)  # disabled unless a token is configured
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), Config.ADMIN_TOKEN.encode()):
+        abort(403)
+    return jsonify(heaviest(request.args.get('limit', 10, type=int)))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a background report job, polled by the success page."""
+    from flask import jsonify, url_for
+    from modules.job_queue import job_queue
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    status = {key: job[key] for key in ('id', 'state', 'stage', 'progress', 'attempts', 'error')}
+    if job['state'] == 'done':
+        status['filename'] = job['result']
+        status['download_url'] = url_for('download_file', filename=job['result'])
+        status['success_url'] = url_for(job['success_endpoint'], filename=job['result'])
+    return jsonify(status)
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Open a resumable upload for one image: JSON {filename, size} -> {id, offset, chunk_size}."""
+    from flask import jsonify, request
+    from werkzeug.exceptions import HTTPException
+    from modules.chunked_upload import get_upload_sessions
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(get_upload_sessions().create(data.get('filename'), data.get('size'), request.remote_addr)), 201
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    """GET: bytes received so far (where to resume). PUT ?offset=N: append one chunk."""
+    from flask import jsonify, request
+    from werkzeug.exceptions import HTTPException
+    from modules.chunked_upload import get_upload_sessions, OffsetMismatch
+    sessions = get_upload_sessions()
+    try:
+        if request.method == 'GET':
+            return jsonify(sessions.status(upload_id))
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({"error": "offset is required"}), 400
+        return jsonify(sessions.append(upload_id, offset, request.stream, request.content_length))
+    except OffsetMismatch as e:
+        return jsonify(e.state), 409
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    """Download generated reports."""
+    """Download generated reports (content ETag, conditional GET, ranges, optional proxy offload)."""
     try:
         output_dir = Config.OUTPUT_FOLDER
-        file_path = os.path.join(output_dir, filename)
+        file_path = safe_join(output_dir, filename)
         
-        if os.path.exists(file_path):
-            return send_file(
+        if file_path and os.path.isfile(file_path):
+            from modules.retention import storage_manager
+            response = serve_file(
                 file_path,
                 as_attachment=True,
                 download_name=filename,
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                offload_path=f'output/{filename}'
             )
+            if response.status_code != 304:
+                storage_manager.touch(file_path)  # downloaded reports are kept longer
+            return response
         else:
             return "File not found", 404
             
     except Exception as e:
-        print(f"❌ Download error: {str(e)}")
+        log.error('download_failed', file=filename, error=str(e), exc_info=True)
         return f"Error downloading file: {str(e)}", 500
 
 if __name__ == "__main__":
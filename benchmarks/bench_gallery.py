@@ -0,0 +1,132 @@
+"""
+Gallery Insertion Benchmark
+===========================
+
+Times insert_gallery_table() with 60 gallery images (10 pages) against the
+cell-by-cell construction it replaced: insert_table_after() plus python-docx
+cell, paragraph and run calls for every slot, and a hand-built page-break
+paragraph per page. The prebuilt pages are timed with STREAMING_GENERATION
+off (python-docx numbering and image parts) and on (image spool). Images are
+gallery-sized JPEGs already in memory, so only the document work is measured;
+the document XML of every variant is checked to be identical.
+
+The cell-by-cell reference emits each table followed by its page break. The
+construction it stands for inserted each next table right after the previous
+table, ahead of that table's page break, so the tables ran together and the
+page breaks piled up after the last one. The prebuilt pages fix that order, and
+the reference follows the fixed order so the XML can be compared.
+
+Usage:
+    python -m benchmarks.bench_gallery [--images 60] [--repeat 5]
+"""
+import argparse
+import copy
+import io
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from docx.shared import Cm, Pt
+from docx.table import _Cell
+import docx.oxml.shared
+
+from config import Config
+from modules.document_utils import insert_table_after
+from modules.image_processing import insert_gallery_table
+from modules.anchor_index import find_anchor_paragraph
+from modules.xml_traversal import iter_cells
+from benchmarks.bench_image_normalization import synthetic_phone_photo
+
+TEMPLATE = os.path.join(Config.TEMPLATE_FOLDER, 'type_a', 'word_templates', 'word_template_1.docx')
+PLACEHOLDER = '{{GALLERY_TABLE}}'
+
+
+def cell_by_cell(doc, images, captions):
+    """The previous gallery construction (page by page, pages in document order)."""
+    para = find_anchor_paragraph(doc, PLACEHOLDER)
+    para.text = para.text.replace(PLACEHOLDER, '')
+    pairs = iter(zip(images, captions))
+    insert_after = para
+    while True:
+        page = list(itertools.islice(pairs, 6))
+        if not page:
+            break
+        table = insert_table_after(insert_after, (len(page) + 1) // 2, 2)
+        for (image, caption), tc in zip(page, iter_cells(table._tbl)):
+            cell = _Cell(tc, table)
+            cell.text = ''
+            p_img = cell.paragraphs[0]
+            p_img.alignment = 1
+            p_img.add_run().add_picture(image, width=Cm(8.13), height=Cm(5.81))
+            if caption:
+                p_caption = cell.add_paragraph()
+                run_caption = p_caption.add_run(caption)
+                p_caption.alignment = 1
+                run_caption.font.size = Pt(10)
+                run_caption.font.bold = True
+            cell.vertical_alignment = 1
+        new_para_element = docx.oxml.shared.OxmlElement('w:p')
+        new_run_element = docx.oxml.shared.OxmlElement('w:r')
+        new_break_element = docx.oxml.shared.OxmlElement('w:br')
+        new_break_element.set(docx.oxml.shared.qn('w:type'), 'page')
+        new_run_element.append(new_break_element)
+        new_para_element.append(new_run_element)
+        table._element.addnext(new_para_element)
+        insert_after = docx.text.paragraph.Paragraph(new_para_element, para._parent)
+
+
+def prebuilt(streaming):
+    def insert(doc, images, captions):
+        saved = Config.STREAMING_GENERATION
+        Config.STREAMING_GENERATION = streaming
+        try:
+            insert_gallery_table(doc, images, captions)
+        finally:
+            Config.STREAMING_GENERATION = saved
+    return insert
+
+
+def time_call(func, template, photos, captions, repeat):
+    """Return (best seconds, resulting document) over repeat runs on fresh copies."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        doc = copy.deepcopy(template)
+        images = [io.BytesIO(photo) for photo in photos]  # the spool closes the buffers it embeds
+        start = time.perf_counter()
+        func(doc, images, captions)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        result = doc
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=60, help='gallery images')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    template = Document(TEMPLATE)
+    photos = [synthetic_phone_photo(seed, (480, 343)) for seed in range(args.images)]
+    captions = [f'Photo {i + 1}' if i % 5 else '' for i in range(args.images)]  # some without captions
+
+    variants = [('cell by cell', cell_by_cell), ('prebuilt', prebuilt(False)), ('prebuilt + spool', prebuilt(True))]
+    reference_time = reference_xml = None
+    print(f"{args.images} images, {-(-args.images // 6)} pages")
+    print(f"{'variant':<18}{'ms':>9}{'ms/image':>10}{'speedup':>9}  identical")
+    for name, func in variants:
+        elapsed, doc = time_call(func, template, photos, captions, args.repeat)
+        xml = doc.element.xml
+        if reference_time is None:
+            reference_time, reference_xml = elapsed, xml
+        print(f"{name:<18}{elapsed * 1000:>9.1f}{elapsed * 1000 / args.images:>10.2f}"
+              f"{reference_time / elapsed:>8.1f}x  {xml == reference_xml}")
+
+
+if __name__ == '__main__':
+    main()
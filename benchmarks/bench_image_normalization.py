@@ -0,0 +1,100 @@
+"""
+Image Normalization Benchmark
+=============================
+
+Measures the effect of normalize_image() on report size and generation
+time. The reference upload set is every image in static/uploads plus a
+few synthetic 12-megapixel "phone photos" (noisy JPEGs with an EXIF
+rotation tag), split between gallery photos and annexure pages.
+
+Usage:
+    python -m benchmarks.bench_image_normalization [--phone-photos N]
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from PIL import Image
+
+from config import Config
+from modules.image_normalization import normalize_image
+from modules.image_processing import insert_gallery_table, insert_annexure_images
+from modules.package_writer import save_document
+
+
+def synthetic_phone_photo(seed, size=(4032, 3024)):
+    """Return JPEG bytes resembling a phone photo (noise compresses like real detail)."""
+    noise = Image.effect_noise((size[0] // 4, size[1] // 4), 40 + seed).resize(size)
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', (noise, gradient, noise.rotate(180)))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90° clockwise, as phones commonly store portrait shots
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=92, exif=exif)
+    return output.getvalue()
+
+
+def reference_uploads(phone_photos):
+    """Return a list of (name, bytes) making up the reference upload set."""
+    uploads = []
+    for path in sorted(glob.glob(os.path.join(Config.BASE_DIR, 'static', 'uploads', '*'))):
+        if path.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
+            with open(path, 'rb') as f:
+                uploads.append((os.path.basename(path), f.read()))
+    for i in range(phone_photos):
+        uploads.append((f'phone_{i + 1}.jpg', synthetic_phone_photo(i)))
+    return uploads
+
+
+def build_report(uploads, normalize):
+    """Embed all uploads as gallery and annexure images; return (seconds, docx bytes)."""
+    template = os.path.join(Config.TEMPLATE_FOLDER, 'type_a', 'word_templates', 'word_template_1.docx')
+    doc = Document(template)
+    start = time.perf_counter()
+
+    def prepare(subset, placement):
+        images = []
+        for _, data in subset:
+            stream = io.BytesIO(data)
+            images.append(normalize_image(stream, placement) if normalize else stream)
+        return images
+
+    # Alternate uploads between the gallery and an annexure, as a real submission would
+    gallery, annexure = uploads[0::2], uploads[1::2]
+    insert_gallery_table(doc, prepare(gallery, 'gallery'), [name for name, _ in gallery])
+    insert_annexure_images(doc, prepare(annexure, 'annexure'), [''] * len(annexure), '{{ANNEXURE1_TABLE}}')
+    output = io.BytesIO()
+    save_document(doc, output)
+    return time.perf_counter() - start, output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--phone-photos', type=int, default=4, help='synthetic 12 MP photos to add to the set')
+    args = parser.parse_args()
+
+    uploads = reference_uploads(args.phone_photos)
+    total_in = sum(len(data) for _, data in uploads)
+    print(f"Reference set: {len(uploads)} images, {total_in / 1e6:.2f} MB "
+          f"(target {Config.IMAGE_TARGET_DPI} dpi, JPEG q{Config.IMAGE_JPEG_QUALITY})")
+
+    for placement in ('gallery', 'annexure'):
+        start = time.perf_counter()
+        sizes = [len(normalize_image(io.BytesIO(data), placement).getvalue()) for _, data in uploads]
+        elapsed = time.perf_counter() - start
+        print(f"  {placement:<9} normalized: {sum(sizes) / 1e6:6.2f} MB in {elapsed * 1000:7.1f} ms")
+
+    original_time, original_doc = build_report(uploads, normalize=False)
+    normalized_time, normalized_doc = build_report(uploads, normalize=True)
+    print(f"Report without normalization: {len(original_doc) / 1e6:6.2f} MB, {original_time * 1000:7.1f} ms")
+    print(f"Report with normalization:    {len(normalized_doc) / 1e6:6.2f} MB, {normalized_time * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Image Pool Latency Benchmark
+============================
+
+Compares end-to-end image handling latency of a submission with 1, 10
+and 40 uploaded photos, prepared sequentially (IMAGE_WORKERS=1) and on
+the shared image pool. Each run uses a fresh upload store, so every
+photo is really saved, decoded, resized and re-encoded (no variant
+cache hits). Photos alternate between the gallery and an annexure.
+
+The speedup is bounded by the number of CPU cores available; on a
+single-core machine both modes take about the same time.
+
+Usage:
+    python -m benchmarks.bench_image_pool [--workers N] [--counts 1 10 40]
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from docx import Document
+from werkzeug.datastructures import FileStorage
+
+from config import Config
+from modules import worker_pool
+from modules.image_processing import ImageBatch, insert_gallery_table, insert_annexure_images
+from modules.package_writer import save_document
+from benchmarks.bench_image_normalization import synthetic_phone_photo
+
+
+def run(photos, workers):
+    """Prepare and embed photos with the given pool size; return (prepare_s, total_s)."""
+    Config.IMAGE_WORKERS = workers
+    worker_pool.shutdown()
+    Config.UPLOAD_FOLDER = tempfile.mkdtemp(prefix='bench_pool_')
+    try:
+        template = os.path.join(Config.TEMPLATE_FOLDER, 'type_a', 'word_templates', 'word_template_1.docx')
+        doc = Document(template)
+        uploads = [FileStorage(io.BytesIO(data), filename=f'photo_{i + 1}.jpg') for i, data in enumerate(photos)]
+        gallery, annexure = uploads[0::2], uploads[1::2]
+
+        start = time.perf_counter()
+        gallery_batch = ImageBatch(gallery, [f.filename for f in gallery], 'gallery')
+        annexure_batch = ImageBatch(annexure, [''] * len(annexure), 'annexure')
+        gallery_images, gallery_captions = gallery_batch.result()
+        annexure_images, annexure_captions = annexure_batch.result()
+        prepared = time.perf_counter() - start
+
+        insert_gallery_table(doc, gallery_images, gallery_captions)
+        if annexure_images:
+            insert_annexure_images(doc, annexure_images, annexure_captions, '{{ANNEXURE1_TABLE}}')
+        save_document(doc, io.BytesIO())
+        return prepared, time.perf_counter() - start
+    finally:
+        shutil.rmtree(Config.UPLOAD_FOLDER, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=max(2, Config.IMAGE_WORKERS), help='pool size to compare against')
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 10, 40], help='photos per submission')
+    args = parser.parse_args()
+
+    photos = [synthetic_phone_photo(seed) for seed in range(max(args.counts))]
+    print(f"{os.cpu_count()} CPU(s); 12 MP photos; sequential vs {args.workers} workers")
+    print(f"{'images':>6}  {'sequential (prep/total)':>24}  {'pool (prep/total)':>20}  {'speedup':>7}")
+    for count in args.counts:
+        seq_prep, seq_total = run(photos[:count], 1)
+        pool_prep, pool_total = run(photos[:count], args.workers)
+        print(f"{count:>6}  {seq_prep * 1000:10.0f} / {seq_total * 1000:7.0f} ms  "
+              f"{pool_prep * 1000:8.0f} / {pool_total * 1000:7.0f} ms  {seq_total / pool_total:6.2f}x")
+    worker_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
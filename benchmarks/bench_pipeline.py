@@ -0,0 +1,320 @@
+"""
+Report Pipeline Benchmark Suite
+===============================
+
+Times report generation stage by stage for Type A and Type C, for every
+template on disk and several image counts, and compares the results with
+a saved baseline.
+
+Each case (training type, template, image count) runs in a fresh process,
+so peak memory and caches are per case. Inside that process the case runs
+once to warm up, then --repeats more times. Each run has a fresh upload
+store, so every image is really decoded, resized and re-encoded, and the
+chart cache is emptied first. The reports come from the same build_report()
+the web routes use, with a synthetic form payload and synthetic JPEG photos.
+Stage times are measured between the stage reports of build_report:
+
+    prepare           start image preparation on the image pool (with IMAGE_WORKERS=1
+                      the images are prepared here) and chart rendering (Type C)
+    template_load     clone the parsed Word template
+    text_replacement  fill in the form fields
+    gallery           wait for the gallery images and insert the table
+    charts            wait for the feedback charts and insert them (Type C)
+    annexures         wait for the annexure images and insert them
+    save              write the .docx
+
+Half of the images (rounded up) go to the gallery, which has no slot limit; the rest
+are spread over the annexures.
+Times are medians over the repeats. Memory is the peak RSS of the case process
+and the peak Python heap (tracemalloc) of one extra run.
+
+Usage:
+    python -m benchmarks.bench_pipeline --output results.json
+    python -m benchmarks.bench_pipeline --baseline baseline.json --threshold 0.10
+    python -m benchmarks.bench_pipeline --types type_a --templates 1 --scales 0 10 --repeats 1
+
+Comparing against a baseline exits with status 1 when any total, stage or
+peak memory is more than --threshold slower/larger (and, for times, more
+than --min-delta-ms).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config
+from benchmarks.bench_image_normalization import synthetic_phone_photo
+
+RESULTS_VERSION = 2  # 2: gallery gets half of the images (was at most 10)
+TEMPLATE_NUMBERS = ('1', '2', '3', '4', '5')
+ANNEXURES = {'type_a': 5, 'type_c': 6}
+
+# build_report stage -> benchmark stage name
+STAGES = {
+    'preparing images': 'prepare',
+    'filling template': 'template_load',
+    'replacing text': 'text_replacement',
+    'inserting gallery': 'gallery',
+    'inserting charts': 'charts',
+    'inserting annexures': 'annexures',
+    'saving': 'save',
+}
+
+
+def template_path(kind, number):
+    if kind == 'type_a':
+        return os.path.join(Config.TEMPLATE_FOLDER, 'type_a', 'word_templates', f'word_template_{number}.docx')
+    return os.path.join(Config.TEMPLATE_FOLDER, 'type_c', f'word_template_{number}.docx')
+
+
+def synthetic_form(kind, template):
+    """Form fields as the web form would send them (names, dates, feedback counts)."""
+    form = [
+        ('selected_template', template), ('cell_name', 'Bench Cell'), ('event_date', '2024-02-05'),
+        ('start_date', '2024-02-05'), ('end_date', '2024-02-06'), ('venue', 'Conference Hall, Bench City'),
+        ('organizer', 'Bench Energy Agency'), ('workshop_type', 'Capacity Building'),
+        ('submitted_to', 'Bureau of Energy Efficiency'), ('submitted_by', 'Bench Cell'),
+        ('address_line1', 'Block A'), ('address_line2', 'Sector 1'), ('address_line3', 'Bench City'),
+        ('participant_no', '48'), ('participant_department', 'Public Works Department'),
+    ]
+    for group in ('rrecl', 'guest', 'chief', 'guidance'):
+        for i in range(3):
+            form += [(f'{group}_prefix[]', 'Dr.'), (f'{group}_name[]', f'{group.title()} Person {i + 1}'),
+                     (f'{group}_designation[]', 'Director')]
+    if kind == 'type_c':
+        for i in range(1, 4):
+            form += [(f'trainer_prefix_{i}', 'Mr.'), (f'trainer_name_{i}', f'Trainer {i}'),
+                     (f'trainer_designation_{i}', 'Expert')]
+        for q in range(1, 5):
+            form += [(f'question_{q}_strongly_agree', str(10 + q)), (f'question_{q}_agree', str(20 - q)),
+                     (f'question_{q}_partially_agree', str(q))]
+    return form
+
+
+def image_fields(kind, count):
+    """Upload field names for count images: half in the gallery, the rest round-robin over the annexures."""
+    gallery = -(-count // 2)
+    fields = [f'gallery_image_{i + 1}' for i in range(gallery)]
+    annexures = ANNEXURES[kind]
+    for i in range(count - gallery):
+        fields.append(f'annexure{i % annexures + 1}_image_{i // annexures + 1}')
+    return fields
+
+
+# -- case process ------------------------------------------------------------------
+
+def _load_app():
+    # Only the report pipeline: no job workers, storage sweeps or warm-up threads
+    Config.ASYNC_JOBS = False
+    Config.STORAGE_RETENTION_ENABLED = False
+    Config.WARMUP_ON_STARTUP = False
+    os.chdir(Config.BASE_DIR)
+    from app import app
+    return app
+
+
+def _run_once(app, kind, form, files, workdir):
+    """Generate one report; returns ({stage: seconds}, total seconds, output bytes)."""
+    from modules.chart_service import chart_service
+    from modules.job_queue import Submission, job_queue
+
+    Config.UPLOAD_FOLDER = tempfile.mkdtemp(dir=workdir)  # fresh store: no dedup or variant hits
+    Config.OUTPUT_FOLDER = workdir
+    chart_service.cache.clear()
+    handler, _ = job_queue.handlers[kind]
+    submission = Submission(form, files)
+    marks = []
+
+    def progress(stage, percent):
+        marks.append((STAGES.get(stage, stage), time.perf_counter()))
+
+    start = time.perf_counter()
+    try:
+        with app.app_context():
+            filename = handler(submission, progress)
+    finally:
+        submission.close()
+    end = time.perf_counter()
+
+    stages = {}
+    for (stage, at), (_, until) in zip(marks, marks[1:] + [(None, end)]):
+        stages[stage] = stages.get(stage, 0.0) + until - at
+    output_path = os.path.join(workdir, filename)
+    size = os.path.getsize(output_path)
+    os.remove(output_path)
+    shutil.rmtree(Config.UPLOAD_FOLDER, ignore_errors=True)
+    return stages, end - start, size
+
+
+def run_case(kind, template, image_paths, repeats):
+    """Run one case in this (fresh) process and return its measurements."""
+    app = _load_app()
+    form = synthetic_form(kind, template)
+    files = [(field, os.path.basename(path), path)
+             for field, path in zip(image_fields(kind, len(image_paths)), image_paths)]
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        _run_once(app, kind, form, files, workdir)  # warm-up: imports, template parse, chart workers
+        runs = [_run_once(app, kind, form, files, workdir) for _ in range(repeats)]
+
+        tracemalloc.start()
+        _run_once(app, kind, form, files, workdir)
+        _, peak_heap = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        # This process is a pool worker: its own pools must be stopped before it can exit
+        from modules import worker_pool
+        from modules.chart_service import chart_service
+        chart_service.shutdown()
+        worker_pool.shutdown()
+
+    stage_names = [name for name in STAGES.values() if any(name in stages for stages, _, _ in runs)]
+    return {
+        'images': len(image_paths),
+        'total_s': round(statistics.median(total for _, total, _ in runs), 4),
+        'stages_s': {name: round(statistics.median(stages.get(name, 0.0) for stages, _, _ in runs), 4)
+                     for name in stage_names},
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_python_heap_mb': round(peak_heap / (1024 * 1024), 1),
+        'output_mb': round(runs[-1][2] / (1024 * 1024), 2),
+    }
+
+
+# -- parent --------------------------------------------------------------------------
+
+def _case_key(kind, template, images):
+    return f'{kind}/template_{template}/{images}_images'
+
+
+def run_suite(kinds, templates, scales, repeats, image_size):
+    """Run every available case in its own process; returns the results document."""
+    photo_dir = tempfile.mkdtemp(prefix='bench_photos_')
+    try:
+        photos = []
+        for seed in range(max(scales, default=0)):
+            path = os.path.join(photo_dir, f'photo_{seed + 1}.jpg')
+            with open(path, 'wb') as f:
+                f.write(synthetic_phone_photo(seed, image_size))
+            photos.append(path)
+
+        cases, skipped = {}, []
+        context = multiprocessing.get_context('spawn')
+        for kind in kinds:
+            for template in templates:
+                if not os.path.exists(template_path(kind, template)):
+                    skipped.append(f'{kind}/template_{template}')
+                    continue
+                for count in scales:
+                    key = _case_key(kind, template, count)
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        cases[key] = pool.submit(run_case, kind, template, photos[:count], repeats).result()
+                    case = cases[key]
+                    print(f"{key:<34} {case['total_s'] * 1000:8.0f} ms  peak RSS {case['peak_rss_mb']:6.1f} MB  "
+                          f"heap {case['peak_python_heap_mb']:6.1f} MB  "
+                          + '  '.join(f"{name} {seconds * 1000:.0f}" for name, seconds in case['stages_s'].items()))
+    finally:
+        shutil.rmtree(photo_dir, ignore_errors=True)
+
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'image_workers': Config.IMAGE_WORKERS,
+            'chart_workers': Config.CHART_WORKERS,
+            'image_size': list(image_size),
+            'repeats': repeats,
+        },
+        'skipped': skipped,
+        'cases': cases,
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Print the differences with a baseline; returns the list of regressions."""
+    regressions = []
+    if baseline.get('version') != RESULTS_VERSION:
+        regressions.append(f"baseline is results version {baseline.get('version')}, not {RESULTS_VERSION}: "
+                           f"its cases are not comparable; record a new baseline with --output")
+        print(f"\n❌ {regressions[0]}")
+        return regressions
+
+    def check(key, label, new, old, is_time):
+        if old is None or new is None or old <= 0:
+            return
+        change = (new - old) / old
+        delta_ok = not is_time or (new - old) * 1000 > min_delta_ms
+        if change > threshold and delta_ok:
+            regressions.append(f'{key} {label}: {old} -> {new} (+{change:.0%})')
+
+    print(f"\n{'case':<34} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, case in results['cases'].items():
+        base = baseline.get('cases', {}).get(key)
+        if base is None:
+            print(f"{key:<34} {'-':>10} {case['total_s'] * 1000:8.0f}ms {'new':>8}")
+            continue
+        change = (case['total_s'] - base['total_s']) / base['total_s'] if base['total_s'] else 0.0
+        print(f"{key:<34} {base['total_s'] * 1000:8.0f}ms {case['total_s'] * 1000:8.0f}ms {change:+8.1%}")
+        check(key, 'total_s', case['total_s'], base['total_s'], True)
+        for stage, seconds in case['stages_s'].items():
+            check(key, f'stages_s.{stage}', seconds, base.get('stages_s', {}).get(stage), True)
+        for metric in ('peak_rss_mb', 'peak_python_heap_mb'):
+            check(key, metric, case[metric], base.get(metric), False)
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {threshold:.0%}:")
+        for regression in regressions:
+            print(f"   {regression}")
+    else:
+        print(f"\n✅ No regressions beyond {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--types', nargs='+', default=['type_a', 'type_c'], choices=sorted(ANNEXURES))
+    parser.add_argument('--templates', nargs='+', default=list(TEMPLATE_NUMBERS), choices=TEMPLATE_NUMBERS)
+    parser.add_argument('--scales', type=int, nargs='+', default=[0, 10, 60], help='images per report')
+    parser.add_argument('--repeats', type=int, default=3, help='measured runs per case (after one warm-up run)')
+    parser.add_argument('--image-size', default='1600x1200', help='synthetic photo size, WxH')
+    parser.add_argument('--output', help='write the results JSON here (e.g. to save a new baseline)')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown/growth, as a fraction')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='ignore time differences below this')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+    print(f"{os.cpu_count()} CPU(s); {width}x{height} photos; {args.repeats} run(s) per case after a warm-up")
+    results = run_suite(args.types, args.templates, args.scales, args.repeats, (width, height))
+    if results['skipped']:
+        print(f"Skipped (template not found): {', '.join(results['skipped'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Large Report Memory Check
+=========================
+
+Generates Type C reports with many images (half in the gallery, the rest spread
+over the annexures) and checks that memory stays bounded and that generation
+time grows linearly with the number of images.
+
+Each scale runs in a fresh process: one small warm-up report (imports, template
+parse, chart workers), then the measured report. Peak RSS growth is the highest
+RSS sampled during the measured report minus the RSS before it. The check fails
+(exit status 1) when, at the largest scale, the peak growth is above
+--ceiling-mb, or when the time per image is more than --max-slowdown times the
+time per image at the smallest scale.
+
+With --compare the largest scale runs again with STREAMING_GENERATION off, to
+show what the streaming mode saves.
+
+tests/test_memory.py runs one scale of this check under pytest.
+
+Usage:
+    python -m benchmarks.check_memory
+    python -m benchmarks.check_memory --scales 50 200 --ceiling-mb 80 --compare
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config
+from benchmarks.bench_image_normalization import synthetic_phone_photo
+from benchmarks.bench_pipeline import synthetic_form, _load_app
+
+ANNEXURES = 6
+WARMUP_IMAGES = 4
+
+
+def image_fields(count):
+    """Upload field names for count images: half gallery slots, the rest round-robin over the annexures."""
+    gallery = count // 2
+    fields = [f'gallery_image_{i + 1}' for i in range(gallery)]
+    for i in range(count - gallery):
+        fields.append(f'annexure{i % ANNEXURES + 1}_image_{i // ANNEXURES + 1}')
+    return fields
+
+
+class _PeakSampler:
+    """Samples the RSS of this process in the background and keeps the highest value."""
+
+    def __init__(self, interval=0.01):
+        from modules.resource_accounting import current_rss
+        self._rss = current_rss
+        self._interval = interval
+        self._stop = threading.Event()
+        self.start_rss = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.peak = max(self.peak, self._rss())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+        return self.peak - self.start_rss
+
+
+def _generate(app, form, files, workdir):
+    """Generate one Type C report from fresh uploads; returns (seconds, output bytes)."""
+    from modules.job_queue import Submission, job_queue
+
+    Config.UPLOAD_FOLDER = tempfile.mkdtemp(dir=workdir)  # fresh store: every image is prepared
+    Config.OUTPUT_FOLDER = workdir
+    handler, _ = job_queue.handlers['type_c']
+    submission = Submission(form, files)
+    start = time.perf_counter()
+    try:
+        with app.app_context():
+            filename = handler(submission, lambda stage, percent: None)
+    finally:
+        submission.close()
+    seconds = time.perf_counter() - start
+    output_path = os.path.join(workdir, filename)
+    size = os.path.getsize(output_path)
+    os.remove(output_path)
+    shutil.rmtree(Config.UPLOAD_FOLDER, ignore_errors=True)
+    return seconds, size
+
+
+def run_scale(image_paths, streaming):
+    """Generate one report with image_paths in this (fresh) process and return its measurements."""
+    app = _load_app()
+    Config.STREAMING_GENERATION = streaming
+    form = synthetic_form('type_c', '2')
+    workdir = tempfile.mkdtemp(prefix='check_memory_')
+    try:
+        warmup = [(field, os.path.basename(path), path)
+                  for field, path in zip(image_fields(WARMUP_IMAGES), image_paths)]
+        _generate(app, form, warmup, workdir)
+
+        files = [(field, os.path.basename(path), path)
+                 for field, path in zip(image_fields(len(image_paths)), image_paths)]
+        sampler = _PeakSampler()
+        seconds, size = _generate(app, form, files, workdir)
+        growth = sampler.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        # This process is a pool worker: its own pools must be stopped before it can exit
+        from modules import worker_pool
+        from modules.chart_service import chart_service
+        chart_service.shutdown()
+        worker_pool.shutdown()
+    return {
+        'images': len(image_paths),
+        'streaming': streaming,
+        'total_s': round(seconds, 3),
+        'ms_per_image': round(seconds * 1000 / max(1, len(image_paths)), 1),
+        'rss_start_mb': round(sampler.start_rss / (1024 * 1024), 1),
+        'rss_peak_growth_mb': round(growth / (1024 * 1024), 1),
+        'output_mb': round(size / (1024 * 1024), 2),
+    }
+
+
+def measure(scales, image_size=(1600, 1200), compare=False):
+    """
+    Yield the measurements of one report per scale (images per report), each in a fresh
+    spawned process; with compare, the largest scale again with streaming off.
+    """
+    scales = sorted(set(scales))
+    photo_dir = tempfile.mkdtemp(prefix='check_memory_photos_')
+    context = multiprocessing.get_context('spawn')
+    try:
+        photos = []
+        for seed in range(max(max(scales), WARMUP_IMAGES)):
+            path = os.path.join(photo_dir, f'photo_{seed + 1}.jpg')
+            with open(path, 'wb') as f:
+                f.write(synthetic_phone_photo(seed, image_size))
+            photos.append(path)
+
+        runs = [(count, True) for count in scales]
+        if compare:
+            runs.append((scales[-1], False))
+        for count, streaming in runs:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                yield pool.submit(run_scale, photos[:count], streaming).result()
+    finally:
+        shutil.rmtree(photo_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[50, 200], help='images per report')
+    parser.add_argument('--image-size', default='1600x1200', help='synthetic photo size, WxH')
+    parser.add_argument('--ceiling-mb', type=float, default=80.0,
+                        help='allowed peak RSS growth at the largest scale')
+    parser.add_argument('--max-slowdown', type=float, default=1.5,
+                        help='allowed time per image at the largest scale, relative to the smallest')
+    parser.add_argument('--compare', action='store_true', help='also run the largest scale without streaming')
+    args = parser.parse_args()
+    image_size = tuple(int(n) for n in args.image_size.lower().split('x'))
+    scales = sorted(set(args.scales))
+
+    results = []
+    for result in measure(scales, image_size, compare=args.compare):
+        results.append(result)
+        print(f"{result['images']:4d} images  streaming {'on ' if result['streaming'] else 'off'}  "
+              f"{result['total_s'] * 1000:8.0f} ms  {result['ms_per_image']:6.1f} ms/image  "
+              f"peak RSS growth {result['rss_peak_growth_mb']:6.1f} MB  output {result['output_mb']:.1f} MB")
+
+    streamed = [result for result in results if result['streaming']]
+    smallest, largest = streamed[0], streamed[-1]
+    failures = []
+    if largest['rss_peak_growth_mb'] > args.ceiling_mb:
+        failures.append(f"{largest['images']} images: peak RSS growth {largest['rss_peak_growth_mb']} MB "
+                        f"> ceiling {args.ceiling_mb} MB")
+    slowdown = largest['ms_per_image'] / max(smallest['ms_per_image'], 1e-9)
+    if len(streamed) > 1 and slowdown > args.max_slowdown:
+        failures.append(f"{largest['images']} images: {slowdown:.2f}x the time per image of "
+                        f"{smallest['images']} images (> {args.max_slowdown}x)")
+    if failures:
+        print('\nFAILED:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print(f"\nOK: peak RSS growth {largest['rss_peak_growth_mb']} MB <= {args.ceiling_mb} MB, "
+          f"time per image {slowdown:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Import Time Report and Budget Check
+===================================
+
+Measures the cold import of the application module (`import app`) in
+fresh interpreters.
+
+Report mode (default) runs `python -X importtime -c "import app"` and
+prints the most expensive modules by cumulative time plus the self time
+aggregated per top-level package.
+
+Check mode (--budget SECONDS) imports `app` several times in fresh
+interpreters and exits with status 1 if the fastest run exceeds the
+budget, or if a module that must stay lazy (matplotlib, numpy) was
+imported. The same gate runs in CI as tests/test_import_time.py.
+
+Usage:
+    python -m benchmarks.import_time [--top N]
+    python -m benchmarks.import_time --budget 0.6 [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that must only be imported when a chart is actually drawn
+LAZY_MODULES = ('matplotlib', 'numpy')
+
+_TIMED_IMPORT = (
+    "import sys, time, json\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+) % (LAZY_MODULES,)
+
+
+def _run_python(args, env=None):
+    return subprocess.run([sys.executable] + args, cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+                          env=env)
+
+
+def import_profile():
+    """Return [(module, self_us, cumulative_us)] from -X importtime for `import app`."""
+    result = _run_python(['-X', 'importtime', '-c', 'import app'])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report(top):
+    rows = import_profile()
+    total = max(cumulative for _, _, cumulative in rows)
+    print(f"Cold import of app: {total / 1000:.1f} ms ({len(rows)} modules)\n")
+
+    print(f"Top {top} modules by cumulative time:")
+    for name, _, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    packages = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split('.')[0]] += self_us
+    print(f"\nTop {top} packages by self time:")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package:<20} {self_us / total:6.1%}")
+
+
+def measure_import(runs, env=None):
+    """Import app in runs fresh interpreters; returns (fastest seconds, lazy modules that got imported)."""
+    results = [json.loads(_run_python(['-c', _TIMED_IMPORT], env).stdout.strip().splitlines()[-1])
+               for _ in range(runs)]
+    best = min(result['seconds'] for result in results)
+    loaded = sorted(set().union(*(result['loaded'] for result in results)))
+    return best, loaded
+
+
+def check(budget, runs):
+    best, loaded = measure_import(runs)
+
+    print(f"Cold import of app: best {best * 1000:.1f} ms of {runs} runs (budget {budget * 1000:.0f} ms)")
+    failed = False
+    if best > budget:
+        print("❌ Import time budget exceeded")
+        failed = True
+    if loaded:
+        print(f"❌ Modules that must load lazily were imported: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("✅ Within budget")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=15, help='rows to show in the report')
+    parser.add_argument('--budget', type=float, help='fail if the cold import takes longer (seconds)')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time in check mode')
+    args = parser.parse_args()
+
+    if args.budget is not None:
+        sys.exit(check(args.budget, args.runs))
+    report(args.top)
+
+
+if __name__ == '__main__':
+    main()
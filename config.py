@@ -21,6 +21,131 @@ class Config:
     TEMPLATE_FOLDER = os.path.join(BASE_DIR, 'templates')
     STATIC_FOLDER = os.path.join(BASE_DIR, 'static')
     
+    # Output documents: deflate level for XML parts, content types stored uncompressed
+    DOCX_XML_COMPRESSLEVEL = int(os.environ.get('DOCX_XML_COMPRESSLEVEL', 6))
+    DOCX_STORED_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/gif'}
+    
+    # Upload images: effective DPI at their placement size and JPEG re-encode quality
+    IMAGE_NORMALIZATION_ENABLED = os.environ.get('IMAGE_NORMALIZATION_ENABLED', 'true').lower() == 'true'
+    IMAGE_TARGET_DPI = int(os.environ.get('IMAGE_TARGET_DPI', 150))
+    IMAGE_JPEG_QUALITY = int(os.environ.get('IMAGE_JPEG_QUALITY', 85))
+    
+    # Uploads up to this size are processed in memory; larger ones are spilled to UPLOAD_FOLDER
+    UPLOAD_SPILL_THRESHOLD = int(os.environ.get('UPLOAD_SPILL_THRESHOLD', 8 * 1024 * 1024))  # 8MB
+    
+    # Upload limits enforced while the request body is parsed (per file, files per request, bytes per request)
+    UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 15 * 1024 * 1024))  # 15MB
+    UPLOAD_MAX_FILES = int(os.environ.get('UPLOAD_MAX_FILES', 100))
+    UPLOAD_MAX_TOTAL_SIZE = int(os.environ.get('UPLOAD_MAX_TOTAL_SIZE', MAX_CONTENT_LENGTH))
+    
+    # Resumable pre-upload of images (/uploads): bytes per chunk, how long sessions are kept, and
+    # how many unfinished sessions one client (remote address) and the whole server may have open
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # 1MB
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))  # 1 day
+    UPLOAD_MAX_SESSIONS_PER_CLIENT = int(os.environ.get('UPLOAD_MAX_SESSIONS_PER_CLIENT', UPLOAD_MAX_FILES))
+    UPLOAD_MAX_OPEN_SESSIONS = int(os.environ.get('UPLOAD_MAX_OPEN_SESSIONS', 500))
+    
+    # Derived image variants cache (inside UPLOAD_FOLDER/variants): byte budget and max age
+    VARIANT_CACHE_MAX_BYTES = int(os.environ.get('VARIANT_CACHE_MAX_BYTES', 200 * 1024 * 1024))  # 200MB
+    VARIANT_CACHE_TTL = int(os.environ.get('VARIANT_CACHE_TTL', 7 * 24 * 3600))  # 7 days
+    
+    # Shared image preparation pool (saving, decoding, resizing uploads); 1 = sequential
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', min(4, os.cpu_count() or 1)))
+
+    # Bounded-memory generation: images are prepared at most IMAGE_PREFETCH ahead of insertion
+    # and spooled to a temporary file (in IMAGE_SPOOL_DIR, empty = system default) once embedded
+    STREAMING_GENERATION = os.environ.get('STREAMING_GENERATION', 'true').lower() == 'true'
+    IMAGE_PREFETCH = max(1, int(os.environ.get('IMAGE_PREFETCH', 8)))
+    IMAGE_SPOOL_DIR = os.environ.get('IMAGE_SPOOL_DIR', '')
+
+    # Feedback chart rendering processes (0 = render on the request thread) and per-request timeout
+    CHART_WORKERS = int(os.environ.get('CHART_WORKERS', min(4, os.cpu_count() or 1)))
+    CHART_RENDER_TIMEOUT = float(os.environ.get('CHART_RENDER_TIMEOUT', 30))  # seconds
+    CHART_START_METHOD = os.environ.get('CHART_START_METHOD', 'spawn')
+    
+    # Rendered chart PNG cache: in-memory byte budget, optional spill directory and its budget
+    CHART_CACHE_MAX_BYTES = int(os.environ.get('CHART_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # 32MB
+    CHART_CACHE_SPILL_DIR = os.environ.get('CHART_CACHE_SPILL_DIR', '')  # empty = memory only
+    CHART_CACHE_SPILL_MAX_BYTES = int(os.environ.get('CHART_CACHE_SPILL_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
+    
+    # Storage retention for OUTPUT_FOLDER and UPLOAD_FOLDER: total byte quota (over it, least recently used
+    # files are evicted down to the low watermark), per-class TTLs, and the incremental background sweep
+    STORAGE_RETENTION_ENABLED = os.environ.get('STORAGE_RETENTION_ENABLED', 'true').lower() == 'true'
+    STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 800 * 1024 * 1024))  # 800MB of the 1GB disk
+    STORAGE_LOW_WATERMARK = float(os.environ.get('STORAGE_LOW_WATERMARK', 0.9))  # fraction of the quota
+    REPORT_TTL = int(os.environ.get('REPORT_TTL', 7 * 24 * 3600))  # 7 days since last download
+    UPLOAD_TTL = int(os.environ.get('UPLOAD_TTL', 3 * 24 * 3600))  # 3 days since last use
+    RETENTION_MIN_AGE = int(os.environ.get('RETENTION_MIN_AGE', 600))  # files younger than this are never removed
+    RETENTION_INTERVAL = float(os.environ.get('RETENTION_INTERVAL', 60))  # seconds between sweep steps
+    RETENTION_BATCH = int(os.environ.get('RETENTION_BATCH', 500))  # entries scanned / files removed per step
+    
+    # Downloads and static files: '' serves bytes from Python, 'x-accel' (nginx) or 'x-sendfile' (Apache)
+    # hands them to the front proxy; X-Accel-Redirect paths are X_ACCEL_PREFIX + '/output/...' or '/static/...'
+    SENDFILE_MODE = os.environ.get('SENDFILE_MODE', '').lower()
+    X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/_protected')
+    STATIC_IMMUTABLE_MAX_AGE = int(os.environ.get('STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 3600))  # versioned static URLs
+    
+    # Admission control for generate requests (per process): concurrent generations, waiting requests,
+    # and estimated memory = ADMISSION_BASE_COST + upload bytes * ADMISSION_UPLOAD_FACTOR within the budget
+    ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 4))
+    ADMISSION_MAX_QUEUED = int(os.environ.get('ADMISSION_MAX_QUEUED', 8))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 15))  # seconds
+    ADMISSION_MEMORY_BUDGET = int(os.environ.get('ADMISSION_MEMORY_BUDGET', 1024 * 1024 * 1024))  # 1GB
+    ADMISSION_BASE_COST = int(os.environ.get('ADMISSION_BASE_COST', 32 * 1024 * 1024))  # 32MB
+    ADMISSION_UPLOAD_FACTOR = float(os.environ.get('ADMISSION_UPLOAD_FACTOR', 6))
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))  # minimum Retry-After, seconds
+    
+    # Background report jobs: SQLite queue, worker threads per process, running-job cap and
+    # queued-job backlog cap (all processes; submissions beyond the backlog get 503 + Retry-After)
+    ASYNC_JOBS = os.environ.get('ASYNC_JOBS', 'true').lower() == 'true'
+    JOB_DB_PATH = os.environ.get('JOB_DB_PATH') or os.path.join(BASE_DIR, 'instance', 'jobs.sqlite3')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_RUNNING = int(os.environ.get('JOB_MAX_RUNNING', 2))
+    JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', 20))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 5))  # seconds, multiplied by the attempt number
+    JOB_LEASE = float(os.environ.get('JOB_LEASE', 300))  # seconds without progress before a job is re-run
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+    JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 24 * 3600))  # finished jobs kept for 1 day
+    
+    # Instrumentation: per-stage spans, Server-Timing headers, slow request/job log threshold, and the
+    # number of recent observations per series behind the /metrics quantiles
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 5000))
+    METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 1024))
+    
+    # Structured logging: level, format ('json' lines or 'text'), per-event sample rates
+    # ('event=rate,...'), queue size (records beyond it are dropped), redaction limits for
+    # logged values (characters per string, items per list/form), and the rotating log file
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+    LOG_SAMPLING = os.environ.get('LOG_SAMPLING', '')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_MAX_VALUE = int(os.environ.get('LOG_MAX_VALUE', 200))
+    LOG_MAX_ITEMS = int(os.environ.get('LOG_MAX_ITEMS', 20))
+    LOG_FILE_MAX_BYTES = int(os.environ.get('LOG_FILE_MAX_BYTES', 10240000))
+    LOG_FILE_BACKUPS = int(os.environ.get('LOG_FILE_BACKUPS', 10))
+    
+    # Resource accounting of report generations: share of generations measured for CPU time and
+    # RSS, share that also trace allocation sites with tracemalloc (slower; at most the former),
+    # RSS sampling interval, allocation sites kept, outlier log thresholds, measurements kept
+    # for /admin/heaviest, and the token that endpoint requires (X-Admin-Token; unset disables it)
+    RESOURCE_SAMPLE_RATE = float(os.environ.get('RESOURCE_SAMPLE_RATE', 1.0))
+    TRACEMALLOC_SAMPLE_RATE = float(os.environ.get('TRACEMALLOC_SAMPLE_RATE', 0.0))
+    RESOURCE_SAMPLE_INTERVAL = float(os.environ.get('RESOURCE_SAMPLE_INTERVAL', 0.05))
+    TRACEMALLOC_FRAMES = int(os.environ.get('TRACEMALLOC_FRAMES', 1))
+    TRACEMALLOC_TOP = int(os.environ.get('TRACEMALLOC_TOP', 10))
+    RESOURCE_OUTLIER_RSS_MB = float(os.environ.get('RESOURCE_OUTLIER_RSS_MB', 300))
+    RESOURCE_OUTLIER_CPU_S = float(os.environ.get('RESOURCE_OUTLIER_CPU_S', 20))
+    RESOURCE_HISTORY = int(os.environ.get('RESOURCE_HISTORY', 500))
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    
+    # Batch generation (batch_generate.py): worker processes, 0 = one per usable core
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0))
+    
+    # Load matplotlib/start chart workers and parse templates in a background thread after boot
+    WARMUP_ON_STARTUP = os.environ.get('WARMUP_ON_STARTUP', 'false').lower() == 'true'
+    
     # Security
     ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
     SESSION_TIMEOUT = int(os.environ.get('SESSION_TIMEOUT', 3600))
@@ -47,21 +172,10 @@ class ProductionConfig(Config):
     def init_app(cls, app):
         Config.init_app(app)
         
-        # Production-specific setup
-        import logging
-        from logging.handlers import RotatingFileHandler
-        
-        # Setup logging
+        # Production-specific setup: events also go to a rotating file, written by the log thread
         if not app.debug:
-            file_handler = RotatingFileHandler(
-                'logs/app.log', maxBytes=10240000, backupCount=10
-            )
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-            ))
-            file_handler.setLevel(logging.INFO)
-            app.logger.addHandler(file_handler)
-            app.logger.setLevel(logging.INFO)
+            from modules.structured_logging import configure_logging
+            configure_logging(app, log_file=os.path.join(Config.BASE_DIR, 'logs', 'app.log'))
             app.logger.info('Application startup')
 
 class TestingConfig(Config):
@@ -8,6 +8,28 @@ PACKAGE STRUCTURE:
 - document_utils.py: Core Word document manipulation utilities
 - form_processing.py: Form data processing and validation
 - image_processing.py: Gallery and annexure image handling
+- chart_processing.py: Feedback chart generation and insertion
+- template_cache.py: Parsed Word template cache with per-request cloning
+- anchor_index.py: One-pass index of gallery/annexure/chart placeholders
+- xml_traversal.py: lxml-level paragraph/run/cell traversal helpers
+- package_writer.py: Raw-passthrough .docx writer with per-part compression
+- image_normalization.py: Placement-sized resizing and re-encoding of uploads
+- upload_store.py: Content-addressed upload storage and variant cache
+- worker_pool.py: Shared bounded pool for per-request image preparation
+- chart_service.py: Pre-warmed matplotlib process pool for feedback charts
+- chart_cache.py: Content-keyed LRU cache of rendered chart PNGs
+- warmup.py: Optional background warm-up of charts and templates after boot
+- job_queue.py: SQLite-backed background report jobs with progress and retries
+- admission.py: Concurrency/memory governor and load shedding for generate requests
+- chunked_upload.py: Resumable chunked pre-upload of images (/uploads API)
+- file_serving.py: ETag/Range/conditional serving of reports and static files, proxy offload
+- retention.py: Storage quota, per-class TTLs and LRU eviction of reports and uploads
+- batch.py: Manifest-driven batch generation on a process pool (batch_generate.py)
+- instrumentation.py: Stage spans, Server-Timing, slow-request log and Prometheus /metrics
+- resource_accounting.py: Sampled CPU, RSS and allocation-site accounting per generation
+- structured_logging.py: Queue-backed JSON event logging with sampling and redaction
+- image_spool.py: Disk-spooled image parts for bounded-memory generation of large reports
+- gallery_page.py: Prebuilt gallery page fragments cloned per page of images
 - __init__.py: Package initialization (this file)
 
 PURPOSE:
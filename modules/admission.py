@@ -0,0 +1,175 @@
+"""
+Admission Control Module
+========================
+
+FUNCTION: Limits how many report generations a process handles at once, and sheds load when saturated.
+
+RESPONSIBILITIES:
+- Cap concurrent generate requests (Config.ADMISSION_MAX_IN_FLIGHT)
+- Estimate the memory cost of a request from its upload size and keep the
+  total in flight under Config.ADMISSION_MEMORY_BUDGET
+- Let a bounded number of requests wait for capacity, first come first served
+- Reject requests beyond that with 503 Service Unavailable and a Retry-After header
+- Report in-flight, waiting and rejection counters for /health
+
+KEY FUNCTIONS:
+- admission: Shared AdmissionController of the process
+- admission_controlled(): View decorator applied to the generate routes
+- AdmissionController.estimate_cost(): Memory estimate for a request body size
+- AdmissionController.admit(): Context manager holding a slot for the duration of a generation
+- AdmissionController.stats(): Capacity and counters
+
+FEATURES:
+- The decision uses Content-Length only, before the multipart body is parsed,
+  so a rejected request never loads its uploads
+- A request larger than the whole memory budget still runs, but only on its own
+- Retry-After is derived from the recent generation time and the backlog ahead
+- Limits are per process: total capacity is these limits times the number of workers
+
+Admission control utilities for the Training Report Generator.
+"""
+import functools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import make_response, render_template, request
+
+import sys
+sys.path.append('..')
+from config import Config
+from .resource_accounting import accounted
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; carries the Retry-After delay in seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Counting governor over generation slots and estimated memory, with a bounded FIFO wait queue."""
+
+    def __init__(self, max_in_flight=None, max_queued=None, queue_timeout=None, memory_budget=None,
+                 base_cost=None, upload_factor=None, retry_after=None):
+        self.max_in_flight = max_in_flight if max_in_flight is not None else Config.ADMISSION_MAX_IN_FLIGHT
+        self.max_queued = max_queued if max_queued is not None else Config.ADMISSION_MAX_QUEUED
+        self.queue_timeout = queue_timeout if queue_timeout is not None else Config.ADMISSION_QUEUE_TIMEOUT
+        self.memory_budget = memory_budget if memory_budget is not None else Config.ADMISSION_MEMORY_BUDGET
+        self.base_cost = base_cost if base_cost is not None else Config.ADMISSION_BASE_COST
+        self.upload_factor = upload_factor if upload_factor is not None else Config.ADMISSION_UPLOAD_FACTOR
+        self.retry_after = retry_after if retry_after is not None else Config.ADMISSION_RETRY_AFTER
+
+        self._cond = threading.Condition()
+        self._waiting = deque()  # tickets of waiting requests, oldest first
+        self.in_flight = 0
+        self.reserved_bytes = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._avg_seconds = None  # moving average of generation time
+
+    def estimate_cost(self, content_length):
+        """Estimated peak memory (bytes) of generating a report from a request body of this size."""
+        return int(self.base_cost + (content_length or 0) * self.upload_factor)
+
+    def _fits(self, cost):
+        if self.in_flight >= self.max_in_flight:
+            return False
+        # Something must always be able to run, however large
+        return self.in_flight == 0 or self.reserved_bytes + cost <= self.memory_budget
+
+    def _retry_after(self):
+        """Seconds until capacity is likely to free up for a new request."""
+        if self._avg_seconds is None:
+            return self.retry_after
+        rounds = (len(self._waiting) + self.in_flight) / max(1, self.max_in_flight)
+        return max(self.retry_after, math.ceil(self._avg_seconds * rounds))
+
+    def _reject(self, reason):
+        self.rejected += 1
+        return Overloaded(reason, self._retry_after())
+
+    @contextmanager
+    def admit(self, cost):
+        """Hold a generation slot and cost bytes of the memory budget, waiting if needed.
+
+        Raises Overloaded when the wait queue is full or the wait exceeds the queue timeout.
+        """
+        with self._cond:
+            if self._waiting or not self._fits(cost):
+                if len(self._waiting) >= self.max_queued:
+                    raise self._reject('Too many report generations in progress')
+                ticket = object()
+                self._waiting.append(ticket)
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._waiting[0] is not ticket or not self._fits(cost):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            raise self._reject('Timed out waiting for a free generation slot')
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+            self.in_flight += 1
+            self.reserved_bytes += cost
+            self.admitted += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self.in_flight -= 1
+                self.reserved_bytes -= cost
+                self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return current capacity and admission counters."""
+        with self._cond:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queued': len(self._waiting),
+                'max_queued': self.max_queued,
+                'reserved_bytes': self.reserved_bytes,
+                'memory_budget': self.memory_budget,
+                'saturated': self.in_flight >= self.max_in_flight and len(self._waiting) >= self.max_queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_generation_seconds': round(self._avg_seconds, 3) if self._avg_seconds is not None else None,
+            }
+
+
+# Shared per-process governor used by the generate routes
+admission = AdmissionController()
+
+
+def admission_controlled(view):
+    """Run a generate view under the admission controller; answer 503 + Retry-After when saturated."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cost = admission.estimate_cost(request.content_length)
+        try:
+            with admission.admit(cost), accounted(f'{request.method} {request.path}', request.endpoint):
+                return view(*args, **kwargs)
+        except Overloaded as e:
+            log.warning('generation_rejected', reason=e.reason, retry_after_s=e.retry_after)
+            response = make_response(render_template(
+                'error.html', error=f"The server is busy generating other reports. Please try again in {e.retry_after} seconds."), 503)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+    return wrapper
@@ -0,0 +1,102 @@
+"""
+Structural Anchor Index Module
+==============================
+
+FUNCTION: One-pass index of structural placeholders (gallery, annexures, charts) in a document.
+
+RESPONSIBILITIES:
+- Scan the document body once and map each anchor placeholder to its paragraph element
+- Record anchor positions per template so clones can be remapped without rescanning
+- Provide O(1) anchor lookups for the gallery, annexure and chart insertion functions
+- Fall back to a linear scan when no index is supplied
+
+KEY FUNCTIONS:
+- AnchorIndex.build(): Indexes every anchor paragraph in a document
+- AnchorIndex.from_positions(): Remaps template-level anchor positions onto a clone
+- find_anchor_paragraph(): Looks up (or scans for) the paragraph holding a placeholder
+
+FEATURES:
+- Anchors are held as lxml element references, so the index stays valid while
+  tables, pictures and page breaks are inserted around them
+- Only the first occurrence of each placeholder is indexed, matching the
+  original "replace the first occurrence" behaviour of the insertion functions
+
+Anchor lookup utilities for Word document generation.
+"""
+import re
+
+from docx.text.paragraph import Paragraph
+
+from .xml_traversal import W_P, iter_body_paragraphs
+
+# Placeholders that mark where structural content (tables, pictures) is inserted
+ANCHOR_PATTERN = re.compile(r'\{\{(?:GALLERY_TABLE|ANNEXURE\d+_TABLE|FEEDBACK_CHARTS|FEEDBACK_CHART_\d+)\}\}')
+
+
+class AnchorIndex:
+    """Maps anchor placeholders to the body paragraphs that contain them."""
+
+    def __init__(self, doc, elements):
+        self._doc = doc
+        self._elements = elements
+
+    @classmethod
+    def build(cls, doc):
+        """Index every anchor placeholder found in the top-level body paragraphs."""
+        elements = {}
+        for p in iter_body_paragraphs(doc):
+            text = p.text
+            if '{{' not in text:
+                continue
+            for placeholder in ANCHOR_PATTERN.findall(text):
+                elements.setdefault(placeholder, p)
+        return cls(doc, elements)
+
+    @classmethod
+    def from_positions(cls, doc, positions):
+        """
+        Remap anchor positions (body child indexes recorded on the template)
+        onto a freshly cloned document. Falls back to a full scan if the clone
+        does not line up with the recorded positions.
+        """
+        body = doc.element.body
+        elements = {}
+        for placeholder, position in positions.items():
+            if position >= len(body):
+                return cls.build(doc)
+            element = body[position]
+            if element.tag != W_P or placeholder not in element.text:
+                return cls.build(doc)
+            elements[placeholder] = element
+        return cls(doc, elements)
+
+    def positions(self):
+        """Return {placeholder: body child index} for remapping onto clones."""
+        body = self._doc.element.body
+        return {placeholder: body.index(element) for placeholder, element in self._elements.items()}
+
+    def get(self, placeholder):
+        """Return the Paragraph holding placeholder, or None if it is not indexed."""
+        element = self._elements.get(placeholder)
+        if element is None:
+            return None
+        return Paragraph(element, self._doc._body)
+
+    def __contains__(self, placeholder):
+        return placeholder in self._elements
+
+    def __iter__(self):
+        return iter(self._elements)
+
+    def __len__(self):
+        return len(self._elements)
+
+
+def find_anchor_paragraph(doc, placeholder, anchors=None):
+    """Return the first body paragraph containing placeholder, via the index when given."""
+    if anchors is not None and ANCHOR_PATTERN.fullmatch(placeholder):
+        return anchors.get(placeholder)
+    for p in iter_body_paragraphs(doc):
+        if placeholder in p.text:
+            return Paragraph(p, doc._body)
+    return None
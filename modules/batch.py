@@ -0,0 +1,282 @@
+"""
+Batch Generation Module
+=======================
+
+FUNCTION: Generates many reports from a manifest of form payloads on a pool of worker processes.
+
+RESPONSIBILITIES:
+- Read a JSONL or CSV manifest: one report per line/row, with its training type,
+  form fields and image paths
+- Check every row up front (image files exist and are supported images)
+- Build each report with the same build_report() the web routes use, from a
+  Submission instead of a Flask request
+- Spread the reports over a process pool sized to the available cores
+- Collect per-report timings and failures and summarize throughput (reports/minute)
+
+KEY FUNCTIONS:
+- load_manifest(): Parses a .jsonl or .csv manifest into BatchItems
+- run_batch(): Generates every item and returns the summary dictionary
+- write_summary(): Writes a summary as JSON
+- default_workers(): Worker processes for this machine (Config.BATCH_WORKERS or the usable cores)
+
+FEATURES:
+- JSONL lines look like
+    {"name": "GEDA", "kind": "type_a",
+     "form": {"cell_name": "GEDA", "selected_template": "2", "rrecl_name[]": ["A", "B"]},
+     "files": {"gallery_image_1": "photos/hall.jpg"}}
+- CSV rows use one column per form field, "kind" and "name" columns, and
+  "file:<field>" columns for image paths; values of "...[]" fields are split on "|"
+- Relative image paths are resolved against the manifest's directory
+- Each worker renders charts in-process and prepares images sequentially, so
+  N workers keep N cores busy without oversubscribing them
+- A failing report is recorded in the summary and never stops the batch
+- Output names carry the row number (..._row7_report.docx), so rows with the
+  same date and cell name never overwrite each other
+
+Batch generation utilities for the Training Report Generator.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import sys
+sys.path.append('..')
+from config import Config
+from .upload_store import _sniff_image, _SNIFF_LENGTH
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_KIND = 'type_a'
+_FILE_COLUMN_PREFIX = 'file:'
+_LIST_SEPARATOR = '|'
+
+
+class ManifestError(ValueError):
+    """A manifest line or row cannot be turned into a report request."""
+
+
+class BatchItem:
+    """One report of a batch: training type, form fields and image files."""
+
+    def __init__(self, index, name, kind, form_items, file_items, error=None):
+        self.index = index
+        self.name = name
+        self.kind = kind
+        self.form_items = form_items    # [(field, value)]
+        self.file_items = file_items    # [(field, original filename, path)]
+        self.error = error              # why the item cannot be generated, if it cannot
+
+
+def _form_items(form):
+    items = []
+    for field, value in form.items():
+        values = value if isinstance(value, list) else [value]
+        items.extend((field, '' if v is None else str(v)) for v in values)
+    return items
+
+
+def _file_items(files, base_dir):
+    items = []
+    for field, path in files.items():
+        if not path:
+            continue
+        path = os.path.join(base_dir, os.path.expanduser(path))
+        if not os.path.isfile(path):
+            raise ManifestError(f"{field}: image '{path}' not found")
+        with open(path, 'rb') as f:
+            match = _sniff_image(f.read(_SNIFF_LENGTH))
+        if match is None or not (match[1] & Config.ALLOWED_EXTENSIONS):
+            raise ManifestError(f"{field}: '{path}' is not a supported image")
+        items.append((field, os.path.basename(path), path))
+    return items
+
+
+def _item(index, entry, base_dir, kinds):
+    name = entry.get('name') or f'#{index}'
+    kind = entry.get('kind') or DEFAULT_KIND
+    try:
+        if kinds is not None and kind not in kinds:
+            raise ManifestError(f"unknown training type '{kind}' (expected one of {', '.join(sorted(kinds))})")
+        return BatchItem(index, name, kind, _form_items(entry.get('form') or {}),
+                         _file_items(entry.get('files') or {}, base_dir))
+    except ManifestError as e:
+        return BatchItem(index, name, kind, [], [], error=str(e))
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ManifestError(f'{path}:{line_number}: invalid JSON ({e})')
+            if not isinstance(entry, dict):
+                raise ManifestError(f'{path}:{line_number}: expected a JSON object')
+            yield entry
+
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            entry = {'form': {}, 'files': {}}
+            for column, value in row.items():
+                if column is None:
+                    continue
+                value = (value or '').strip()
+                if column in ('name', 'kind'):
+                    entry[column] = value
+                elif column.startswith(_FILE_COLUMN_PREFIX):
+                    entry['files'][column[len(_FILE_COLUMN_PREFIX):]] = value
+                elif column.endswith('[]'):
+                    entry['form'][column] = value.split(_LIST_SEPARATOR) if value else []
+                else:
+                    entry['form'][column] = value
+            yield entry
+
+
+def load_manifest(path, kinds=None):
+    """
+    Parse a .jsonl or .csv manifest into BatchItems. Items that cannot be generated
+    (unknown kind, missing or invalid image) carry an error instead of failing the load.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    reader = _read_csv if path.lower().endswith('.csv') else _read_jsonl
+    return [_item(index, entry, base_dir, kinds) for index, entry in enumerate(reader(path), 1)]
+
+
+def default_workers(items=None):
+    """Config.BATCH_WORKERS, or the cores this process may run on; never more than the items."""
+    workers = Config.BATCH_WORKERS
+    if workers <= 0:
+        try:
+            workers = len(os.sched_getaffinity(0))
+        except AttributeError:  # not available on macOS / Windows
+            workers = os.cpu_count() or 1
+    if items is not None:
+        workers = min(workers, max(1, len(items)))
+    return max(1, workers)
+
+
+# -- worker side ---------------------------------------------------------------
+
+_app = None
+
+
+def _init_worker():
+    """Load the app once per worker process, with one core's worth of inner parallelism."""
+    global _app
+    Config.CHART_WORKERS = 0   # render charts in this process
+    Config.IMAGE_WORKERS = 1   # prepare images sequentially
+    # A batch process generates its own reports only: no web job workers, sweeps or warm-up
+    Config.ASYNC_JOBS = False
+    Config.STORAGE_RETENTION_ENABLED = False
+    Config.WARMUP_ON_STARTUP = False
+    os.chdir(Config.BASE_DIR)  # template paths are relative to the project root
+    from app import app
+    _app = app
+
+
+def _generate(index, kind, form_items, file_items):
+    """Build one report; returns (index, filename, seconds, error)."""
+    from .job_queue import Submission, job_queue
+    start = time.perf_counter()
+    submission = Submission(form_items, file_items, output_suffix=f'_row{index}')
+    try:
+        if kind not in job_queue.handlers:
+            raise ManifestError(f"unknown training type '{kind}' (expected one of {', '.join(sorted(job_queue.handlers))})")
+        handler, _ = job_queue.handlers[kind]
+        with _app.app_context():
+            filename = handler(submission)
+        return index, filename, time.perf_counter() - start, None
+    except Exception as e:
+        return index, None, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+    finally:
+        submission.close()
+
+
+# -- parent side ---------------------------------------------------------------
+
+def _summarize(items, results, workers, wall_seconds, manifest):
+    ok = [r for r in results if r['status'] == 'ok']
+    seconds = sorted(r['seconds'] for r in ok)
+    return {
+        'manifest': manifest,
+        'workers': workers,
+        'reports': len(items),
+        'succeeded': len(ok),
+        'failed': len(results) - len(ok),
+        'wall_seconds': round(wall_seconds, 3),
+        'reports_per_minute': round(len(ok) * 60 / wall_seconds, 2) if wall_seconds > 0 else None,
+        'report_seconds': {
+            'mean': round(statistics.mean(seconds), 3),
+            'median': round(statistics.median(seconds), 3),
+            'p95': round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 3),
+            'max': round(seconds[-1], 3),
+        } if seconds else None,
+        'results': sorted(results, key=lambda r: r['index']),
+    }
+
+
+def run_batch(items, workers=None, manifest=None):
+    """Generate every BatchItem and return the summary (per-report results and throughput)."""
+    workers = workers if workers is not None else default_workers(items)
+    runnable = [item for item in items if item.error is None]
+    results = [
+        {'index': item.index, 'name': item.name, 'kind': item.kind, 'status': 'failed',
+         'filename': None, 'seconds': 0.0, 'error': item.error}
+        for item in items if item.error is not None
+    ]
+    by_index = {item.index: item for item in runnable}
+
+    def record(index, filename, seconds, error):
+        item = by_index[index]
+        results.append({'index': index, 'name': item.name, 'kind': item.kind,
+                        'status': 'failed' if error else 'ok', 'filename': filename,
+                        'seconds': round(seconds, 3), 'error': error})
+        done = len(results)
+        if error:
+            log.error('batch_report_failed', done=done, total=len(items), name=item.name, error=error)
+        else:
+            log.info('batch_report_done', done=done, total=len(items), name=item.name, file=filename, seconds=round(seconds, 3))
+
+    for item in items:
+        if item.error is not None:
+            log.warning('batch_report_skipped', name=item.name, error=item.error)
+
+    log.info('batch_started', reports=len(runnable), workers=workers)
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_worker()
+        for item in runnable:
+            record(*_generate(item.index, item.kind, item.form_items, item.file_items))
+    elif runnable:
+        # spawn: workers never inherit the parent's threads or locks
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker) as pool:
+            futures = [pool.submit(_generate, item.index, item.kind, item.form_items, item.file_items)
+                       for item in runnable]
+            for future in as_completed(futures):
+                try:
+                    record(*future.result())
+                except Exception as e:  # the worker process itself died
+                    index = runnable[futures.index(future)].index
+                    record(index, None, 0.0, f'{type(e).__name__}: {e}')
+    wall_seconds = time.perf_counter() - start
+
+    summary = _summarize(items, results, workers, wall_seconds, manifest)
+    log.info('batch_finished', succeeded=summary['succeeded'], reports=summary['reports'], failed=summary['failed'],
+             wall_seconds=summary['wall_seconds'], reports_per_minute=summary['reports_per_minute'])
+    return summary
+
+
+def write_summary(summary, path):
+    """Write a batch summary as JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
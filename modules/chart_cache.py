@@ -0,0 +1,172 @@
+"""
+Chart Cache Module
+==================
+
+FUNCTION: Content-keyed cache of rendered feedback chart PNGs.
+
+RESPONSIBILITIES:
+- Key each chart by everything it is drawn from: question id, question text,
+  the three response counts, and the chart style version and DPI
+- Keep encoded PNG bytes in memory under a byte budget with LRU eviction
+- Optionally spill evicted charts to a disk directory (own byte budget)
+- Report hit/miss/eviction counters for monitoring
+
+KEY FUNCTIONS:
+- chart_key(): Stable content key for one question chart
+- ChartCache.get() / ChartCache.put(): Look up and store PNG bytes by key
+- ChartCache.stats(): Memory/disk usage and hit/miss counters
+
+FEATURES:
+- Regenerating a report, or two trainings with identical tallies, reuses the
+  same PNG instead of redrawing it at 300 dpi
+- Spilled charts survive restarts and are promoted back into memory on a hit
+- Thread-safe: one cache is shared by all requests of a process
+
+Chart cache utilities for feedback charts.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import sys
+sys.path.append('..')
+from config import Config
+
+
+def chart_key(question_data, style_version, dpi):
+    """Return the cache key of a question chart (a SHA-256 hex digest)."""
+    identity = [
+        style_version, dpi,
+        question_data['id'], question_data['question'],
+        question_data['strongly_agree'], question_data['agree'], question_data['partially_agree'],
+    ]
+    return hashlib.sha256(json.dumps(identity).encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    """LRU cache of PNG bytes with a memory byte budget and an optional disk spill."""
+
+    def __init__(self, max_bytes=None, spill_dir=None, spill_max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CHART_CACHE_MAX_BYTES
+        self.spill_dir = spill_dir if spill_dir is not None else Config.CHART_CACHE_SPILL_DIR
+        self.spill_max_bytes = spill_max_bytes if spill_max_bytes is not None else Config.CHART_CACHE_SPILL_MAX_BYTES
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> PNG bytes; least recently used first
+        self._bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f'{key}.png')
+
+    def get(self, key):
+        """Return the cached PNG bytes for key, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_spill(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.put(key, data, spill=False)
+        return data
+
+    def put(self, key, data, spill=True):
+        """Store PNG bytes under key, evicting least recently used entries over budget."""
+        if len(data) > self.max_bytes:
+            if spill:
+                self._write_spill(key, data)
+            return
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                old_key, old_data = self._entries.popitem(last=False)
+                self._bytes -= len(old_data)
+                self.evictions += 1
+                evicted.append((old_key, old_data))
+        for old_key, old_data in evicted:
+            self._write_spill(old_key, old_data)
+
+    def _read_spill(self, key):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # most recently used files are trimmed last
+            return data
+        except OSError:
+            return None
+
+    def _write_spill(self, key, data):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+        self._trim_spill()
+
+    def _trim_spill(self):
+        """Delete the least recently used spilled charts until the disk budget is met."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.png'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+                total += stat.st_size
+        for _, path, size in sorted(entries):
+            if total <= self.spill_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop all in-memory entries (spilled files are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return cache usage and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': ((self.hits + self.disk_hits) / lookups) if lookups else None,
+                'evictions': self.evictions,
+                'spill_dir': self.spill_dir or None,
+            }
@@ -8,15 +8,18 @@ RESPONSIBILITIES:
 - Generate horizontal bar charts for feedback questions
 - Process feedback data from form submissions
 - Create charts with proper styling and colors
-- Save charts as images for document insertion
+- Render charts to in-memory PNG streams for document insertion
 - Handle multiple feedback questions
 - Manage chart layout and formatting
 
 KEY FUNCTIONS:
 - generate_feedback_charts(): Creates bar charts from feedback data
+- submit_feedback_charts(): Starts rendering the charts in the chart worker pool
+- collect_feedback_charts(): Waits for the rendered charts and returns them as PNG streams
 - process_feedback_data(): Extracts and validates feedback form data
 - create_chart_image(): Generates individual chart images
 - insert_charts_in_document(): Inserts generated charts into Word document
+- load_pyplot(): Imports matplotlib/numpy on first use
 
 FEATURES:
 - Professional chart styling with custom colors
@@ -25,23 +28,45 @@ FEATURES:
 - Chart export in high resolution
 - Support for multiple questions
 - Color-coded responses (Strongly Agree, Agree, Partially Agree)
+- Charts render concurrently in pre-warmed worker processes (see chart_service.py)
+- Fallback text at the placeholder of a chart that failed or timed out
+- Identical charts are served from a content-keyed PNG cache (see chart_cache.py)
+- Importing this module does not import matplotlib or numpy
 """
 
-import matplotlib
-# Set backend to 'Agg' for headless environments (Render deployment)
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import numpy as np
 import os
-import tempfile
+import io
+import threading
 from docx.shared import Inches, Cm
 from docx import Document
-from .document_utils import find_and_replace_text
+from .document_utils import find_and_replace_text, find_and_replace_text_bulk
+from .anchor_index import AnchorIndex
+from .chart_service import CHART_DPI
+from .instrumentation import instrumented
+from .structured_logging import get_logger
 
-# Set matplotlib to use a non-interactive backend for server environments
-import matplotlib
-matplotlib.use('Agg')
+log = get_logger(__name__)
+
+# Shown at a chart placeholder when its chart failed to render or timed out
+CHART_FALLBACK_TEXT = 'Chart could not be generated.'
+
+# matplotlib and numpy are imported on first use (see load_pyplot)
+_pyplot = None
+_pyplot_lock = threading.Lock()
+
+
+def load_pyplot():
+    """Import matplotlib (headless 'Agg' backend), pyplot and numpy once; returns (plt, np)."""
+    global _pyplot
+    with _pyplot_lock:
+        if _pyplot is None:
+            import matplotlib
+            # Set backend to 'Agg' for headless environments (Render deployment)
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            import numpy as np
+            _pyplot = (plt, np)
+        return _pyplot
 
 
 def process_feedback_data(request):
@@ -76,9 +101,11 @@ def process_feedback_data(request):
 
 def create_chart_image(question_data, chart_path):
     """Create a horizontal bar chart for a single question."""
+    plt, np = load_pyplot()
+    
     # Set up the figure with professional styling
     plt.style.use('default')
-    fig, ax = plt.subplots(figsize=(10, 3), dpi=300)
+    fig, ax = plt.subplots(figsize=(10, 3), dpi=CHART_DPI)
     
     # Colors matching the frontend design
     colors = ['#10b981', '#3b82f6', '#f59e0b']  # Green, Blue, Orange
@@ -137,165 +164,168 @@ def create_chart_image(question_data, chart_path):
     fig.patch.set_edgecolor('#333333')
     fig.patch.set_linewidth(3)
     
-    plt.savefig(chart_path, dpi=300, bbox_inches='tight', 
+    plt.savefig(chart_path, dpi=CHART_DPI, bbox_inches='tight', 
                 facecolor='white', edgecolor='#333333')
     plt.close()
 
 
-def generate_feedback_charts(request):
-    """Generate all feedback charts and return their file paths."""
-    feedback_data = process_feedback_data(request)
-    chart_paths = []
-    
-    # Create temporary directory for charts
-    temp_dir = tempfile.mkdtemp()
-    
-    for question_data in feedback_data:
-        if question_data['total'] > 0:  # Only create charts for questions with responses
-            chart_filename = f"feedback_chart_q{question_data['id']}.png"
-            chart_path = os.path.join(temp_dir, chart_filename)
-            
-            create_chart_image(question_data, chart_path)
-            chart_paths.append(chart_path)
-            
-            print(f"📊 Generated chart for Question {question_data['id']}: {chart_path}")
+@instrumented('charts')
+def submit_feedback_charts(request):
+    """Start rendering the feedback charts on the chart service; returns a ChartJob."""
+    from .chart_service import chart_service
     
-    return chart_paths
+    feedback_data = process_feedback_data(request)
+    # Only create charts for questions with responses
+    questions = [question_data for question_data in feedback_data if question_data['total'] > 0]
+    return chart_service.submit(questions)
+
+
+@instrumented('charts')
+def collect_feedback_charts(chart_job):
+    """Wait for a ChartJob and return in-memory PNG streams (None for charts that failed)."""
+    return [io.BytesIO(chart) if chart is not None else None for chart in chart_job.result()]
+
+
+def _chart_name(chart, index):
+    """Return a printable name for a chart given as a file path or a stream."""
+    return os.path.basename(chart) if isinstance(chart, str) else f"chart {index + 1}"
+
+
+def _chart_exists(chart):
+    """Return True if a chart stream is present or a chart file exists."""
+    return not isinstance(chart, str) or os.path.exists(chart)
+
+
+@instrumented('charts')
+def generate_feedback_charts(request):
+    """Generate all feedback charts and return them as PNG streams (None for charts that failed)."""
+    return collect_feedback_charts(submit_feedback_charts(request))
 
 
-def insert_charts_in_document(doc, chart_paths, placeholder='{{FEEDBACK_CHARTS}}'):
-    """Insert generated charts into the Word document at individual placeholders."""
-    if not chart_paths:
-        print("⚠️ No charts to insert")
+@instrumented('charts')
+def insert_charts_in_document(doc, charts, placeholder='{{FEEDBACK_CHARTS}}', anchors=None):
+    """Insert generated charts (PNG streams or file paths) into the Word document at individual placeholders."""
+    if not charts:
+        log.debug('charts_empty')
         # Remove both old and new placeholder formats
-        find_and_replace_text(doc, placeholder, 'No feedback data provided for chart generation.')
+        no_data = {placeholder: 'No feedback data provided for chart generation.'}
         for i in range(1, 5):  # Remove up to 4 individual placeholders
-            find_and_replace_text(doc, f'{{{{FEEDBACK_CHART_{i}}}}}', 'No feedback data available.')
+            no_data[f'{{{{FEEDBACK_CHART_{i}}}}}'] = 'No feedback data available.'
+        find_and_replace_text_bulk(doc, no_data)
         return
     
-    # Check if document uses individual chart placeholders
-    uses_individual_placeholders = False
-    individual_placeholders_found = []
+    if anchors is None:
+        anchors = AnchorIndex.build(doc)
     
-    for para in doc.paragraphs:
-        para_text = para.text
-        for i in range(1, 5):
-            placeholder_name = f'FEEDBACK_CHART_{i}'
-            if placeholder_name in para_text:
-                uses_individual_placeholders = True
-                individual_placeholders_found.append(f'{{{{FEEDBACK_CHART_{i}}}}}')
+    # Check if document uses individual chart placeholders
+    individual_placeholders_found = [
+        f'{{{{FEEDBACK_CHART_{i}}}}}' for i in range(1, 5)
+        if f'{{{{FEEDBACK_CHART_{i}}}}}' in anchors
+    ]
+    uses_individual_placeholders = bool(individual_placeholders_found)
     
-    print(f"🔍 Individual placeholders found: {individual_placeholders_found}")
-    print(f"📊 Available charts: {len(chart_paths)}")
+    log.debug('charts_inserting', placeholders=individual_placeholders_found, charts=len(charts))
     
     if uses_individual_placeholders:
-        print("✅ Using individual chart placeholder mode")
         # Insert charts at individual placeholders
-        for i, chart_path in enumerate(chart_paths):
+        for i, chart in enumerate(charts):
             if i >= 4:  # Limit to 4 charts max
-                print(f"⚠️ Limiting to 4 charts, skipping chart {i+1}")
+                log.warning('charts_truncated', inserted=4, charts=len(charts))
                 break
                 
             chart_placeholder = f'{{{{FEEDBACK_CHART_{i+1}}}}}'
-            print(f"📍 Processing {chart_placeholder} with chart: {os.path.basename(chart_path)}")
+            if chart is None:
+                log.warning('chart_missing', placeholder=chart_placeholder)
+                find_and_replace_text(doc, chart_placeholder, CHART_FALLBACK_TEXT)
+                continue
             
-            if os.path.exists(chart_path):
+            if _chart_exists(chart):
                 try:
-                    # Find the paragraph with this specific placeholder
-                    placeholder_found = False
-                    for para in doc.paragraphs:
-                        if chart_placeholder in para.text:
-                            print(f"🎯 Found placeholder {chart_placeholder} in paragraph")
-                            
-                            # Clear the placeholder text
-                            para.clear()
-                            
-                            # Insert the chart image
-                            run = para.add_run()
-                            run.add_picture(chart_path, width=Cm(15))  # Full page width
-                            
-                            # Center the image
-                            para.alignment = 1  # Center alignment
-                            
-                            print(f"✅ Inserted chart {i+1} at {chart_placeholder}: {os.path.basename(chart_path)}")
-                            placeholder_found = True
-                            break
-                    
-                    if not placeholder_found:
-                        print(f"⚠️ Placeholder {chart_placeholder} not found in document")
+                    # Look up the paragraph with this specific placeholder
+                    para = anchors.get(chart_placeholder)
+                    if para is not None:
+                        # Clear the placeholder text
+                        para.clear()
+                        
+                        # Insert the chart image
+                        run = para.add_run()
+                        run.add_picture(chart, width=Cm(15))  # Full page width
+                        
+                        # Center the image
+                        para.alignment = 1  # Center alignment
+                        
+                        log.debug('chart_inserted', placeholder=chart_placeholder, chart=_chart_name(chart, i))
+                    else:
+                        log.warning('chart_placeholder_missing', placeholder=chart_placeholder)
                         
                 except Exception as e:
-                    print(f"❌ Error inserting chart {chart_path}: {str(e)}")
+                    log.error('chart_insert_failed', chart=_chart_name(chart, i), error=str(e))
                     # Replace placeholder with error message if it exists
-                    find_and_replace_text(doc, chart_placeholder, f"Error loading chart: {os.path.basename(chart_path)}")
+                    find_and_replace_text(doc, chart_placeholder, f"Error loading chart: {_chart_name(chart, i)}")
             else:
-                print(f"❌ Chart file not found: {chart_path}")
+                log.error('chart_file_missing', chart=chart)
                 find_and_replace_text(doc, chart_placeholder, "Chart file not found")
         
         # Remove any unused placeholders (charts 3 and 4 if only 2 charts generated)
-        for i in range(len(chart_paths) + 1, 5):
-            unused_placeholder = f'{{{{FEEDBACK_CHART_{i}}}}}'
-            find_and_replace_text(doc, unused_placeholder, '')
-            print(f"🧹 Removed unused placeholder: {unused_placeholder}")
+        unused_placeholders = {f'{{{{FEEDBACK_CHART_{i}}}}}': '' for i in range(len(charts) + 1, 5)}
+        find_and_replace_text_bulk(doc, unused_placeholders)
+        for unused_placeholder in unused_placeholders:
+            log.debug('chart_placeholder_removed', placeholder=unused_placeholder)
             
     else:
-        print("✅ Using legacy single placeholder mode")
         # Fall back to old method - single placeholder
-        placeholder_found = False
-        for para in doc.paragraphs:
-            if placeholder in para.text:
-                placeholder_found = True
-                print(f"🎯 Found legacy placeholder {placeholder}")
-                
-                # Clear the placeholder text
-                para.clear()
-                
-                # Insert each chart as a new paragraph
-                current_para = para
-                for i, chart_path in enumerate(chart_paths):
-                    if os.path.exists(chart_path):
-                        try:
-                            # Use the current paragraph for the first chart
-                            if i == 0:
-                                target_para = current_para
-                            else:
-                                # Create new paragraph for additional charts
-                                target_para = para._parent.add_paragraph()
-                            
-                            # Insert the chart image
-                            run = target_para.add_run()
-                            run.add_picture(chart_path, width=Cm(15))  # Full page width
-                            
-                            # Center the image
-                            target_para.alignment = 1  # Center alignment
-                            
-                            # Add spacing between charts
-                            if i < len(chart_paths) - 1:
-                                spacing_para = para._parent.add_paragraph()
-                                spacing_para.add_run().add_break()
-                            
-                            print(f"✅ Inserted chart: {os.path.basename(chart_path)}")
-                            
-                        except Exception as e:
-                            print(f"❌ Error inserting chart {chart_path}: {str(e)}")
-                            # Add error message to document
-                            error_para = para._parent.add_paragraph()
-                            error_para.add_run(f"Error loading chart: {os.path.basename(chart_path)}")
-                    else:
-                        print(f"❌ Chart file not found: {chart_path}")
-                
-                break
-        
-        if not placeholder_found:
-            print(f"⚠️ Legacy placeholder {placeholder} not found in document")
-    
-    # Clean up temporary files
-    for chart_path in chart_paths:
+        para = anchors.get(placeholder)
+        if para is not None:
+            # Clear the placeholder text
+            para.clear()
+            
+            # Insert each chart as a new paragraph
+            current_para = para
+            for i, chart in enumerate(charts):
+                if chart is None:
+                    log.warning('chart_missing', placeholder=placeholder)
+                    target_para = current_para if i == 0 else para._parent.add_paragraph()
+                    target_para.add_run(CHART_FALLBACK_TEXT)
+                elif _chart_exists(chart):
+                    try:
+                        # Use the current paragraph for the first chart
+                        if i == 0:
+                            target_para = current_para
+                        else:
+                            # Create new paragraph for additional charts
+                            target_para = para._parent.add_paragraph()
+                        
+                        # Insert the chart image
+                        run = target_para.add_run()
+                        run.add_picture(chart, width=Cm(15))  # Full page width
+                        
+                        # Center the image
+                        target_para.alignment = 1  # Center alignment
+                        
+                        # Add spacing between charts
+                        if i < len(charts) - 1:
+                            spacing_para = para._parent.add_paragraph()
+                            spacing_para.add_run().add_break()
+                        
+                        log.debug('chart_inserted', placeholder=placeholder, chart=_chart_name(chart, i))
+                        
+                    except Exception as e:
+                        log.error('chart_insert_failed', chart=_chart_name(chart, i), error=str(e))
+                        # Add error message to document
+                        error_para = para._parent.add_paragraph()
+                        error_para.add_run(f"Error loading chart: {_chart_name(chart, i)}")
+                else:
+                    log.error('chart_file_missing', chart=chart)
+        else:
+            log.warning('chart_placeholder_missing', placeholder=placeholder)
+    
+    # Clean up chart files passed by path
+    for chart in charts:
         try:
-            if os.path.exists(chart_path):
-                os.remove(chart_path)
+            if isinstance(chart, str) and os.path.exists(chart):
+                os.remove(chart)
         except Exception as e:
-            print(f"⚠️ Could not remove temporary chart file {chart_path}: {str(e)}")
+            log.warning('chart_file_cleanup_failed', chart=chart, error=str(e))
 
 
 def create_summary_feedback_chart(feedback_data, chart_path):
@@ -303,6 +333,7 @@ def create_summary_feedback_chart(feedback_data, chart_path):
     if not feedback_data or all(q['total'] == 0 for q in feedback_data):
         return None
     
+    plt, np = load_pyplot()
     plt.style.use('default')
     fig, ax = plt.subplots(figsize=(12, 8), dpi=300)
     
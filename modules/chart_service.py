@@ -0,0 +1,240 @@
+"""
+Chart Rendering Service Module
+==============================
+
+FUNCTION: Renders feedback charts in a pool of pre-warmed matplotlib worker processes.
+
+RESPONSIBILITIES:
+- Own a process pool sized by Config.CHART_WORKERS, created on first use
+- Import matplotlib (Agg backend) and build its font cache once per worker at startup
+- Render every question chart of a request concurrently
+- Serve charts already drawn with the same content from the chart cache
+- Enforce a per-request deadline (Config.CHART_RENDER_TIMEOUT)
+- Report failed or timed-out charts as None so the document gets fallback text
+- Replace the pool if a worker process dies
+- Report render, failure and timeout counters
+
+KEY FUNCTIONS:
+- chart_service: Shared ChartService used by the Type C routes
+- ChartService.submit(): Starts rendering charts for a list of questions; returns a ChartJob
+- ChartJob.result(): PNG bytes in question order (None where rendering failed)
+- ChartService.warm_up(): Starts every worker process ahead of the first request
+- ChartService.stats(): Pool size and counters
+
+FEATURES:
+- Rendering runs outside the web worker process: the request thread keeps
+  assembling the document and only waits when the charts are inserted
+- matplotlib is never imported by the web process for rendering
+- Identical charts requested concurrently are rendered once
+- Workers are started with Config.CHART_START_METHOD ('spawn' by default),
+  so they do not inherit the threads or locks of the web worker
+- CHART_WORKERS=0 renders on the request thread (no child processes)
+
+Chart rendering service utilities for feedback charts.
+"""
+import io
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import sys
+sys.path.append('..')
+from config import Config
+from .chart_cache import ChartCache, chart_key
+from .worker_pool import run_inline
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+# Bump whenever create_chart_image() changes how charts look, so cached PNGs are not reused
+CHART_STYLE_VERSION = 1
+CHART_DPI = 300
+
+
+def _init_worker():
+    """Load matplotlib and its font cache once, when the worker process starts."""
+    from .chart_processing import load_pyplot
+    plt, _ = load_pyplot()
+
+    # Draw a small bold title so font lookup, text layout and the Agg renderer are all loaded
+    fig, ax = plt.subplots(figsize=(1, 1), dpi=72)
+    ax.set_title('warm-up', fontweight='bold')
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render_chart(question_data):
+    """Render one question chart and return its PNG bytes (runs in a worker process)."""
+    from .chart_processing import create_chart_image
+    output = io.BytesIO()
+    create_chart_image(question_data, output)
+    return output.getvalue()
+
+
+class ChartJob:
+    """Charts of one request being rendered in the background."""
+
+    def __init__(self, service, questions, futures, deadline):
+        self.service = service
+        self.questions = questions
+        self.futures = futures
+        self.deadline = deadline
+
+    def result(self):
+        """Wait (until the deadline) and return PNG bytes in question order, None for failures."""
+        charts = []
+        for question_data, future in zip(self.questions, self.futures):
+            remaining = max(0.0, self.deadline - time.monotonic())
+            try:
+                chart = future.result(timeout=remaining)
+                log.debug('chart_rendered', question=question_data['id'], bytes=len(chart))
+            except FutureTimeoutError:
+                # The render may be shared with other requests for the same chart (and its
+                # result still feeds the cache): only cancel it when no one else waits for it
+                if self.service._release(future):
+                    future.cancel()
+                chart = None
+                self.service._count('timeouts')
+                log.warning('chart_timed_out', question=question_data['id'], timeout_s=self.service.timeout)
+            except BrokenProcessPool as e:
+                chart = None
+                self.service._count('failures')
+                self.service._discard_pool()
+                log.error('chart_worker_died', question=question_data['id'], error=str(e))
+            except Exception as e:
+                chart = None
+                self.service._count('failures')
+                log.error('chart_failed', question=question_data['id'], error=str(e))
+            charts.append(chart)
+        return charts
+
+
+class ChartService:
+    """Process pool of matplotlib workers that render feedback charts."""
+
+    def __init__(self, workers=None, timeout=None, start_method=None, cache=None):
+        self.workers = workers if workers is not None else Config.CHART_WORKERS
+        self.timeout = timeout if timeout is not None else Config.CHART_RENDER_TIMEOUT
+        self.start_method = start_method or Config.CHART_START_METHOD
+        self.cache = cache if cache is not None else ChartCache()
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_flight = {}  # chart key -> Future of a render still running
+        self._waiters = {}    # Future of a render still running -> requests waiting for it
+        self.counters = {'renders': 0, 'failures': 0, 'timeouts': 0, 'pool_restarts': 0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                )
+            return self._pool
+
+    def _discard_pool(self):
+        """Drop a broken pool; the next submission starts a fresh one."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            if pool is not None:
+                self.counters['pool_restarts'] += 1
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def submit(self, questions):
+        """Start rendering one chart per question (cached charts are reused); returns a ChartJob."""
+        deadline = time.monotonic() + self.timeout
+        return ChartJob(self, questions, [self._submit_one(q) for q in questions], deadline)
+
+    def _submit_one(self, question_data):
+        """Return a Future of the PNG bytes of one chart, from the cache, a running render or a new one."""
+        key = chart_key(question_data, CHART_STYLE_VERSION, CHART_DPI)
+        data = self.cache.get(key)
+        if data is not None:
+            future = Future()
+            future.set_result(data)
+            return future
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._waiters[future] += 1
+                return future
+
+        if self.workers <= 0:
+            future = run_inline(_render_chart, question_data)
+        else:
+            try:
+                future = self._get_pool().submit(_render_chart, question_data)
+            except BrokenProcessPool:
+                # A worker died since the last request: start over with a fresh pool once
+                self._discard_pool()
+                future = self._get_pool().submit(_render_chart, question_data)
+
+        with self._lock:
+            self._in_flight[key] = future
+            self._waiters[future] = 1
+        future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    def _finish(self, key, future):
+        """Cache a completed render and forget it as in flight."""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            self._waiters.pop(future, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._count('renders')
+        self.cache.put(key, future.result())
+
+    def _release(self, future):
+        """A request stops waiting for a render; returns True if no other request waits for it."""
+        with self._lock:
+            waiters = self._waiters.get(future)
+            if waiters is None:
+                return False  # finished already, or never shared through _in_flight
+            if waiters > 1:
+                self._waiters[future] = waiters - 1
+                return False
+            del self._waiters[future]
+            return True
+
+    def warm_up(self):
+        """Start all worker processes now (each runs its matplotlib warm-up)."""
+        if self.workers <= 0:
+            return
+        pool = self._get_pool()
+        for future in [pool.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        """Return the pool configuration and render counters."""
+        with self._lock:
+            stats = dict(self.counters, workers=self.workers, timeout=self.timeout,
+                         running=self._pool is not None, in_flight=len(self._in_flight))
+        stats['cache'] = self.cache.stats()
+        return stats
+
+
+# Shared per-process service used by the Type C routes
+chart_service = ChartService()
@@ -0,0 +1,278 @@
+"""
+Chunked Upload Module
+=====================
+
+FUNCTION: Resumable, chunked pre-upload of images before the report form is submitted.
+
+RESPONSIBILITIES:
+- Open an upload session for a file (name and size) and return its id
+- Append chunks at the offset the server has already received, so an
+  interrupted upload resumes where it stopped instead of starting over
+- Check the image magic number on the first chunk and the size limits on every chunk
+- On the last chunk, hash the file and move it into the content-addressed upload store
+- Resolve "<field>_id" form values to the stored upload when the form is submitted
+- Expire sessions after Config.UPLOAD_SESSION_TTL
+- Limit unfinished sessions per client and in total
+
+KEY FUNCTIONS:
+- get_upload_sessions(): Shared UploadSessions of the upload store
+- UploadSessions.create(): Opens a session and returns its state (id, offset, size)
+- UploadSessions.append(): Writes one chunk at an offset and returns the new state
+- UploadSessions.status(): Current offset of a session, for resuming
+- UploadSessions.get_upload(): The completed Upload for an id
+- form_upload(): The file of a form field, either uploaded with the form or pre-uploaded by id
+- preuploaded_files(): Every pre-uploaded file a submitted form names by id
+
+FEATURES:
+- Session state lives on disk (UPLOAD_FOLDER/incoming), so any app process can
+  take the next chunk and sessions survive restarts
+- A chunk at the wrong offset is refused with 409 and the current offset,
+  which is where the client resumes
+- Appending is serialized per session with a file lock where available; the
+  offset is the size of the locked file, not the handle's (stale) position
+- Opening a session beyond Config.UPLOAD_MAX_SESSIONS_PER_CLIENT answers 429,
+  beyond Config.UPLOAD_MAX_OPEN_SESSIONS 503; the client then sends the image
+  with the form instead
+- The generate request then carries only ids and captions
+
+Chunked upload utilities for the Training Report Generator.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+from werkzeug.exceptions import (BadRequest, Conflict, NotFound, RequestEntityTooLarge, ServiceUnavailable,
+                                 TooManyRequests, UnsupportedMediaType)
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions are still serialized within one process
+    fcntl = None
+
+import sys
+sys.path.append('..')
+from config import Config
+from .upload_store import Upload, UploadStore, get_upload_store, _sniff_image, _SNIFF_LENGTH
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class OffsetMismatch(Conflict):
+    """A chunk was sent for an offset other than the one the server expects; carries the session state."""
+
+    def __init__(self, state):
+        super().__init__(f"Expected offset {state['offset']}")
+        self.state = state
+
+
+class UploadSessions:
+    """Resumable upload sessions stored next to the upload store."""
+
+    def __init__(self, store, chunk_size=None, ttl=None, max_per_client=None, max_open=None):
+        self.store = store
+        self.dir = os.path.join(store.root, 'incoming')
+        self.chunk_size = chunk_size if chunk_size is not None else Config.UPLOAD_CHUNK_SIZE
+        self.ttl = ttl if ttl is not None else Config.UPLOAD_SESSION_TTL
+        self.max_per_client = max_per_client if max_per_client is not None else Config.UPLOAD_MAX_SESSIONS_PER_CLIENT
+        self.max_open = max_open if max_open is not None else Config.UPLOAD_MAX_OPEN_SESSIONS
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _paths(self, upload_id):
+        if not _ID_PATTERN.match(upload_id or ''):
+            raise NotFound('Unknown upload id')
+        base = os.path.join(self.dir, upload_id)
+        return base + '.json', base + '.part'
+
+    def _read_meta(self, upload_id):
+        meta_path, _ = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise NotFound('Unknown or expired upload id')
+
+    def _write_meta(self, meta):
+        meta_path, _ = self._paths(meta['id'])
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _state(self, meta, offset):
+        return {
+            'id': meta['id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': offset,
+            'complete': meta.get('path') is not None,
+            'chunk_size': self.chunk_size,
+        }
+
+    def _open_clients(self):
+        """Return the client of every unfinished session (its .part file is moved to the store on completion)."""
+        clients = []
+        for entry in os.scandir(self.dir):
+            if entry.name.endswith('.part'):
+                try:
+                    with open(entry.path[:-len('.part')] + '.json') as f:
+                        clients.append(json.load(f).get('client'))
+                except (OSError, ValueError):
+                    pass  # being created or purged
+        return clients
+
+    def create(self, filename, size, client=None):
+        """Open an upload session for a file of size bytes, for client (e.g. the remote address)."""
+        if not filename or not isinstance(size, int) or size <= 0:
+            raise BadRequest('An upload needs a filename and a positive size')
+        if size > Config.UPLOAD_MAX_FILE_SIZE:
+            raise RequestEntityTooLarge(f"'{filename}' is larger than {Config.UPLOAD_MAX_FILE_SIZE / (1024 * 1024):.3g}MB")
+        self.purge_expired()
+
+        meta = {'id': uuid.uuid4().hex, 'filename': filename, 'size': size, 'created_at': time.time(),
+                'client': client, 'digest': None, 'path': None}
+        _, part_path = self._paths(meta['id'])
+        # Count and create under the process lock; across processes the limits are approximate
+        with self._lock:
+            clients = self._open_clients()
+            if len(clients) >= self.max_open:
+                raise ServiceUnavailable('Too many uploads in progress; the image will be sent with the form')
+            if client is not None and clients.count(client) >= self.max_per_client:
+                raise TooManyRequests(f'At most {self.max_per_client} uploads can be in progress at once')
+            self._write_meta(meta)
+            open(part_path, 'wb').close()
+        return self._state(meta, 0)
+
+    def status(self, upload_id):
+        """Return the session state; offset is the number of bytes received so far."""
+        meta = self._read_meta(upload_id)
+        if meta.get('path') is not None:
+            return self._state(meta, meta['size'])
+        _, part_path = self._paths(upload_id)
+        try:
+            offset = os.path.getsize(part_path)
+        except OSError:
+            raise NotFound('Unknown or expired upload id')
+        return self._state(meta, offset)
+
+    def append(self, upload_id, offset, stream, length):
+        """Write length bytes from stream at offset; completes the upload on its last byte."""
+        if length is None or length <= 0:
+            raise BadRequest('A chunk needs a Content-Length')
+        if length > self.chunk_size:
+            raise RequestEntityTooLarge(f'Chunks are limited to {self.chunk_size} bytes')
+        meta = self._read_meta(upload_id)
+        _, part_path = self._paths(upload_id)
+        if meta.get('path') is not None:
+            raise OffsetMismatch(self._state(meta, meta['size']))
+
+        # flock serializes appends across threads and processes; without it, fall back to a process lock
+        with (self._lock if fcntl is None else nullcontext()), open(part_path, 'ab') as part:
+            if fcntl is not None:
+                fcntl.flock(part, fcntl.LOCK_EX)
+            meta = self._read_meta(upload_id)  # another process may have completed it meanwhile
+            if meta.get('path') is not None:
+                raise OffsetMismatch(self._state(meta, meta['size']))
+            received = os.fstat(part.fileno()).st_size  # tell() predates the lock
+            if offset != received:
+                raise OffsetMismatch(self._state(meta, received))
+            if offset + length > meta['size']:
+                raise BadRequest('Chunk extends past the declared file size')
+
+            data = stream.read(length)
+            if len(data) != length:
+                raise BadRequest('Chunk body is shorter than its Content-Length')
+            if offset == 0:
+                match = _sniff_image(data[:_SNIFF_LENGTH])
+                if match is None or not (match[1] & Config.ALLOWED_EXTENSIONS):
+                    raise UnsupportedMediaType(f"'{meta['filename']}' is not a supported image")
+            part.write(data)
+            part.flush()
+            offset += length
+
+            if offset == meta['size']:
+                meta = self._complete(meta, part_path)
+        return self._state(meta, offset)
+
+    def _complete(self, meta, part_path):
+        """Hash the received file and move it into the upload store."""
+        digest = UploadStore.digest_for(part_path)
+        ext = os.path.splitext(secure_filename(meta['filename']))[1].lower()
+        meta['path'] = self.store._commit(part_path, digest, ext, meta['size'])
+        meta['digest'] = digest
+        self._write_meta(meta)
+        return meta
+
+    def get_upload(self, upload_id):
+        """Return the Upload of a completed session (400 for unknown, expired or unfinished uploads)."""
+        try:
+            meta = self._read_meta(upload_id)
+        except NotFound:
+            raise BadRequest('An uploaded image has expired; please attach it again')
+        if meta.get('path') is None:
+            raise BadRequest(f"Upload of '{meta['filename']}' is not complete")
+        if not os.path.exists(meta['path']):
+            raise BadRequest(f"Upload of '{meta['filename']}' has expired; please attach it again")
+        return Upload(meta['filename'], meta['digest'], meta['size'], path=meta['path'])
+
+    def purge_expired(self):
+        """Delete sessions older than the TTL (checked at most once a minute)."""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        for entry in os.scandir(self.dir):
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_upload_sessions():
+    """Return the shared UploadSessions of the upload store."""
+    store = get_upload_store()
+    with _sessions_lock:
+        sessions = _sessions.get(store.root)
+        if sessions is None:
+            sessions = _sessions[store.root] = UploadSessions(store)
+        return sessions
+
+
+def form_upload(source, field):
+    """
+    Return the file of a form field: the FileStorage uploaded with the form, the
+    pre-uploaded Upload named by "<field>_id", or None when the slot is empty.
+    """
+    file = source.files.get(field)
+    if file and file.filename:
+        return file
+    upload_id = source.form.get(f'{field}_id')
+    if upload_id:
+        return get_upload_sessions().get_upload(upload_id)
+    return None
+
+
+def preuploaded_files(source):
+    """
+    Yield (field, Upload) for every "<field>_id" form value whose field carries no file
+    of its own (400 for expired or unfinished uploads, as in form_upload).
+    """
+    for key, upload_id in source.form.items(multi=True):
+        if not key.endswith('_id') or not upload_id:
+            continue
+        field = key[:-len('_id')]
+        file = source.files.get(field)
+        if file and file.filename:
+            continue
+        yield field, get_upload_sessions().get_upload(upload_id)
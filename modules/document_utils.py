@@ -8,12 +8,13 @@ RESPONSIBILITIES:
 - Text replacement in Word documents (handles split text across runs)
 - Image insertion and replacement in documents
 - Table creation and insertion after specific paragraphs
-- File upload handling with secure filename generation
+- File upload handling through the content-addressed upload store
 - Document structure manipulation (paragraphs, tables, images)
 - Annexure image insertion with caption support
 
 KEY FUNCTIONS:
 - find_and_replace_text(): Replaces text placeholders in document
+- find_and_replace_text_bulk(): Replaces many placeholders in a single pass
 - find_and_replace_image(): Replaces text with images
 - insert_table_after(): Creates tables in document structure
 - save_uploaded_file(): Securely handles file uploads
@@ -21,60 +22,83 @@ KEY FUNCTIONS:
 
 FEATURES:
 - Handles text split across multiple runs in Word documents
-- Automatic file naming with timestamps
-- Secure filename sanitization
+- Uploads stored once per content digest (re-uploads are deduplicated)
 - Image resizing and positioning
 - Table structure creation with proper XML elements
 
 Document processing utilities for Word document manipulation.
 """
 import os
+import re
 import docx
 from docx import Document
 from docx.shared import Inches, Pt, Cm
 from docx.oxml import OxmlElement
 from docx.oxml.ns import nsdecls, qn
-from werkzeug.utils import secure_filename
 import sys
 sys.path.append('..')
 from config import Config
-import time
+from .anchor_index import find_anchor_paragraph
+from .upload_store import get_upload_store
+from .xml_traversal import (
+    W_P, iter_stories, iter_body_paragraphs, iter_cells, cell_text,
+    runs_text, set_runs_text, has_field_char
+)
+from .package_writer import mark_dirty
+from .instrumentation import instrumented
 
 
+@instrumented('text_replacement')
 def find_and_replace_text(doc, old_text, new_text):
-    """Finds and replaces text in paragraphs and tables, even if split across runs."""
-    def replace_in_paragraph(paragraph):
-        full_text = ''.join(run.text for run in paragraph.runs)
-        if old_text not in full_text:
-            return
-        new_full_text = full_text.replace(old_text, new_text)
-        for run in paragraph.runs:
-            run.text = ''
-        if paragraph.runs:
-            paragraph.runs[0].text = new_full_text
-        else:
-            paragraph.add_run(new_full_text)
-
-    for p in doc.paragraphs:
-        replace_in_paragraph(p)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    replace_in_paragraph(p)
+    """
+    Finds and replaces text in every paragraph of the body, tables (nested too),
+    text boxes, headers and footers, even if split across runs.
+    """
+    for part, root in iter_stories(doc):
+        # Materialize first: rewriting a paragraph may detach nested text box content
+        for p in list(root.iter(W_P)):
+            full_text = runs_text(p)
+            if old_text not in full_text:
+                continue
+            set_runs_text(p, full_text.replace(old_text, new_text))
+            mark_dirty(part)
+
+
+@instrumented('text_replacement')
+def find_and_replace_text_bulk(doc, replacements):
+    """
+    Replaces every placeholder in the replacements dict in one document traversal.
+    Each paragraph's run text is joined once, matched against a single compiled
+    alternation of all placeholders (longest first), and rewritten at most once.
+    """
+    replacements = {old: new for old, new in replacements.items() if old}
+    if not replacements:
+        return
+    pattern = re.compile('|'.join(
+        re.escape(old) for old in sorted(replacements, key=len, reverse=True)
+    ))
+
+    for part, root in iter_stories(doc):
+        # Materialize first: rewriting a paragraph may detach nested text box content
+        for p in list(root.iter(W_P)):
+            full_text = runs_text(p)
+            new_full_text, count = pattern.subn(lambda m: replacements[m.group(0)], full_text)
+            if count:
+                set_runs_text(p, new_full_text)
+                mark_dirty(part)
 
 
 def find_and_replace_image(doc, placeholder_text, image_path, width=None):
     """Finds a placeholder in a table cell and replaces it with an image. Returns the cell."""
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                if placeholder_text in cell.text:
-                    cell.text = ''
-                    p = cell.paragraphs[0]
-                    run = p.add_run()
-                    run.add_picture(image_path, width=width)
-                    return cell  # Return the cell for caption insertion
+    for tc in iter_cells(doc.element.body):
+        if placeholder_text in cell_text(tc):
+            table = docx.table.Table(tc.getparent().getparent(), doc._body)
+            cell = docx.table._Cell(tc, table)
+            cell.text = ''
+            p = cell.paragraphs[0]
+            run = p.add_run()
+            run.add_picture(image_path, width=width)
+            return cell  # Return the cell for caption insertion
     return None
 
 
@@ -118,63 +142,55 @@ def insert_table_after(paragraph, rows, cols):
 
 
 def save_uploaded_file(file, upload_folder=None):
-    """Save uploaded file and return the file path."""
-    if upload_folder is None:
-        upload_folder = Config.UPLOAD_FOLDER
-    
-    if file and file.filename:
-        filename = secure_filename(file.filename)
-        timestamp = str(int(time.time()))
-        filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
-        return file_path
-    return None
+    """Save uploaded file into the content-addressed upload store and return the file path."""
+    return get_upload_store(upload_folder).save(file)
 
 
-def insert_annexure_images(doc, images, captions, placeholder, image_width=Cm(12), image_height=Cm(20)):
+@instrumented('annexures')
+def insert_annexure_images(doc, images, captions, placeholder, image_width=Cm(12), image_height=Cm(20), anchors=None):
     """Insert annexure images one per page at the placeholder location."""
-    for para in doc.paragraphs:
-        if placeholder in para.text:
-            para.text = para.text.replace(placeholder, '')
-            insert_after = para
-            
-            for i, img_path in enumerate(images):
-                p_img = insert_paragraph_after(insert_after)
-                p_img.paragraph_format.alignment = 1  # Center
-                run = p_img.add_run()
-                run.add_picture(img_path, width=image_width, height=image_height)
-                
-                # Insert caption if present
-                if captions[i]:
-                    p_cap = insert_paragraph_after(p_img)
-                    p_cap.add_run(captions[i])
-                    p_cap.paragraph_format.alignment = 1  # Center
-                    p_cap.runs[0].font.size = Pt(10)
-                    insert_after = p_cap
-                else:
-                    insert_after = p_img
-                
-                # Page break after each image except the last
-                if i < len(images) - 1:
-                    p_break = insert_paragraph_after(insert_after)
-                    p_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
-                    insert_after = p_break
-            
-            # Always insert a page break after the last annexure image/caption
-            final_break = insert_paragraph_after(insert_after)
-            final_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
-            break  # Only replace the first occurrence
+    para = find_anchor_paragraph(doc, placeholder, anchors)
+    if para is None:
+        return
+
+    para.text = para.text.replace(placeholder, '')
+    insert_after = para
+
+    for i, img_path in enumerate(images):
+        p_img = insert_paragraph_after(insert_after)
+        p_img.paragraph_format.alignment = 1  # Center
+        run = p_img.add_run()
+        run.add_picture(img_path, width=image_width, height=image_height)
+
+        # Insert caption if present
+        if captions[i]:
+            p_cap = insert_paragraph_after(p_img)
+            run_cap = p_cap.add_run(captions[i])
+            p_cap.paragraph_format.alignment = 1  # Center
+            run_cap.font.size = Pt(10)
+            insert_after = p_cap
+        else:
+            insert_after = p_img
+
+        # Page break after each image except the last
+        if i < len(images) - 1:
+            p_break = insert_paragraph_after(insert_after)
+            p_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
+            insert_after = p_break
+
+    # Always insert a page break after the last annexure image/caption
+    final_break = insert_paragraph_after(insert_after)
+    final_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
 
 
 def update_table_of_contents(doc):
     """Update all fields in the document, including table of contents."""
     # Find all field codes in the document
-    for paragraph in doc.paragraphs:
-        for run in paragraph.runs:
-            if run._element.xml.find('w:fldChar') != -1:
+    for p in iter_body_paragraphs(doc):
+        for r in p.iterchildren(qn('w:r')):
+            if has_field_char(r):
                 # This run contains a field
-                run._element.getparent().set(qn('w:dirty'), 'true')
+                p.set(qn('w:dirty'), 'true')
     
     # Find and update TOC fields specifically
     for element in doc.element.body.iter():
@@ -203,5 +219,6 @@ def add_update_fields_instruction(doc):
     update_fields = OxmlElement('w:updateFields')
     update_fields.set(qn('w:val'), 'true')
     settings_element.append(update_fields)
+    mark_dirty(settings.part)
     
     return doc
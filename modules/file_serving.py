@@ -0,0 +1,145 @@
+"""
+File Serving Module
+===================
+
+FUNCTION: Serves generated reports and static assets with HTTP caching, ranges and proxy offload.
+
+RESPONSIBILITIES:
+- Derive strong ETags from the SHA-256 of a file's content (cached per file version)
+- Answer If-None-Match / If-Modified-Since with 304 Not Modified
+- Serve byte ranges (206 Partial Content, If-Range) so interrupted downloads resume
+- Optionally hand the transfer to a front proxy with X-Accel-Redirect (nginx)
+  or X-Sendfile (Apache, lighttpd) instead of streaming bytes through Python
+- Version static asset URLs by content hash and serve versioned URLs as immutable
+
+KEY FUNCTIONS:
+- serve_file(): Conditional, range-capable response for a file on disk
+- content_etag(): Strong ETag of a file, hashed once per (path, size, mtime)
+- static_url_defaults(): url_defaults hook adding ?v=<content hash> to static URLs
+- serve_static(): Replacement view for Flask's static endpoint
+
+FEATURES:
+- Config.SENDFILE_MODE selects the offload: '' (Python), 'x-accel' or 'x-sendfile'.
+  With offload the proxy serves the bytes and the ranges; Python still answers 304s
+- X-Accel-Redirect paths are Config.X_ACCEL_PREFIX + '/output/<file>' or
+  '/static/<file>'; map them to internal locations in the nginx configuration
+- A changed file gets a new ETag and a new static URL version automatically
+
+File serving utilities for the Training Report Generator.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file as werkzeug_send_file
+
+import sys
+sys.path.append('..')
+from config import Config
+
+_CHUNK_SIZE = 1024 * 1024
+_MAX_HASHES = 1024  # file versions whose content hash is remembered
+
+_hashes = OrderedDict()  # (path, size, mtime_ns) -> SHA-256 hex digest
+_hashes_lock = threading.Lock()
+
+
+def _content_hash(path, stat):
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _hashes_lock:
+        digest = _hashes.get(key)
+        if digest is not None:
+            _hashes.move_to_end(key)
+            return digest
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _hashes_lock:
+        _hashes[key] = digest
+        while len(_hashes) > _MAX_HASHES:
+            _hashes.popitem(last=False)
+    return digest
+
+
+def content_etag(path, stat=None):
+    """Return the strong ETag (without quotes) of the file at path."""
+    return _content_hash(path, stat or os.stat(path))[:32]
+
+
+def serve_file(path, download_name=None, mimetype=None, as_attachment=False,
+               max_age=None, immutable=False, offload_path=None):
+    """
+    Return a response for the file at path with a content ETag, Last-Modified,
+    conditional GET and byte-range handling. When Config.SENDFILE_MODE is set
+    and offload_path (the path below Config.X_ACCEL_PREFIX) is given, the front
+    proxy sends the body. max_age=None means "always revalidate".
+    """
+    stat = os.stat(path)
+    etag = content_etag(path, stat)
+    mode = Config.SENDFILE_MODE
+
+    if mode and offload_path is not None:
+        # Headers only: the proxy streams the body and handles ranges itself
+        response = werkzeug_send_file(path, request.environ, mimetype=mimetype, as_attachment=as_attachment,
+                                      download_name=download_name, conditional=False, etag=etag,
+                                      last_modified=stat.st_mtime, use_x_sendfile=True,
+                                      response_class=current_app.response_class)
+        del response.headers['Content-Length']  # set by the proxy for what it actually sends
+        if mode == 'x-accel':
+            del response.headers['X-Sendfile']
+            response.headers['X-Accel-Redirect'] = f'{Config.X_ACCEL_PREFIX}/{offload_path}'
+        response = response.make_conditional(request.environ, accept_ranges=False)
+        if response.status_code == 304:
+            response.headers.pop('X-Accel-Redirect', None)
+            response.headers.pop('X-Sendfile', None)
+    else:
+        response = send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                             download_name=download_name, conditional=True, etag=etag,
+                             last_modified=stat.st_mtime)
+
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.STATIC_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    elif max_age is not None:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = max_age
+    else:
+        # Reports may be regenerated under the same name: always revalidate (cheap 304)
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+    return response
+
+
+def _static_path(filename):
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def static_url_defaults(endpoint, values):
+    """url_defaults hook: add ?v=<content hash> to url_for('static', ...) so URLs change with content."""
+    if endpoint != 'static' or 'v' in values or 'filename' not in values:
+        return
+    path = _static_path(values['filename'])
+    if path is not None:
+        values['v'] = content_etag(path)[:12]
+
+
+def serve_static(filename):
+    """Static file view: immutable caching for URLs carrying the current version, revalidation otherwise."""
+    path = _static_path(filename)
+    if path is None:
+        abort(404)
+    version = request.args.get('v')
+    immutable = version is not None and version == content_etag(path)[:12]
+    return serve_file(path, max_age=None if immutable else 0, immutable=immutable, offload_path=f'static/{filename}')
@@ -16,12 +16,15 @@ KEY FUNCTIONS:
 - combine_person_list(): Formats person data with prefixes, names, and designations
 - process_form_data(): Main form processing function that returns all text replacements
 - process_gallery_images(): Handles gallery image uploads and captions
+- submit_gallery_images(): Starts gallery image preparation on the shared image pool
+- gallery_slots(): Gallery slot numbers present in a submission (no fixed maximum)
 
 DATA PROCESSING:
 - Combines multiple form fields into formatted strings
 - Creates placeholder-to-value mappings for document replacement
 - Handles dynamic person lists with proper formatting
 - Processes image uploads with caption pairing
+- Normalizes gallery images to their placement size
 - Validates and cleans form input data
 
 OUTPUT FORMAT:
@@ -31,6 +34,10 @@ OUTPUT FORMAT:
 
 Form data processing utilities.
 """
+import re
+
+# gallery_image_<n> uploads and gallery_image_<n>_id pre-uploaded files
+_GALLERY_FIELD = re.compile(r'^gallery_image_(\d+)(?:_id)?$')
 
 
 def format_address(line1, line2, line3):
@@ -156,16 +163,25 @@ def process_form_data(request):
     return text_replacements
 
 
-def process_gallery_images(request):
-    """Process gallery images and captions."""
-    from .document_utils import save_uploaded_file
-    
-    gallery_images = [save_uploaded_file(request.files.get(f'gallery_image_{i}')) for i in range(1, 11)]
-    gallery_captions = [request.form.get(f'gallery_caption_{i}', '') for i in range(1, 11)]
+def gallery_slots(request):
+    """Return the gallery slot numbers present in the form (uploads or pre-uploaded ids), in order."""
+    fields = list(request.files.keys()) + list(request.form.keys())
+    return sorted({int(match.group(1)) for match in map(_GALLERY_FIELD.match, fields) if match})
+
 
-    # Remove empty images/captions (keep pairs)
-    gallery_pairs = [(img, cap) for img, cap in zip(gallery_images, gallery_captions) if img]
-    gallery_images_clean = [img for img, _ in gallery_pairs]
-    gallery_captions_clean = [cap for _, cap in gallery_pairs]
+def submit_gallery_images(request):
+    """Start preparing gallery images in the background; returns an ImageBatch (any number of slots)."""
+    from .image_processing import ImageBatch
+    from .chunked_upload import form_upload
     
-    return gallery_images_clean, gallery_captions_clean
+    slots = gallery_slots(request)
+    gallery_files = [form_upload(request, f'gallery_image_{i}') for i in slots]
+    gallery_captions = [request.form.get(f'gallery_caption_{i}', '') for i in slots]
+
+    # Downsampled to the gallery cell size before embedding; empty slots are dropped with their captions
+    return ImageBatch(gallery_files, gallery_captions, 'gallery')
+
+
+def process_gallery_images(request):
+    """Process gallery images and captions."""
+    return submit_gallery_images(request).result()
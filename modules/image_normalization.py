@@ -0,0 +1,166 @@
+"""
+Image Normalization Module
+==========================
+
+FUNCTION: Pre-processes uploaded photos so they are embedded at the size they are displayed.
+
+RESPONSIBILITIES:
+- Downsample each image to a configurable effective DPI for its placement
+  (gallery cell 8.13×5.81 cm, annexure page 15×20 cm)
+- Apply EXIF orientation so rotated phone photos appear upright
+- Strip EXIF/XMP metadata (GPS, camera data, thumbnails)
+- Re-encode to JPEG (opaque) or PNG (transparent) at a configurable quality
+- Convert CMYK and other non-RGB photos to sRGB through their embedded ICC profile
+- Use JPEG draft-mode decoding so large photos are decoded at reduced scale
+
+KEY FUNCTIONS:
+- normalize_image(): Returns an in-memory, resized and re-encoded image for a placement
+- prepare_image(): Normalized variant of an Upload, via the upload store's variant cache
+- target_pixels(): Pixel size needed to cover a placement at the configured DPI
+
+FEATURES:
+- Never upscales; images already small enough are passed through untouched
+  unless they carry metadata or need rotation
+- Falls back to the original upload if Pillow cannot decode it
+- Returns a BytesIO that python-docx add_picture() accepts directly
+
+Image normalization utilities for gallery and annexure uploads.
+"""
+import io
+
+from docx.shared import Cm
+from PIL import Image, ImageOps
+
+import sys
+sys.path.append('..')
+from config import Config
+from .upload_store import get_upload_store
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+# Display size of each placement in the generated document (width, height)
+PLACEMENTS = {
+    'gallery': (Cm(8.13), Cm(5.81)),
+    'annexure': (Cm(15), Cm(20)),
+}
+
+_EXIF_ORIENTATION = 0x0112
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}  # orientations that swap width and height
+_METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'photoshop', 'comment')
+
+
+def target_pixels(placement, dpi=None):
+    """Return the (width, height) in pixels that covers a placement at dpi."""
+    dpi = dpi or Config.IMAGE_TARGET_DPI
+    width, height = PLACEMENTS[placement]
+    return round(width.inches * dpi), round(height.inches * dpi)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _to_rgb(image):
+    """
+    Return (RGB image, ICC profile to embed). An embedded profile only describes the
+    original mode's colours: after a mode change (e.g. CMYK) the pixels are converted
+    through it to sRGB, and it is not embedded (JPEG viewers assume sRGB).
+    """
+    profile = image.info.get('icc_profile')
+    if image.mode == 'RGB':
+        return image, profile
+    if profile:
+        try:
+            from PIL import ImageCms
+            source_profile = ImageCms.ImageCmsProfile(io.BytesIO(profile))
+            return ImageCms.profileToProfile(image, source_profile, _srgb_profile(ImageCms), outputMode='RGB'), None
+        except Exception as e:  # no LittleCMS, or a profile that does not match the mode
+            log.debug('icc_conversion_skipped', mode=image.mode, error=str(e))
+    return image.convert('RGB'), None
+
+
+_srgb = None
+
+
+def _srgb_profile(image_cms):
+    global _srgb
+    if _srgb is None:
+        _srgb = image_cms.createProfile('sRGB')
+    return _srgb
+
+
+def normalize_image(source, placement, dpi=None, quality=None):
+    """
+    Resize and re-encode an uploaded image for the given placement.
+    source may be a file path or a binary file-like object. Returns a BytesIO
+    positioned at 0, or source unchanged if the image cannot be decoded.
+    """
+    if not Config.IMAGE_NORMALIZATION_ENABLED or source is None:
+        return source
+    quality = quality or Config.IMAGE_JPEG_QUALITY
+    target_w, target_h = target_pixels(placement, dpi)
+
+    try:
+        image = Image.open(source)
+        source_format = image.format
+        orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+        width, height = image.size
+        if orientation in _ROTATED_ORIENTATIONS:
+            width, height = height, width
+
+        # Cover the target box in both directions (the document stretches to fit)
+        scale = max(target_w / width, target_h / height)
+        needs_resize = scale < 1
+        has_metadata = any(key in image.info for key in _METADATA_KEYS)
+
+        if not needs_resize and orientation == 1 and not has_metadata and source_format in ('JPEG', 'PNG'):
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return source
+
+        if source_format == 'JPEG':
+            # Decode at the smallest 1/2, 1/4 or 1/8 scale that still covers the target
+            draft_size = (target_h, target_w) if orientation in _ROTATED_ORIENTATIONS else (target_w, target_h)
+            image.draft('RGB', draft_size)
+
+        image = ImageOps.exif_transpose(image)
+        if needs_resize:
+            new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            image = image.resize(new_size, Image.LANCZOS, reducing_gap=3.0)
+
+        output = io.BytesIO()
+        if _has_alpha(image):
+            image.save(output, format='PNG', optimize=False)
+        else:
+            image, icc_profile = _to_rgb(image)
+            image.save(output, format='JPEG', quality=quality, optimize=True, icc_profile=icc_profile)
+        output.seek(0)
+        return output
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        log.warning('image_normalization_failed', error=str(e))
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return source
+
+
+def prepare_image(upload, placement, dpi=None, quality=None):
+    """
+    Return a source for add_picture() holding the normalized variant of an Upload.
+    Variants are cached per (digest, target size, quality) in the upload store,
+    so re-used photos are only decoded and re-encoded once. A variant that was
+    just built is returned from memory as a BytesIO, a cached one as an open file.
+    """
+    if upload is None:
+        return None
+    if not Config.IMAGE_NORMALIZATION_ENABLED:
+        return upload.source()
+    quality = quality or Config.IMAGE_JPEG_QUALITY
+
+    def build():
+        source = upload.source()
+        result = normalize_image(source, placement, dpi, quality)
+        return None if result is source else result.getvalue()
+
+    variant = get_upload_store().get_variant(upload.digest, target_pixels(placement, dpi), quality, build)
+    return upload.source() if variant is None else variant
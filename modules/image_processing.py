@@ -15,6 +15,9 @@ RESPONSIBILITIES:
 KEY FUNCTIONS:
 - insert_gallery_table(): Creates photo gallery tables with images and captions
 - get_annexure_images_and_captions(): Extracts annexure data from form
+- prepare_upload(): Reads, normalizes and validates one upload (runs on the image pool)
+- submit_annexure_images(): Starts preparing an annexure's uploads on the shared image pool
+- ImageBatch: Images of one form section being prepared, resolved in upload order
 - insert_annexure_images(): Inserts annexure sections with proper formatting
 
 FEATURES:
@@ -23,156 +26,224 @@ FEATURES:
 - Caption text placement below images
 - Support for multiple annexure sections (Annexure I, II, III, etc.)
 - Proper table cell formatting and structure
+- Gallery pages are cloned from a prebuilt table + page-break fragment (see gallery_page.py)
 - Page break management after image sections
+- Uploads are read, normalized and validated in parallel on the shared image pool
+- Images are handed to python-docx as in-memory buffers; no temporary files
+- Streaming mode (Config.STREAMING_GENERATION): images are prepared a few ahead of
+  insertion, consumed a page at a time and spooled to disk once embedded (see image_spool.py)
 
 Image processing utilities for gallery and annexure images.
 """
+import io
+import itertools
 from docx.shared import Inches, Pt, Cm
 import docx
-import docx.oxml.shared
-from .document_utils import insert_paragraph_after, insert_table_after, save_uploaded_file
+from docx.image.image import Image as DocxImage
+from .document_utils import insert_paragraph_after
+from .anchor_index import find_anchor_paragraph
+from .image_normalization import prepare_image
+from .upload_store import get_upload_store
+from .chunked_upload import form_upload
+from .worker_pool import submit_all
+from .image_spool import section_spool, add_picture
+from .gallery_page import GalleryPage
+from .instrumentation import instrumented, span, count
+from .job_queue import renew_lease
 
+import sys
+sys.path.append('..')
+from config import Config
 
-def insert_gallery_table(doc, images, captions, images_per_row=2, image_width=Cm(8.13), placeholder='{{GALLERY_TABLE}}'):
+
+def prepare_upload(file, placement):
+    """
+    Read an uploaded file, normalize it for its placement and validate it.
+    Runs on the image pool; returns the image to embed (a BytesIO, an open file for
+    cached variants, or a path for large uploads), or None for an empty slot.
+    """
+    upload = get_upload_store().receive(file)
+    if upload is None:
+        return None
+    image = prepare_image(upload, placement)
+    if isinstance(image, io.BytesIO):
+        # Parse the image header now so unsupported files fail here, not mid-assembly
+        DocxImage.from_blob(image.getvalue())
+    return image
+
+
+class ImageBatch:
+    """
+    Uploads of one form section being prepared on the image pool. With
+    Config.STREAMING_GENERATION only Config.IMAGE_PREFETCH uploads are prepared
+    ahead of the consumer of pairs(); otherwise all of them start at once.
+    """
+
+    def __init__(self, files, captions, placement):
+        self.files = list(files)
+        self.captions = captions
+        self.placement = placement
+        self.futures = []
+        window = Config.IMAGE_PREFETCH if Config.STREAMING_GENERATION else len(self.files)
+        self._submit(window)
+
+    def _submit(self, count):
+        """Start preparing up to count more uploads."""
+        start = len(self.futures)
+        files = self.files[start:start + count]
+        if files:
+            with span('image_prepare'):  # the whole preparation when the pool is sequential
+                self.futures.extend(submit_all(prepare_upload, files, self.placement))
+
+    def pairs(self, timeout=None):
+        """
+        Yield (image, caption) in upload order, skipping empty slots (once per batch).
+        The batch drops each image as it is yielded, and the next upload starts preparing.
+        """
+        images = 0
+        for i in range(len(self.files)):
+            if i >= len(self.futures):
+                self._submit(1)
+            with span('image_wait'):
+                image = self.futures[i].result(timeout)
+            self.futures[i] = self.files[i] = None
+            self._submit(1)  # keep the prefetch window full
+            renew_lease()  # a large gallery or annexure can outlast the job lease
+            if image:
+                images += 1
+                yield image, self.captions[i]
+        count('images', images)
+
+    def result(self, timeout=None):
+        """Return (images, captions) in upload order, skipping empty slots."""
+        pairs = list(self.pairs(timeout))
+        return [img for img, _ in pairs], [cap for _, cap in pairs]
+
+
+# Prebuilt gallery pages per (images per row, image width), shared by all documents
+_gallery_pages = {}
+
+
+def _gallery_page(images_per_row, image_width):
+    """Return the GalleryPage layout: images_per_row × 3 rows of image_width × 5.81cm images."""
+    key = (images_per_row, int(image_width))
+    layout = _gallery_pages.get(key)
+    if layout is None:
+        layout = _gallery_pages[key] = GalleryPage(images_per_row, 3, image_width, Cm(5.81))
+    return layout
+
+
+def _pairs(images, captions):
+    """(image, caption) pairs from parallel lists, or images itself when it already yields pairs."""
+    return iter(images if captions is None else zip(images, captions))
+
+
+@instrumented('gallery')
+def insert_gallery_table(doc, images, captions=None, images_per_row=2, image_width=Cm(8.13), placeholder='{{GALLERY_TABLE}}', anchors=None):
     """
     Inserts tables at the given placeholder with images and captions.
     Each page displays 6 images (2 per row, 3 rows) with equal alignment.
     Images are sized to 8.13cm width × 5.81cm height.
+    images is a list with captions alongside, or an iterable of (image, caption)
+    pairs such as ImageBatch.pairs() when captions is None, consumed one page at a time.
+    Returns the number of images inserted; without images the placeholder is left as is.
     """
-    for para in doc.paragraphs:
-        if placeholder in para.text:
+    para = find_anchor_paragraph(doc, placeholder, anchors)
+    if para is None:
+        return 0
+
+    pairs = _pairs(images, captions)
+    layout = _gallery_page(images_per_row, image_width)
+    insert_after = para._p
+    spool = section_spool(doc)
+    inserted = 0
+
+    # Process images in batches of 6 (one page at a time)
+    while True:
+        page = list(itertools.islice(pairs, layout.slots))
+        if not page:
+            break
+        if not inserted:
             # Remove placeholder text
             para.text = para.text.replace(placeholder, '')
-            
-            num_images = len(images)
-            if num_images == 0:
-                return  # No images to insert
-            
-            images_per_page = 6  # 2 columns × 3 rows = 6 images per page
-            rows_per_page = 3    # Fixed 3 rows per page
-            insert_after = para
-            
-            # Process images in batches of 6 (one page at a time)
-            for page_start in range(0, num_images, images_per_page):
-                page_end = min(page_start + images_per_page, num_images)
-                page_images = images[page_start:page_end]
-                page_captions = captions[page_start:page_end]
-                
-                # Calculate actual rows needed for this page
-                page_num_images = len(page_images)
-                actual_rows = min(rows_per_page, (page_num_images + images_per_row - 1) // images_per_row)
-                
-                # Insert table for this page
-                table = insert_table_after(insert_after, actual_rows, images_per_row)
-                
-                # Insert images and captions into the table
-                img_idx = 0
-                for row in table.rows:
-                    for cell in row.cells:
-                        if img_idx < page_num_images and page_images[img_idx]:
-                            # Clear cell and add image
-                            cell.text = ''
-                            p_img = cell.paragraphs[0]
-                            p_img.alignment = 1  # Center alignment for image
-                            run = p_img.add_run()
-                            run.add_picture(page_images[img_idx], width=image_width, height=Cm(5.81))
-                            
-                            # Add caption if exists
-                            if page_captions[img_idx]:
-                                p_caption = cell.add_paragraph(page_captions[img_idx])
-                                p_caption.alignment = 1  # Center alignment
-                                p_caption.runs[0].font.size = Pt(10)
-                                p_caption.runs[0].font.bold = True
-                            
-                            # Add cell padding and formatting
-                            cell.vertical_alignment = 1  # Center vertical alignment
-                            
-                            img_idx += 1
-                
-                # Add page break after each page of images (except the last page)
-                if page_end < num_images:
-                    # Insert page break after the table
-                    table_element = table._element
-                    parent = table_element.getparent()
-                    new_para_element = docx.oxml.shared.OxmlElement('w:p')
-                    new_run_element = docx.oxml.shared.OxmlElement('w:r')
-                    new_break_element = docx.oxml.shared.OxmlElement('w:br')
-                    new_break_element.set(docx.oxml.shared.qn('w:type'), 'page')
-                    new_run_element.append(new_break_element)
-                    new_para_element.append(new_run_element)
-                    parent.insert(parent.index(table_element) + 1, new_para_element)
-                    
-                    # Update insert_after to the new paragraph for next page
-                    insert_after = table
-                else:
-                    # For the last page, just add the page break without updating insert_after
-                    table_element = table._element
-                    parent = table_element.getparent()
-                    new_para_element = docx.oxml.shared.OxmlElement('w:p')
-                    new_run_element = docx.oxml.shared.OxmlElement('w:r')
-                    new_break_element = docx.oxml.shared.OxmlElement('w:br')
-                    new_break_element.set(docx.oxml.shared.qn('w:type'), 'page')
-                    new_run_element.append(new_break_element)
-                    new_para_element.append(new_run_element)
-                    parent.insert(parent.index(table_element) + 1, new_para_element)
-            
-            return
 
+        # Clone the prebuilt page (table + page break) and fill in its slots
+        insert_after = layout.insert_after(insert_after, page, doc.part, spool)
+        inserted += len(page)
+        page = None  # the page's image buffers can go before the next page is prepared
 
-def get_annexure_images_and_captions(prefix, request):
-    """Get annexure images and captions from form data."""
-    images = []
+    return inserted
+
+
+def submit_annexure_images(prefix, request):
+    """Start preparing annexure uploads (slots 1, 2, ... until one is missing) in the background."""
+    files = []
     captions = []
     i = 1
     while True:
-        img = save_uploaded_file(request.files.get(f'{prefix}_image_{i}'))
-        cap = request.form.get(f'{prefix}_caption_{i}', '')
-        if not img:
+        file = form_upload(request, f'{prefix}_image_{i}')
+        if file is None:
             break
-        images.append(img)
-        captions.append(cap)
+        files.append(file)
+        captions.append(request.form.get(f'{prefix}_caption_{i}', ''))
         i += 1
-    return images, captions
+    # Downsampled to the annexure page size before embedding
+    return ImageBatch(files, captions, 'annexure')
 
 
-def insert_annexure_images(doc, images, captions, placeholder, image_width=Cm(15), image_height=Cm(20), add_final_page_break=True):
+def get_annexure_images_and_captions(prefix, request):
+    """Get annexure images and captions from form data."""
+    return submit_annexure_images(prefix, request).result()
+
+
+@instrumented('annexures')
+def insert_annexure_images(doc, images, captions, placeholder, image_width=Cm(15), image_height=Cm(20), add_final_page_break=True, anchors=None):
     """
     Inserts each image (with caption) at the given placeholder, one per paragraph, sized to fit within page margins.
     Optionally inserts a page break after the last annexure image.
     Images are centered with portrait proportions: 15cm width × 20cm height.
+    images is a list with captions alongside, or an iterable of (image, caption)
+    pairs such as ImageBatch.pairs() when captions is None, consumed one image at a time.
+    Returns the number of images inserted; without images the placeholder is left as is.
     """
-    for para in doc.paragraphs:
-        if placeholder in para.text:
+    para = find_anchor_paragraph(doc, placeholder, anchors)
+    if para is None:
+        return 0
+
+    insert_after = para
+    spool = section_spool(doc)
+    inserted = 0
+    for image, caption in _pairs(images, captions):
+        if inserted:
+            # Page break between images
+            p_break = insert_paragraph_after(insert_after)
+            p_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
+            insert_after = p_break
+        else:
             para.text = para.text.replace(placeholder, '')
-            insert_after = para
-            for i, img_path in enumerate(images):
-                # Insert image with center alignment
-                p_img = insert_paragraph_after(insert_after)
-                p_img.alignment = 1  # Center alignment
-                run = p_img.add_run()
-                run.add_picture(img_path, width=image_width, height=image_height)
-                
-                # Insert caption if present
-                if captions[i]:
-                    p_cap = insert_paragraph_after(p_img)
-                    p_cap.add_run(captions[i])
-                    p_cap.paragraph_format.alignment = 1  # Center
-                    p_cap.runs[0].font.size = Pt(11)
-                    p_cap.runs[0].font.bold = True
-                    # Add some spacing after caption
-                    p_cap.paragraph_format.space_after = Pt(12)
-                    insert_after = p_cap
-                else:
-                    insert_after = p_img
-                # Page break after each image except the last
-                if i < len(images) - 1:
-                    p_break = insert_paragraph_after(insert_after)
-                    p_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
-                    insert_after = p_break
-            
-            # Add page break after the last annexure image only if specified
-            if add_final_page_break:
-                final_break = insert_paragraph_after(insert_after)
-                final_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
-            
-            break  # Only replace the first occurrence
+
+        # Insert image with center alignment
+        p_img = insert_paragraph_after(insert_after)
+        p_img.alignment = 1  # Center alignment
+        run = p_img.add_run()
+        add_picture(run, image, width=image_width, height=image_height, spool=spool)
+        inserted += 1
+
+        # Insert caption if present
+        if caption:
+            p_cap = insert_paragraph_after(p_img)
+            run_cap = p_cap.add_run(caption)
+            p_cap.paragraph_format.alignment = 1  # Center
+            run_cap.font.size = Pt(11)
+            run_cap.font.bold = True
+            # Add some spacing after caption
+            p_cap.paragraph_format.space_after = Pt(12)
+            insert_after = p_cap
+        else:
+            insert_after = p_img
+
+    # Add page break after the last annexure image only if specified
+    if inserted and add_final_page_break:
+        final_break = insert_paragraph_after(insert_after)
+        final_break.add_run().add_break(docx.text.run.WD_BREAK.PAGE)
+    return inserted
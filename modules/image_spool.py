@@ -0,0 +1,234 @@
+"""
+Image Spool Module
+==================
+
+FUNCTION: Embeds pictures in a document without keeping their bytes in memory until save.
+
+RESPONSIBILITIES:
+- Append each embedded image to a per-document temporary spool file and release its buffer
+- Represent spooled images as image parts that read their bytes back only when the
+  package is written (see package_writer.save_document)
+- Add the picture relationship and the inline drawing for a run, as Run.add_picture() does
+- Number shapes, relationships and media parts the way python-docx does, without
+  rescanning the whole document for every picture
+
+KEY FUNCTIONS:
+- section_spool(): The synced spool of a document before a section of pictures (None when off)
+- add_picture(): Adds a picture to a run, through the spool when one is given
+- embed_image(): Embeds a picture for a prebuilt drawing (see gallery_page.py)
+- ImageSpool.for_document(): The spool of a document (created on first use)
+- SpooledImagePart: Image part whose blob lives in the spool file
+
+FEATURES:
+- Memory held per image after embedding is its metadata only; the spool is an
+  anonymous temporary file removed when the document is released
+- Generation time stays linear in the number of images: python-docx computes the next
+  shape id with an XPath over the whole document and scans every relationship and
+  media part per picture, the spool does that once per section
+- Identical images are stored once, as with python-docx (SHA-1 of the image bytes)
+- Produces the same document XML as Run.add_picture()
+
+Image spooling utilities for the Training Report Generator.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from docx.image.image import Image as DocxImage
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.oxml.shape import CT_Inline
+from docx.parts.image import ImagePart
+
+import sys
+sys.path.append('..')
+from config import Config
+
+
+class SpooledImagePart(ImagePart):
+    """Image part whose bytes are read back from an ImageSpool when the package is written."""
+
+    def __init__(self, partname, content_type, spool, offset, length, sha1, filename):
+        super().__init__(partname, content_type, b'')
+        self._spool = spool
+        self._offset = offset
+        self._length = length
+        self._sha1 = sha1
+        self._filename = filename
+
+    @property
+    def blob(self):
+        return self._spool.read(self._offset, self._length)
+
+    @property
+    def sha1(self):
+        return self._sha1
+
+    @property
+    def image(self):
+        # Parsed on demand (python-docx only asks when the same image is added again)
+        return DocxImage.from_blob(self.blob)
+
+    @property
+    def filename(self):
+        return self._filename
+
+
+class ImageSpool:
+    """Temporary file holding the images embedded in one document, plus id counters."""
+
+    def __init__(self, document_part):
+        self.document_part = document_part
+        self.package = document_part.package
+        self._file = tempfile.TemporaryFile(prefix='report_images_', dir=Config.IMAGE_SPOOL_DIR or None)
+        self._lock = threading.Lock()
+        self._size = 0
+        self._by_sha1 = {}       # sha1 -> image part, for every image part of the package
+        self._hashed = set()     # ids of image parts already in _by_sha1
+        self._next_shape_id = None
+        self.images = 0
+        self.bytes = 0
+
+    @classmethod
+    def for_document(cls, doc):
+        """Return the spool of doc, creating it on first use."""
+        spool = getattr(doc, '_image_spool', None)
+        if spool is None:
+            spool = doc._image_spool = cls(doc.part)
+        return spool
+
+    # -- spool file -------------------------------------------------------------
+
+    def _append(self, blob):
+        with self._lock:
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(blob)
+            self._size += len(blob)
+        return offset
+
+    def read(self, offset, length):
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def close(self):
+        self._file.close()
+
+    # -- numbering ---------------------------------------------------------------
+
+    def sync(self):
+        """
+        Re-read the numbering state of the document (once per section): other code
+        may have added shapes, relationships or images since the last section.
+        """
+        self._next_shape_id = self.document_part.next_id
+        self._used_rids = set(self.document_part.rels)
+        self._image_rids = {id(rel.target_part): rid for rid, rel in self.document_part.rels.items()
+                            if rel.reltype == RT.IMAGE and not rel.is_external}
+        self._used_media = {part.partname.idx for part in self.package.image_parts}
+        self._rid_cursor = self._media_cursor = 1  # everything below is taken
+        for part in self.package.image_parts:
+            if id(part) not in self._hashed:
+                self._hashed.add(id(part))
+                self._by_sha1.setdefault(part.sha1, part)
+
+    def _next_rid(self):
+        """Lowest free rId, as python-docx assigns them (gaps are reused)."""
+        while f'rId{self._rid_cursor}' in self._used_rids:
+            self._rid_cursor += 1
+        rid = f'rId{self._rid_cursor}'
+        self._used_rids.add(rid)
+        return rid
+
+    def _next_partname(self, ext):
+        """Lowest free /word/media/imageN name, as python-docx assigns them."""
+        while self._media_cursor in self._used_media:
+            self._media_cursor += 1
+        self._used_media.add(self._media_cursor)
+        return PackURI(f'/word/media/image{self._media_cursor}.{ext}')
+
+    # -- pictures ----------------------------------------------------------------
+
+    def _image_part(self, blob, image):
+        """Return the image part for blob, spooling it unless an identical image is embedded already."""
+        sha1 = hashlib.sha1(blob).hexdigest()
+        part = self._by_sha1.get(sha1)
+        if part is None:
+            offset = self._append(blob)
+            part = SpooledImagePart(self._next_partname(image.ext), image.content_type, self,
+                                    offset, len(blob), sha1, image.filename)
+            self.package.image_parts.append(part)
+            self._hashed.add(id(part))
+            self._by_sha1[sha1] = part
+            self.images += 1
+            self.bytes += len(blob)
+        return part
+
+    def embed(self, source):
+        """Embed the image at source (a path or a binary stream); returns (rId, image) like get_or_add_image()."""
+        if isinstance(source, os.PathLike):
+            source = os.fspath(source)
+        image = DocxImage.from_file(source)  # names it as python-docx does
+        part = self._image_part(image.blob, image)
+        rid = self._image_rids.get(id(part))
+        if rid is None:
+            rid = self._image_rids[id(part)] = self._next_rid()
+            self.document_part.rels.add_relationship(RT.IMAGE, part, rid)
+        return rid, image
+
+    def next_shape_id(self):
+        """Id for the next drawing (max + 1, as StoryPart.next_id)."""
+        shape_id = self._next_shape_id
+        self._next_shape_id += 1
+        return shape_id
+
+    def add_picture(self, run, source, width=None, height=None):
+        """Add the image at source (a path or a binary stream) to run, as Run.add_picture() would."""
+        rid, image = self.embed(source)
+        cx, cy = image.scaled_dimensions(width, height)
+        run._r.add_drawing(CT_Inline.new_pic_inline(self.next_shape_id(), rid, image.filename, cx, cy))
+
+
+def section_spool(doc):
+    """
+    Return the spool of doc, synced for a new section of pictures, or None when
+    Config.STREAMING_GENERATION is off (pictures are then added by python-docx).
+    """
+    if not Config.STREAMING_GENERATION:
+        return None
+    spool = ImageSpool.for_document(doc)
+    spool.sync()
+    return spool
+
+
+def _release(image):
+    """Close an image stream (a variant buffer or open cache file) once its bytes are embedded."""
+    if isinstance(image, io.IOBase):
+        image.close()
+
+
+def add_picture(run, image, width=None, height=None, spool=None):
+    """Add a picture to run, through spool when given; an image stream is closed once embedded."""
+    if spool is None:
+        run.add_picture(image, width=width, height=height)
+    else:
+        spool.add_picture(run, image, width, height)
+    _release(image)
+
+
+def embed_image(document_part, image, spool=None):
+    """
+    Embed image without drawing it; returns (shape id, rId, filename) for the drawing
+    that shows it, numbered as Run.add_picture() would. Without a spool the drawing
+    must be in the document before the next call (python-docx finds ids in the XML).
+    """
+    if spool is None:
+        rid, docx_image = document_part.get_or_add_image(image)
+        _release(image)
+        return document_part.next_id, rid, docx_image.filename
+    rid, docx_image = spool.embed(image)
+    _release(image)
+    return spool.next_shape_id(), rid, docx_image.filename
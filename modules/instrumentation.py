@@ -0,0 +1,282 @@
+"""
+Instrumentation Module
+======================
+
+FUNCTION: Times the stages of report generation and aggregates request metrics for /metrics.
+
+RESPONSIBILITIES:
+- Open a trace per HTTP request and per background job
+- Record named spans around the pipeline stages (template load, text replacement,
+  image preparation, gallery, charts, annexures, save) into the current trace
+- Add a Server-Timing header with the stage breakdown to every response
+- Log requests and jobs slower than Config.SLOW_REQUEST_MS with their stage breakdown
+- Aggregate durations, request/response bytes and images per report into
+  summaries (count, sum, p50/p95/p99) exposed in the Prometheus text format
+
+KEY FUNCTIONS:
+- instrumented(): Decorator timing a function as a named span
+- span(): Context manager timing a block as a named span
+- count(): Adds to a counter of the current trace (e.g. images)
+- traced(): Context manager opening a trace outside a request (background jobs)
+- start_request_trace() / finish_request_trace(): before/after_request hooks
+- render_metrics(): Prometheus exposition of every metric
+
+FEATURES:
+- Without an open trace a span costs one context variable lookup
+- Nested spans are folded into the outermost one, so stage times never double count
+- Traces live in a context variable: spans on other threads (the image pool) are not recorded;
+  the request thread's wait for them is
+- Quantiles are computed over the last Config.METRICS_WINDOW observations of each series;
+  counts and sums are cumulative. Metrics are per process
+
+Instrumentation utilities for the Training Report Generator.
+"""
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sys
+sys.path.append('..')
+from config import Config
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+PREFIX = 'report_generator'
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current = ContextVar('instrumentation_trace', default=None)
+
+
+class Trace:
+    """Stage timings and counters of one request or job."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = {}     # stage -> seconds, in first-seen order
+        self.counters = {}  # e.g. 'images' -> 12
+        self.resources = None    # resource_accounting measurement, when this trace was sampled
+        self.on_span_end = None  # called with the stage name after each outermost span
+        self._depth = 0
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+        return self.duration
+
+    def breakdown(self):
+        """Human-readable stage breakdown for log lines."""
+        stages = ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in self.spans.items())
+        counters = ', '.join(f'{value} {name}' for name, value in self.counters.items())
+        return '; '.join(part for part in (stages, counters) if part) or 'no stages'
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage name of the current trace (no-op without one)."""
+    trace = _current.get()
+    if trace is None or trace._depth:
+        yield
+        return
+    trace._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace._depth -= 1
+        trace.spans[name] = trace.spans.get(name, 0.0) + time.perf_counter() - start
+        if trace.on_span_end is not None:
+            trace.on_span_end(name)
+
+
+def instrumented(name):
+    """Decorator recording every call of the function as stage name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Add value to counter name of the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + value
+
+
+def current_trace():
+    return _current.get()
+
+
+# -- aggregation -------------------------------------------------------------------
+
+class Summary:
+    """Count, sum and windowed quantiles of one labelled series."""
+
+    def __init__(self, window):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """Labelled summaries keyed by metric name, rendered in the Prometheus text format."""
+
+    def __init__(self, window=None):
+        self.window = window if window is not None else Config.METRICS_WINDOW
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> (help, {labels tuple: Summary})
+
+    def observe(self, name, help_text, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, series = self._metrics.setdefault(name, (help_text, {}))
+            summary = series.get(key)
+            if summary is None:
+                summary = series[key] = Summary(self.window)
+            summary.observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, series) in sorted(self._metrics.items()):
+                full_name = f'{PREFIX}_{name}'
+                lines.append(f'# HELP {full_name} {help_text}')
+                lines.append(f'# TYPE {full_name} summary')
+                for labels, summary in sorted(series.items()):
+                    for q, value in summary.quantiles().items():
+                        lines.append(f'{full_name}{_labels(labels + (("quantile", q),))} {value:.6g}')
+                    lines.append(f'{full_name}_sum{_labels(labels)} {summary.sum:.6g}')
+                    lines.append(f'{full_name}_count{_labels(labels)} {summary.count}')
+        return lines
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+metrics = MetricsRegistry()
+
+
+def _record_stages(trace, source):
+    for stage, seconds in trace.spans.items():
+        metrics.observe('stage_duration_seconds', 'Time spent per report generation stage.',
+                        seconds, source=source, stage=stage)
+    images = trace.counters.get('images')
+    if images:
+        metrics.observe('report_images', 'Images embedded per generated report.', images, source=source)
+
+
+def _log_if_slow(kind, label, trace):
+    if trace.duration * 1000 >= Config.SLOW_REQUEST_MS:
+        log.warning(f'slow_{kind}', target=label, duration_ms=round(trace.duration * 1000), stages_ms={
+            stage: round(seconds * 1000, 1) for stage, seconds in trace.spans.items()}, **trace.counters)
+
+
+# -- request and job traces ------------------------------------------------------------
+
+def start_request_trace():
+    """before_request hook: open the trace of this request."""
+    if Config.INSTRUMENTATION_ENABLED:
+        from flask import g
+        g.instrumentation_trace = Trace('request')
+        g.instrumentation_token = _current.set(g.instrumentation_trace)
+
+
+def finish_request_trace(response):
+    """after_request hook: Server-Timing header, slow-request log and request metrics."""
+    from flask import g, request
+    trace = g.pop('instrumentation_trace', None)
+    if trace is None:
+        return response
+    _current.reset(g.pop('instrumentation_token'))
+    trace.finish()
+
+    timings = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in trace.spans.items()]
+    if trace.resources is not None:
+        timings.append(f"cpu;dur={trace.resources['process_cpu_s'] * 1000:.1f}")
+    timings.append(f'total;dur={trace.duration * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    endpoint = request.endpoint or 'unmatched'
+    metrics.observe('http_request_duration_seconds', 'HTTP request duration.', trace.duration,
+                    endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.observe('http_request_bytes', 'HTTP request body size.', request.content_length or 0, endpoint=endpoint)
+    if response.content_length is not None:
+        metrics.observe('http_response_bytes', 'HTTP response body size.', response.content_length, endpoint=endpoint)
+    _record_stages(trace, endpoint)
+    _log_if_slow('request', f'{request.method} {request.path} -> {response.status_code}', trace)
+    return response
+
+
+@contextmanager
+def traced(name):
+    """Open a trace outside a request (e.g. a background job) and record its metrics when done."""
+    if not Config.INSTRUMENTATION_ENABLED:
+        yield None
+        return
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.finish()
+        metrics.observe('job_duration_seconds', 'Background job duration.', trace.duration, kind=name)
+        _record_stages(trace, name)
+        _log_if_slow('job', name, trace)
+
+
+# -- exposition ----------------------------------------------------------------------
+
+def _gauge(lines, name, help_text, samples, metric_type='gauge'):
+    full_name = f'{PREFIX}_{name}'
+    lines.append(f'# HELP {full_name} {help_text}')
+    lines.append(f'# TYPE {full_name} {metric_type}')
+    for labels, value in samples:
+        lines.append(f'{full_name}{_labels(labels)} {value}')
+
+
+def render_metrics():
+    """Return every metric of this process in the Prometheus text exposition format."""
+    from .admission import admission
+    from .retention import storage_manager
+
+    lines = metrics.render()
+    capacity = admission.stats()
+    _gauge(lines, 'admission_in_flight', 'Report generations running.', [((), capacity['in_flight'])])
+    _gauge(lines, 'admission_queued', 'Report generations waiting for a slot.', [((), capacity['queued'])])
+    _gauge(lines, 'admission_rejected_total', 'Generate requests rejected with 503.', [((), capacity['rejected'])], 'counter')
+    if Config.ASYNC_JOBS:
+        from .job_queue import job_queue
+        jobs = job_queue.stats()
+        _gauge(lines, 'jobs', 'Background jobs per state.',
+               [((('state', state),), jobs[state]) for state in ('queued', 'running', 'done', 'failed')])
+    storage = storage_manager.stats()
+    _gauge(lines, 'storage_used_bytes', 'Bytes used by reports and uploads.', [((), storage['used_bytes'])])
+    _gauge(lines, 'storage_quota_bytes', 'Storage quota.', [((), storage['quota_bytes'])])
+    return '\n'.join(lines) + '\n'
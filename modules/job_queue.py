@@ -0,0 +1,445 @@
+"""
+Report Job Queue Module
+=======================
+
+FUNCTION: Runs report generation as background jobs backed by a local SQLite queue.
+
+RESPONSIBILITIES:
+- Detach a submission (form fields + uploaded files) from its HTTP request
+- Persist jobs in SQLite so every app process shares one queue (no external broker)
+- Run jobs on a small pool of worker threads per process
+- Cap the number of jobs running at once across all processes
+- Cap the backlog of queued jobs: beyond it a submission is refused with 503 and
+  a Retry-After estimated from the recent job duration
+- Record the current stage and percentage of each job
+- Retry failed jobs with a growing delay, up to a maximum number of attempts; fail
+  at once on errors a retry cannot fix (invalid form, expired upload, missing file)
+- Recover jobs whose process died mid-run (lease expiry); long stages renew the
+  lease as they go (renew_lease)
+
+KEY FUNCTIONS:
+- Submission: Form and files of a report request, serializable to JSON
+- job_queue: Shared JobQueue used by the training routes
+- JobQueue.register(): Associates a job kind with its handler and success page
+- JobQueue.enqueue(): Stores a submission as a queued job and returns its id
+- JobQueue.get(): Job state, stage, progress, attempts, error and result
+- JobQueue.start(): Starts the worker threads for the Flask app
+- JobQueue.stats(): Job counts per state, the configured limits and the saturated flag
+
+FEATURES:
+- Claiming a job is a single IMMEDIATE transaction, so two processes never run
+  the same job, and the concurrency cap holds across processes
+- Handlers run inside an application context, with the submission in place of
+  the request: anything reading request.form / request.files works unchanged
+- Uploaded files are kept in the content-addressed upload store until the job is done;
+  pre-uploaded files named by id are resolved when the job is queued and kept alike
+- Finished jobs are purged after Config.JOB_RETENTION seconds
+
+Job queue utilities for the Training Report Generator.
+"""
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.exceptions import HTTPException, ServiceUnavailable
+
+import sys
+sys.path.append('..')
+from config import Config
+from .upload_store import get_upload_store
+from .chunked_upload import preuploaded_files
+from .instrumentation import traced
+from .resource_accounting import accounted
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    state TEXT NOT NULL,
+    stage TEXT NOT NULL DEFAULT '',
+    progress INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, run_after);
+"""
+
+
+class QueueFull(ServiceUnavailable):
+    """Raised by JobQueue.enqueue() when the backlog of queued jobs is full (503 with Retry-After)."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many reports are waiting to be generated. Please try again in {retry_after} seconds.",
+                         retry_after=retry_after)
+
+
+def no_progress(stage, percent):
+    """Progress callback used when a report is generated outside the job queue."""
+
+
+def output_suffix(submission):
+    """Suffix for the output filename of a submission ('' for a Flask request)."""
+    return getattr(submission, 'output_suffix', '')
+
+
+# Lease renewal of the job running in the current context (None outside the job queue)
+_lease_renewal = ContextVar('job_lease_renewal', default=None)
+
+
+def renew_lease():
+    """
+    Extend the lease of the job being generated in this context, for stages that can
+    outlast Config.JOB_LEASE (e.g. per image of a large gallery); no-op outside a job.
+    """
+    renew = _lease_renewal.get()
+    if renew is not None:
+        renew()
+
+
+def is_permanent_error(error):
+    """Return True for failures a retry cannot fix: client errors (4xx), invalid values, missing files."""
+    if isinstance(error, HTTPException):
+        return error.code is not None and 400 <= error.code < 500
+    return isinstance(error, (ValueError, FileNotFoundError))
+
+
+class Submission:
+    """Form fields and uploaded files of a report request, detached from the HTTP request."""
+
+    def __init__(self, form_items, file_items, output_suffix=''):
+        self.form_items = form_items    # [(field, value)]
+        self.file_items = file_items    # [(field, original filename, stored path)]
+        self.output_suffix = output_suffix  # e.g. '_row7' for a batch row, so outputs never collide
+        self.form = MultiDict(form_items)
+        self._files = None
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Capture request.form and store every non-empty upload in the upload store.
+        Pre-uploaded files named by "<field>_id" become files of the submission too, so
+        the job's active_paths() protect them from eviction until it has run.
+        """
+        store = get_upload_store()
+        file_items = []
+        for field, file in request.files.items(multi=True):
+            path = store.save(file)
+            if path is not None:
+                file_items.append((field, file.filename, path))
+        for field, upload in preuploaded_files(request):
+            file_items.append((field, upload.filename, upload.path))
+        return cls(list(request.form.items(multi=True)), file_items)
+
+    @property
+    def files(self):
+        """MultiDict of FileStorage objects reading the stored uploads."""
+        if self._files is None:
+            self._files = MultiDict(
+                (field, FileStorage(open(path, 'rb'), filename=filename, name=field))
+                for field, filename, path in self.file_items
+            )
+        return self._files
+
+    def close(self):
+        """Close the upload files opened by files."""
+        if self._files is not None:
+            for file in self._files.values():
+                file.close()
+            self._files = None
+
+    def to_json(self):
+        return json.dumps({'form': self.form_items, 'files': self.file_items})
+
+    @classmethod
+    def from_json(cls, data):
+        payload = json.loads(data)
+        return cls([tuple(item) for item in payload['form']], [tuple(item) for item in payload['files']])
+
+
+class JobQueue:
+    """SQLite-backed queue of report jobs with a per-process pool of worker threads."""
+
+    def __init__(self, db_path=None, workers=None, max_running=None, max_attempts=None,
+                 retry_delay=None, lease=None, max_queued=None):
+        self.db_path = db_path or Config.JOB_DB_PATH
+        self.workers = workers if workers is not None else Config.JOB_WORKERS
+        self.max_running = max_running if max_running is not None else Config.JOB_MAX_RUNNING
+        self.max_attempts = max_attempts if max_attempts is not None else Config.JOB_MAX_ATTEMPTS
+        self.retry_delay = retry_delay if retry_delay is not None else Config.JOB_RETRY_DELAY
+        self.lease = lease if lease is not None else Config.JOB_LEASE
+        self.max_queued = max_queued if max_queued is not None else Config.JOB_MAX_QUEUED
+        self.handlers = {}
+        self.app = None
+        self._threads = []
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._last_purge = 0.0
+        self._avg_seconds = None  # moving average of job run time in this process
+
+    # -- storage -----------------------------------------------------------
+
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                    conn = sqlite3.connect(self.db_path, timeout=30)
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.executescript(_SCHEMA)
+                    conn.close()
+                    self._initialized = True
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    # -- submitting and polling ---------------------------------------------
+
+    def register(self, kind, handler, success_endpoint):
+        """Register handler(submission, progress) -> output filename for a job kind."""
+        self.handlers[kind] = (handler, success_endpoint)
+
+    def _retry_after(self, queued):
+        """Seconds until the backlog of queued jobs has likely drained enough for a new one."""
+        if self._avg_seconds is None:
+            return Config.ADMISSION_RETRY_AFTER
+        rounds = (queued - self.max_queued + 1) / max(1, self.max_running)
+        return max(Config.ADMISSION_RETRY_AFTER, math.ceil(self._avg_seconds * rounds))
+
+    def enqueue(self, kind, submission):
+        """Store a submission as a queued job and return the job id.
+
+        Raises QueueFull when Config.JOB_MAX_QUEUED jobs are already waiting.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Count and insert in one IMMEDIATE transaction so the cap holds across processes
+            conn.execute('BEGIN IMMEDIATE')
+            queued = conn.execute('SELECT COUNT(*) FROM jobs WHERE state = ?', (QUEUED,)).fetchone()[0]
+            if queued >= self.max_queued:
+                conn.execute('ROLLBACK')
+                retry_after = self._retry_after(queued)
+                log.warning('job_rejected', kind=kind, queued=queued, retry_after_s=retry_after)
+                raise QueueFull(retry_after)
+            conn.execute(
+                'INSERT INTO jobs (id, kind, state, stage, payload, created_at, updated_at, run_after) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, QUEUED, 'queued', submission.to_json(), now, now, now),
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Return the public view of a job, or None if it does not exist."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT id, kind, state, stage, progress, attempts, result, error, created_at, updated_at '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['success_endpoint'] = self.handlers.get(job['kind'], (None, None))[1]
+        return job
+
+    def active_paths(self):
+        """Return the stored upload paths that queued or running jobs still read."""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT payload FROM jobs WHERE state IN (?, ?)', (QUEUED, RUNNING)).fetchall()
+        finally:
+            conn.close()
+        return {path for (payload,) in rows for _, _, path in json.loads(payload)['files']}
+
+    # -- workers -------------------------------------------------------------
+
+    def start(self, app):
+        """Start the worker threads of this process (once; never in spawned child processes)."""
+        if self._threads or multiprocessing.parent_process() is not None:
+            return
+        self.app = app
+        self._connect().close()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'report-job-{i + 1}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Ask the worker threads to exit after their current job."""
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                job = self._claim()
+                if job is None:
+                    self._purge_finished()
+            except sqlite3.Error as e:
+                log.warning('job_queue_unavailable', error=str(e))
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(Config.JOB_POLL_INTERVAL)
+                continue
+            self._run(job)
+
+    def _claim(self):
+        """Atomically move the next runnable job to 'running', respecting the concurrency cap."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            running = conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE state = ? AND lease_until > ?', (RUNNING, now)
+            ).fetchone()[0]
+            if running >= self.max_running:
+                conn.execute('COMMIT')
+                return None
+            while True:
+                # Queued jobs that are due, and running jobs whose process stopped renewing the lease
+                row = conn.execute(
+                    'SELECT * FROM jobs WHERE (state = ? AND run_after <= ?) OR (state = ? AND lease_until <= ?) '
+                    'ORDER BY created_at LIMIT 1', (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                if row['attempts'] >= self.max_attempts:
+                    conn.execute('UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?',
+                                 (FAILED, row['error'] or 'Worker stopped while generating the report', now, row['id']))
+                    continue
+                conn.execute(
+                    'UPDATE jobs SET state = ?, stage = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? '
+                    'WHERE id = ?', (RUNNING, 'starting', now + self.lease, now, row['id'])
+                )
+                conn.execute('COMMIT')
+                job = dict(row)
+                job['attempts'] += 1
+                return job
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _run(self, job):
+        handler, _ = self.handlers[job['kind']]
+        submission = Submission.from_json(job['payload'])
+        renewed = time.time()
+
+        def progress(stage, percent):
+            nonlocal renewed
+            renewed = time.time()
+            self._update(job['id'], stage=stage, progress=int(percent), lease_until=renewed + self.lease)
+
+        def renew():
+            # Called per image inside long stages: write at most every tenth of the lease
+            nonlocal renewed
+            now = time.time()
+            if now - renewed >= self.lease / 10:
+                renewed = now
+                self._update(job['id'], lease_until=now + self.lease)
+
+        log.info('job_started', job=job['id'], kind=job['kind'], attempt=job['attempts'])
+        lease_token = _lease_renewal.set(renew)
+        start = time.monotonic()
+        try:
+            with self.app.app_context(), traced(job['kind']), accounted(f"job {job['id']}", job['kind']):
+                filename = handler(submission, progress)
+            elapsed = time.monotonic() - start
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._update(job['id'], state=DONE, stage='done', progress=100, result=filename, error=None)
+            log.info('job_finished', job=job['id'], kind=job['kind'], file=filename)
+        except Exception as e:
+            if is_permanent_error(e):
+                # Invalid input, an expired upload or a missing file fails the same way every time
+                self._update(job['id'], state=FAILED, stage='failed', error=str(e))
+                log.error('job_failed', job=job['id'], kind=job['kind'], attempts=job['attempts'],
+                          permanent=True, error=str(e))
+            elif job['attempts'] < self.max_attempts:
+                delay = self.retry_delay * job['attempts']
+                self._update(job['id'], state=QUEUED, stage='retrying', error=str(e), run_after=time.time() + delay)
+                log.warning('job_retrying', job=job['id'], kind=job['kind'], attempt=job['attempts'], delay_s=delay, error=str(e))
+            else:
+                self._update(job['id'], state=FAILED, stage='failed', error=str(e))
+                log.error('job_failed', job=job['id'], kind=job['kind'], attempts=job['attempts'], error=str(e), exc_info=True)
+        finally:
+            _lease_renewal.reset(lease_token)
+            submission.close()
+
+    def _purge_finished(self):
+        """Delete finished jobs older than Config.JOB_RETENTION (checked at most once a minute)."""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?',
+                         (DONE, FAILED, now - Config.JOB_RETENTION))
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Return job counts per state, the configured limits and whether the backlog is full."""
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        finally:
+            conn.close()
+        return {
+            'workers': len(self._threads),
+            'max_running': self.max_running,
+            'max_attempts': self.max_attempts,
+            'max_queued': self.max_queued,
+            **{state: counts.get(state, 0) for state in (QUEUED, RUNNING, DONE, FAILED)},
+            'saturated': counts.get(QUEUED, 0) >= self.max_queued,
+        }
+
+
+# Shared per-process queue used by the training routes
+job_queue = JobQueue()
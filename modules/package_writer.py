@@ -0,0 +1,220 @@
+"""
+Document Package Writer Module
+==============================
+
+FUNCTION: Saves generated documents without re-compressing parts copied from the template.
+
+RESPONSIBILITIES:
+- Copy unchanged zip members byte-for-byte from the template archive
+- Serialize and write only the modified XML parts and newly added media
+- Apply a per-part compression policy (store images, deflate XML)
+- Fall back to a plain python-docx style save when no template source is known
+
+KEY FUNCTIONS:
+- save_document(): Writes a document, reusing raw template members where possible
+- compression_for(): Returns the zip compression settings for a content type
+- mark_dirty(): Records that an XML part other than the main document was edited
+- raw_copy_supported(): Whether raw member copying works with this Python's zipfile
+- PackageSource: Indexes the raw members of a template .docx held in memory
+
+FEATURES:
+- Template media (several MB per template) is never inflated or deflated again
+- Unedited template XML parts (styles, numbering, headers without placeholders, ...)
+  are neither serialized nor compressed; edits are tracked with mark_dirty()
+- Raw copying falls back to regular zip writes if zipfile's internals ever change
+- Already-compressed images (JPEG/PNG/GIF) are stored, not deflated
+- XML deflate level is configurable through Config.DOCX_XML_COMPRESSLEVEL
+- Output is a standard OPC package readable by Word and python-docx
+- A report path is written under a temporary name and renamed into place, so a
+  download never sees a partly written file
+
+Package writing utilities for Word document generation.
+"""
+import io
+import os
+import struct
+import uuid
+import zipfile
+
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.part import XmlPart
+from docx.opc.pkgwriter import _ContentTypesItem
+
+import sys
+sys.path.append('..')
+from config import Config
+from .instrumentation import instrumented
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+# Local file header: fixed 30 bytes, then file name and extra field
+_LOCAL_HEADER_SIZE = 30
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def compression_for(content_type):
+    """Return (compress_type, compresslevel) for a part with the given content type."""
+    if content_type in Config.DOCX_STORED_CONTENT_TYPES:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, Config.DOCX_XML_COMPRESSLEVEL
+
+
+class PackageSource:
+    """Raw zip members of a template package, addressed by member name."""
+
+    def __init__(self, data):
+        self._data = memoryview(data)
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self._members = {info.filename: info for info in zf.infolist()}
+
+    def __contains__(self, membername):
+        return membername in self._members
+
+    def raw_member(self, membername):
+        """Return (ZipInfo, compressed bytes view) for a member, without inflating it."""
+        info = self._members[membername]
+        offset = info.header_offset
+        name_len, extra_len = struct.unpack(
+            '<HH', self._data[offset + 26:offset + _LOCAL_HEADER_SIZE]
+        )
+        start = offset + _LOCAL_HEADER_SIZE + name_len + extra_len
+        return info, self._data[start:start + info.compress_size]
+
+
+def _write_raw_member(zf, info, raw):
+    """
+    Append an already-compressed member to an open ZipFile in write mode. zipfile has
+    no public API for this, so it relies on ZipFile internals; raw_copy_supported()
+    checks them before any real package is written this way.
+    """
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.flag_bits = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+
+    zinfo.header_offset = zf.fp.tell()
+    zf.fp.write(zinfo.FileHeader())
+    zf.fp.write(raw)
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = zf.fp.tell()
+    zf._didModify = True
+
+
+_raw_copy = None
+
+
+def raw_copy_supported():
+    """
+    Return True if _write_raw_member works with this Python's zipfile: checked once
+    per process by copying a member between two in-memory archives and reading the
+    result back. Otherwise unchanged parts are written through the public zipfile API.
+    """
+    global _raw_copy
+    if _raw_copy is None:
+        probe = b'<probe/>' * 64
+        try:
+            original = io.BytesIO()
+            with zipfile.ZipFile(original, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('probe.xml', probe)
+            source = PackageSource(original.getvalue())
+            copied = io.BytesIO()
+            with zipfile.ZipFile(copied, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('before.xml', b'<before/>')
+                _write_raw_member(zf, *source.raw_member('probe.xml'))
+                zf.writestr('after.xml', b'<after/>')
+            with zipfile.ZipFile(copied) as zf:
+                _raw_copy = (zf.namelist() == ['before.xml', 'probe.xml', 'after.xml']
+                             and zf.testzip() is None and zf.read('probe.xml') == probe)
+        except Exception:
+            _raw_copy = False
+        if not _raw_copy:
+            log.warning('raw_zip_copy_unsupported', python=sys.version.split()[0])
+    return _raw_copy
+
+
+def mark_dirty(part):
+    """
+    Record that the XML of part was edited after cloning the template. save_document
+    copies template XML parts that were never marked (the main document part excepted)
+    without serializing them, so code editing any other XML part must call this.
+    """
+    part._edited = True
+
+
+def _is_dirty(part):
+    return getattr(part, '_edited', False) or part is part.package.main_document_part
+
+
+def _write_member(zf, membername, blob, content_type):
+    compress_type, compresslevel = compression_for(content_type)
+    zf.writestr(membername, blob, compress_type=compress_type, compresslevel=compresslevel)
+
+
+@instrumented('save')
+def save_document(doc, output_path, template=None):
+    """
+    Save doc to output_path. When template (a cached template entry with a raw
+    PackageSource and the master package) is given, every part whose content
+    is unchanged from the template is copied as raw compressed bytes; only
+    edited XML parts (see mark_dirty) and new media are serialized and compressed.
+    Returns (copied_parts, written_parts).
+    """
+    if not isinstance(output_path, (str, os.PathLike)):
+        return _write_package(doc, output_path, template)  # a file object (e.g. BytesIO)
+    # Write next to the target and rename it into place (atomic on the same filesystem)
+    tmp_path = f'{os.fspath(output_path)}.{uuid.uuid4().hex}.tmp'
+    try:
+        counts = _write_package(doc, tmp_path, template)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return counts
+
+
+def _write_package(doc, target, template):
+    """Write the zip package of doc to target (a path or file object); returns (copied, written)."""
+    package = doc.part.package
+    parts = list(package.iter_parts())
+    for part in parts:
+        part.before_marshal()
+
+    master_parts = template.master_parts() if template is not None else {}
+    source = template.source if template is not None else ()
+    raw_copy = template is not None and raw_copy_supported()
+    copied = written = 0
+
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        _write_member(zf, CONTENT_TYPES_URI.membername,
+                      _ContentTypesItem.from_parts(parts).blob, CT.XML)
+        _write_member(zf, PACKAGE_URI.rels_uri.membername, package.rels.xml, CT.XML)
+
+        for part in parts:
+            membername = part.partname.membername
+            if isinstance(part, XmlPart):
+                # Template XML parts nobody edited are copied without serializing them
+                unchanged = part.partname in master_parts and not _is_dirty(part)
+            else:
+                unchanged = master_parts.get(part.partname) is part.blob  # shares the template's bytes
+
+            if unchanged and raw_copy and membername in source:
+                _write_raw_member(zf, *source.raw_member(membername))
+                copied += 1
+            else:
+                _write_member(zf, membername, part.blob, part.content_type)
+                written += 1
+
+            if len(part.rels):
+                _write_member(zf, part.partname.rels_uri.membername, part.rels.xml, CT.XML)
+
+    return copied, written
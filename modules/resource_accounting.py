@@ -0,0 +1,248 @@
+"""
+Resource Accounting Module
+==========================
+
+FUNCTION: Measures the CPU time and memory of individual report generations (sampled).
+
+RESPONSIBILITIES:
+- For a sampled share of generations (Config.RESOURCE_SAMPLE_RATE), record CPU time,
+  RSS at start and end, and the RSS high-water mark during the generation
+- For a smaller share (Config.TRACEMALLOC_SAMPLE_RATE), also trace Python allocations
+  and keep the top allocation sites at the generation's highest traced memory
+- Attach the measurements to the request's trace and metrics
+- Log generations whose CPU time or RSS growth exceed the outlier thresholds
+- Keep the recent measurements for the heaviest-generations admin view
+
+KEY FUNCTIONS:
+- accounted(): Context manager measuring one generation (used by the generate routes and jobs)
+- heaviest(): Heaviest recent generations by memory and by CPU
+- current_rss(): Resident set size of this process in bytes
+
+FEATURES:
+- CPU time is the generating thread's own (time.thread_time) plus the process total,
+  which also covers the image pool threads
+- The high-water mark is sampled by one background thread every
+  Config.RESOURCE_SAMPLE_INTERVAL seconds while any generation is measured
+- Allocation sites are captured at stage boundaries, whenever traced memory reaches
+  a new high, so they show what was alive at the peak rather than at the end
+- RSS and tracemalloc are per process: concurrent generations are included in each other's figures
+
+Resource accounting utilities for the Training Report Generator.
+"""
+import os
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import sys
+sys.path.append('..')
+from config import Config
+from .instrumentation import current_trace, metrics
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+_MB = 1024 * 1024
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Measurement:
+    """Resource figures of one generation while it runs."""
+
+    def __init__(self, label, source, trace_allocations):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.source = source
+        self.started_at = time.time()
+        self.wall_start = time.perf_counter()
+        self.thread_cpu_start = time.thread_time()
+        self.process_cpu_start = time.process_time()
+        self.rss_start = current_rss()
+        self.rss_peak = self.rss_start
+        self.trace_allocations = trace_allocations
+        self.best_traced = 0
+        self.best_stage = None
+        self.snapshot = None
+
+    def on_span_end(self, stage):
+        """Keep a tracemalloc snapshot whenever traced memory reaches a new high."""
+        traced, _ = tracemalloc.get_traced_memory()
+        if traced > self.best_traced:
+            self.best_traced = traced
+            self.best_stage = stage
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def result(self):
+        rss_end = current_rss()
+        self.rss_peak = max(self.rss_peak, rss_end)
+        record = {
+            'id': self.id,
+            'label': self.label,
+            'source': self.source,
+            'at': round(self.started_at, 3),
+            'wall_s': round(time.perf_counter() - self.wall_start, 3),
+            'thread_cpu_s': round(time.thread_time() - self.thread_cpu_start, 3),
+            'process_cpu_s': round(time.process_time() - self.process_cpu_start, 3),
+            'rss_start_mb': round(self.rss_start / _MB, 1),
+            'rss_end_mb': round(rss_end / _MB, 1),
+            'rss_delta_mb': round((rss_end - self.rss_start) / _MB, 1),
+            'rss_peak_mb': round(self.rss_peak / _MB, 1),
+            'rss_peak_growth_mb': round((self.rss_peak - self.rss_start) / _MB, 1),
+        }
+        trace = current_trace()
+        if trace is not None and trace.counters.get('images'):
+            record['images'] = trace.counters['images']
+        if self.trace_allocations:
+            _, peak = tracemalloc.get_traced_memory()
+            record['traced_peak_mb'] = round(peak / _MB, 1)
+            record['top_allocations_stage'] = self.best_stage
+            record['top_allocations'] = _top_sites(self.snapshot)
+        return record
+
+
+def _top_sites(snapshot):
+    if snapshot is None:
+        return []
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ))
+    return [
+        {'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+         'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:Config.TRACEMALLOC_TOP]
+    ]
+
+
+class ResourceAccountant:
+    """Samples generations, tracks the RSS high-water mark and keeps recent measurements."""
+
+    def __init__(self, history=None):
+        self._lock = threading.Lock()
+        self._active = set()
+        self._tracing = 0  # measured generations tracing allocations
+        self._started_tracemalloc = False
+        self._sampler = None
+        self._wakeup = threading.Condition(self._lock)
+        self.recent = deque(maxlen=history if history is not None else Config.RESOURCE_HISTORY)
+
+    # -- RSS sampler -------------------------------------------------------------
+
+    def _sample_loop(self):
+        with self._lock:
+            while True:
+                while not self._active:
+                    self._wakeup.wait()
+                rss = current_rss()
+                for measurement in self._active:
+                    if rss > measurement.rss_peak:
+                        measurement.rss_peak = rss
+                self._wakeup.wait(Config.RESOURCE_SAMPLE_INTERVAL)
+
+    def _begin(self, measurement):
+        with self._lock:
+            if measurement.trace_allocations:
+                if self._tracing == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start(Config.TRACEMALLOC_FRAMES)
+                    self._started_tracemalloc = True
+                self._tracing += 1
+                tracemalloc.reset_peak()
+            self._active.add(measurement)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='rss-sampler', daemon=True)
+                self._sampler.start()
+            self._wakeup.notify()
+
+    def _end(self, measurement):
+        with self._lock:
+            self._active.discard(measurement)
+        record = measurement.result()
+        with self._lock:
+            if measurement.trace_allocations:
+                self._tracing -= 1
+                if self._tracing == 0 and self._started_tracemalloc:
+                    tracemalloc.stop()
+                    self._started_tracemalloc = False
+            self.recent.append(record)
+        return record
+
+    @contextmanager
+    def accounted(self, label, source):
+        """Measure the enclosed generation when it is sampled (see Config.RESOURCE_SAMPLE_RATE)."""
+        if random.random() >= Config.RESOURCE_SAMPLE_RATE:
+            yield None
+            return
+        trace_allocations = random.random() < Config.TRACEMALLOC_SAMPLE_RATE / max(Config.RESOURCE_SAMPLE_RATE, 1e-9)
+        measurement = _Measurement(label, source, trace_allocations)
+        trace = current_trace()
+        self._begin(measurement)
+        if trace is not None and trace_allocations:
+            trace.on_span_end = measurement.on_span_end
+        try:
+            yield measurement
+        finally:
+            if trace is not None:
+                trace.on_span_end = None
+            record = self._end(measurement)
+            _record(record, trace)
+
+    def heaviest(self, limit=10):
+        """Heaviest recent generations by RSS growth and by CPU time."""
+        with self._lock:
+            records = list(self.recent)
+        return {
+            'sampled': len(records),
+            'sample_rate': Config.RESOURCE_SAMPLE_RATE,
+            'tracemalloc_sample_rate': Config.TRACEMALLOC_SAMPLE_RATE,
+            'by_memory': sorted(records, key=lambda r: r['rss_peak_growth_mb'], reverse=True)[:limit],
+            'by_cpu': sorted(records, key=lambda r: r['process_cpu_s'], reverse=True)[:limit],
+        }
+
+
+def _record(record, trace):
+    """Attach a measurement to the trace and metrics, and log it when it is an outlier."""
+    if trace is not None:
+        trace.resources = record
+    source = record['source']
+    metrics.observe('generation_cpu_seconds', 'Process CPU time per measured generation.',
+                    record['process_cpu_s'], source=source)
+    metrics.observe('generation_rss_peak_growth_bytes', 'RSS high-water mark above the starting RSS.',
+                    record['rss_peak_growth_mb'] * _MB, source=source)
+    metrics.observe('generation_rss_peak_bytes', 'RSS high-water mark during a measured generation.',
+                    record['rss_peak_mb'] * _MB, source=source)
+
+    if (record['rss_peak_growth_mb'] >= Config.RESOURCE_OUTLIER_RSS_MB
+            or record['process_cpu_s'] >= Config.RESOURCE_OUTLIER_CPU_S):
+        log.warning('heavy_generation', **dict(record, top_allocations=record.get('top_allocations', [])[:3]))
+
+
+# Shared per-process accountant
+resource_accountant = ResourceAccountant()
+
+
+def accounted(label, source):
+    """Measure a generation with the shared accountant."""
+    return resource_accountant.accounted(label, source)
+
+
+def heaviest(limit=10):
+    return resource_accountant.heaviest(limit)
@@ -0,0 +1,332 @@
+"""
+Storage Retention Module
+========================
+
+FUNCTION: Keeps generated reports and uploads within a disk quota by expiring and evicting files.
+
+RESPONSIBILITIES:
+- Track every file under Config.OUTPUT_FOLDER and Config.UPLOAD_FOLDER with its
+  class, size and last access time
+- Expire files older than their class TTL (reports, uploads, image variants,
+  chunked upload sessions, abandoned temporary files)
+- Keep total usage under Config.STORAGE_QUOTA_BYTES: once over it, evict the least
+  recently used files until usage is back under the low watermark
+- Never remove uploads that queued or running report jobs still need, nor files
+  younger than Config.RETENTION_MIN_AGE
+- Report usage per class and eviction counters for /health
+
+KEY FUNCTIONS:
+- storage_manager: Shared StorageManager of the process
+- StorageManager.start(): Starts the background sweep thread (once per process)
+- StorageManager.track(): Registers a file just written (report, upload, variant)
+- StorageManager.touch(): Marks a file as used now (e.g. a report download)
+- StorageManager.sweep(): One incremental sweep step (scan a batch, expire, evict)
+- StorageManager.stats(): Usage, quota and eviction statistics
+
+FEATURES:
+- Incremental: each step scans at most Config.RETENTION_BATCH directory entries
+  and deletes at most as many files, so a sweep never stalls the process
+- Last access is the later of the file mtime and atime; touch() sets the atime
+  (a download keeps the report's mtime, Last-Modified and ETag) and upload
+  deduplication the mtime, so the LRU order survives restarts and is shared
+  between worker processes
+- Under quota pressure, rebuildable image variants go first, then uploads, then
+  reports; within a class the least recently used file goes first
+- Deleting a file twice (several worker processes sweeping) is harmless
+
+Storage retention utilities for the Training Report Generator.
+"""
+import multiprocessing
+import os
+import threading
+import time
+
+import sys
+sys.path.append('..')
+from config import Config
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+REPORT, UPLOAD, VARIANT, SESSION, TEMP = 'report', 'upload', 'variant', 'session', 'temp'
+
+# Order of eviction under quota pressure; sessions and temporary files only expire
+_EVICTION_RANK = {VARIANT: 0, UPLOAD: 1, REPORT: 2}
+_TEMP_TTL = 3600  # abandoned .part / .tmp files
+_TEMP_SUFFIXES = ('.part', '.tmp')
+
+
+class StorageManager:
+    """Quota, TTL and LRU retention for the output and upload folders."""
+
+    def __init__(self, output_root=None, upload_root=None, quota_bytes=None, low_watermark=None,
+                 ttls=None, min_age=None, interval=None, batch=None):
+        self.output_root = os.path.abspath(output_root or Config.OUTPUT_FOLDER)
+        self.upload_root = os.path.abspath(upload_root or Config.UPLOAD_FOLDER)
+        self.quota_bytes = quota_bytes if quota_bytes is not None else Config.STORAGE_QUOTA_BYTES
+        self.low_watermark = low_watermark if low_watermark is not None else Config.STORAGE_LOW_WATERMARK
+        self.ttls = ttls or {
+            REPORT: Config.REPORT_TTL,
+            UPLOAD: Config.UPLOAD_TTL,
+            VARIANT: Config.VARIANT_CACHE_TTL,
+            SESSION: Config.UPLOAD_SESSION_TTL,
+            TEMP: _TEMP_TTL,
+        }
+        self.min_age = min_age if min_age is not None else Config.RETENTION_MIN_AGE
+        self.interval = interval if interval is not None else Config.RETENTION_INTERVAL
+        self.batch = batch if batch is not None else Config.RETENTION_BATCH
+
+        self._lock = threading.Lock()
+        self._files = {}  # path -> [class, size, last access]
+        self._bytes = 0
+        self._scan = None  # generator of the scan in progress
+        self._seen = set()
+        self._scans_completed = 0
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+        self.evictions = {}  # 'class:reason' -> files
+        self.bytes_freed = 0
+        self.last_sweep = None
+        self.last_sweep_ms = None
+
+    # -- classification ----------------------------------------------------
+
+    def classify(self, path):
+        """Return the retention class of a path, or None when it is not managed."""
+        name = os.path.basename(path)
+        directory = os.path.dirname(path)
+        if name.startswith('.'):
+            return None  # .gitkeep and other hidden files
+        if name.endswith(_TEMP_SUFFIXES):
+            # Chunked session data is a .part too, but lives with its session
+            return SESSION if directory == os.path.join(self.upload_root, 'incoming') else TEMP
+        if directory == self.output_root:
+            return REPORT if name.endswith('.docx') else None
+        if directory == self.upload_root:
+            return UPLOAD
+        if directory == os.path.join(self.upload_root, 'variants'):
+            return VARIANT
+        if directory == os.path.join(self.upload_root, 'incoming'):
+            return SESSION
+        return None
+
+    # -- index ---------------------------------------------------------------
+
+    def _set(self, path, cls, size, last_access):
+        entry = self._files.get(path)
+        if entry is not None:
+            self._bytes -= entry[1]
+        self._files[path] = [cls, size, last_access]
+        self._bytes += size
+
+    def _forget(self, path):
+        entry = self._files.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    def track(self, path, size=None):
+        """Register a file that was just written; wakes the sweeper when over quota."""
+        path = os.path.abspath(path)
+        cls = self.classify(path)
+        if cls is None:
+            return
+        try:
+            size = size if size is not None else os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._set(path, cls, size, time.time())
+            self._seen.add(path)  # not dropped by the scan in progress
+            over_quota = self._bytes > self.quota_bytes
+        if over_quota:
+            self._wakeup.set()
+
+    def touch(self, path):
+        """Mark a managed file as used now (persisted as its atime; the mtime stays the content's)."""
+        path = os.path.abspath(path)
+        try:
+            # mtime feeds Last-Modified and the content ETag cache of downloads: leave it alone
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            return
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                entry[2] = time.time()
+
+    def _scan_entries(self):
+        """Yield (path, stat) for every file of the managed directories."""
+        directories = [self.output_root, self.upload_root,
+                       os.path.join(self.upload_root, 'variants'), os.path.join(self.upload_root, 'incoming')]
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_file(follow_symlinks=False):
+                                yield entry.path, entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _scan_step(self):
+        """Index up to batch directory entries; finishing a scan drops files deleted by others."""
+        if self._scan is None:
+            self._scan = self._scan_entries()
+            self._seen = set()
+        for _ in range(self.batch):
+            try:
+                path, stat = next(self._scan)
+            except StopIteration:
+                with self._lock:
+                    for path in [path for path in self._files if path not in self._seen]:
+                        self._forget(path)
+                self._scan = None
+                self._scans_completed += 1
+                return
+            cls = self.classify(path)
+            if cls is None:
+                continue
+            self._seen.add(path)
+            with self._lock:
+                entry = self._files.get(path)
+                # The index may know of a more recent access than the filesystem
+                last_access = max(stat.st_mtime, stat.st_atime, entry[2] if entry is not None else 0)
+                self._set(path, cls, stat.st_size, last_access)
+
+    # -- eviction --------------------------------------------------------------
+
+    def _protected_paths(self):
+        """Uploads that queued or running report jobs still read."""
+        if not Config.ASYNC_JOBS:
+            return set()
+        from .job_queue import job_queue
+        try:
+            return job_queue.active_paths()
+        except Exception as e:
+            log.warning('retention_active_jobs_unavailable', error=str(e))
+            return None
+
+    def _remove(self, path, reason):
+        with self._lock:
+            entry = self._forget(path)
+        if entry is None:
+            return 0
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0  # already removed by another process
+        except OSError as e:
+            log.warning('retention_remove_failed', file=path, error=str(e))
+            return 0
+        cls, size, _ = entry
+        if cls == VARIANT:
+            from .upload_store import get_upload_store
+            get_upload_store(self.upload_root).forget_variant(path)
+        with self._lock:
+            key = f'{cls}:{reason}'
+            self.evictions[key] = self.evictions.get(key, 0) + 1
+            self.bytes_freed += size
+        return 1
+
+    def _evict_step(self, now):
+        """Delete expired files, then LRU files while over quota; at most batch deletions."""
+        protected = self._protected_paths()
+        budget = self.batch
+
+        def removable(path, cls, last_access):
+            if now - last_access < self.min_age:
+                return False
+            if cls == UPLOAD and (protected is None or path in protected):
+                return False
+            return True
+
+        with self._lock:
+            expired = [path for path, (cls, _, last) in self._files.items()
+                       if now - last > self.ttls[cls] and removable(path, cls, last)]
+        for path in expired[:budget]:
+            budget -= self._remove(path, 'ttl')
+
+        with self._lock:
+            if self._bytes <= self.quota_bytes:
+                return
+            target = int(self.quota_bytes * self.low_watermark)
+            candidates = sorted(
+                ((_EVICTION_RANK[cls], last, path) for path, (cls, _, last) in self._files.items()
+                 if cls in _EVICTION_RANK and removable(path, cls, last)),
+            )
+        for _, _, path in candidates:
+            if budget <= 0:
+                break
+            with self._lock:
+                if self._bytes <= target:
+                    break
+            budget -= self._remove(path, 'quota')
+
+        with self._lock:
+            if self._bytes > target and budget <= 0:
+                self._wakeup.set()  # more to evict: continue without waiting a full interval
+            elif self._bytes > self.quota_bytes:
+                log.warning('storage_over_quota', used_bytes=self._bytes, quota_bytes=self.quota_bytes)
+
+    def sweep(self):
+        """Run one incremental retention step."""
+        start = time.perf_counter()
+        self._scan_step()
+        self._evict_step(time.time())
+        self.last_sweep = time.time()
+        self.last_sweep_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    # -- background thread -------------------------------------------------------
+
+    def start(self):
+        """Start the sweep thread of this process (once; never in spawned child processes)."""
+        if self._thread is not None or multiprocessing.parent_process() is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='storage-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                self.sweep()
+            except Exception as e:
+                log.error('retention_sweep_failed', error=str(e), exc_info=True)
+            # Keep scanning without pause until the first full scan has indexed everything
+            if self._scan is not None and self._scans_completed == 0:
+                continue
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def stats(self):
+        """Return usage per class, quota and eviction counters."""
+        with self._lock:
+            usage = {}
+            for cls, size, _ in self._files.values():
+                files, total = usage.get(cls, (0, 0))
+                usage[cls] = (files + 1, total + size)
+            return {
+                'used_bytes': self._bytes,
+                'quota_bytes': self.quota_bytes,
+                'used_ratio': round(self._bytes / self.quota_bytes, 3) if self.quota_bytes else None,
+                'files': len(self._files),
+                'usage': {cls: {'files': files, 'bytes': total} for cls, (files, total) in sorted(usage.items())},
+                'evictions': dict(sorted(self.evictions.items())),
+                'bytes_freed': self.bytes_freed,
+                'scans_completed': self._scans_completed,
+                'scan_in_progress': self._scan is not None,
+                'last_sweep': self.last_sweep,
+                'last_sweep_ms': self.last_sweep_ms,
+            }
+
+
+# Shared per-process manager; its thread is started by app.py
+storage_manager = StorageManager()
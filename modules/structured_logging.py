@@ -0,0 +1,327 @@
+"""
+Structured Logging Module
+=========================
+
+FUNCTION: Emits leveled, structured log events through a queue drained by a background thread.
+
+RESPONSIBILITIES:
+- Provide event loggers (get_logger) whose calls take an event name and fields
+- Redact bulky or sensitive values (form payloads, uploads, long strings) before they
+  leave the calling thread
+- Sample chatty events at per-event rates (Config.LOG_SAMPLING)
+- Hand records to a bounded queue; one listener thread formats them as JSON lines
+  (or key=value text) and writes them to stdout and, when configured, a rotating file
+- Report queued and dropped records for /health
+
+KEY FUNCTIONS:
+- get_logger(): Event logger for a module, e.g. log = get_logger(__name__)
+- configure_logging(): Attaches the queue to the Flask app logger, optionally adds a rotating log file
+- logging_stats(): Queue depth, dropped records and configuration
+
+FEATURES:
+- Below the configured level (Config.LOG_LEVEL) a call costs one cached level check;
+  field values are only redacted and copied when the event is emitted
+- Formatting and I/O happen on the listener thread; a full queue drops records
+  (counted) instead of blocking a request
+- Events inside a request carry its method and path
+- JSON lines look like
+    {"ts": "2024-05-29T10:12:03.412Z", "level": "info", "logger": "type_c.routes",
+     "event": "gallery_inserted", "images": 7, "method": "POST", "path": "/type-c/generate"}
+
+Structured logging utilities for the Training Report Generator.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from werkzeug.datastructures import FileStorage, MultiDict
+
+sys.path.append('..')
+from config import Config
+
+ROOT_LOGGER = 'report_generator'
+
+_SENSITIVE = ('password', 'secret', 'token', 'csrf')
+_REDACTED = '[redacted]'
+_MAX_DEPTH = 3
+
+
+def _parse_sampling(spec):
+    """'gallery_processed=0.1,chart_rendered=0.05' -> {event: rate}."""
+    rates = {}
+    for part in (spec or '').split(','):
+        event, _, rate = part.partition('=')
+        if event.strip() and rate.strip():
+            rates[event.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+_sample_rates = _parse_sampling(Config.LOG_SAMPLING)
+
+
+# -- redaction ---------------------------------------------------------------------
+
+def _truncate(text):
+    limit = Config.LOG_MAX_VALUE
+    if len(text) <= limit:
+        return text
+    return f'{text[:limit]}...(+{len(text) - limit} chars)'
+
+
+def redact(value, depth=0):
+    """Return a small, JSON-friendly copy of value: long strings, big collections and uploads summarized."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return _truncate(value)
+    if isinstance(value, bytes):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, FileStorage):
+        return {'filename': value.filename, 'content_type': value.mimetype}
+    if depth >= _MAX_DEPTH:
+        return _truncate(repr(value))
+    if isinstance(value, MultiDict):
+        value = value.to_dict(flat=False)
+    if isinstance(value, Mapping):
+        limit = Config.LOG_MAX_ITEMS
+        items = list(value.items())
+        redacted = {}
+        for key, item in items[:limit]:
+            key = str(key)
+            redacted[key] = _REDACTED if any(word in key.lower() for word in _SENSITIVE) else redact(item, depth + 1)
+        if len(items) > limit:
+            redacted['...'] = f'+{len(items) - limit} fields'
+        return redacted
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        limit = Config.LOG_MAX_ITEMS
+        if len(items) == 1:
+            return redact(items[0], depth + 1)  # form fields are lists of one value
+        redacted = [redact(item, depth + 1) for item in items[:limit]]
+        if len(items) > limit:
+            redacted.append(f'+{len(items) - limit} items')
+        return redacted
+    return _truncate(str(value))
+
+
+# -- event loggers -------------------------------------------------------------------
+
+class EventLogger:
+    """Leveled structured events: log.info('gallery_inserted', images=7)."""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _emit(self, level, event, fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = fields.pop('sample_rate', None)
+        if rate is None:
+            rate = _sample_rates.get(event, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+        exc_info = fields.pop('exc_info', None)
+        if exc_info is True:
+            exc_info = sys.exc_info()
+        fields = {name: redact(value) for name, value in fields.items()}
+        _add_request_context(fields)
+        caller = sys._getframe(2)
+        record = self._logger.makeRecord(self._logger.name, level, caller.f_code.co_filename, caller.f_lineno,
+                                         event, (), exc_info, caller.f_code.co_name)
+        record.event_fields = fields
+        self._logger.handle(record)
+
+    def is_enabled(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def debug(self, event, **fields):
+        self._emit(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._emit(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._emit(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._emit(logging.ERROR, event, fields)
+
+
+def _add_request_context(fields):
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return
+    if has_request_context():
+        fields.setdefault('method', request.method)
+        fields.setdefault('path', request.path)
+
+
+# -- formatting (listener thread) -----------------------------------------------------
+
+def _timestamp(record):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z'
+
+
+def _exception_text(formatter, record):
+    """The traceback of a record: already formatted by the queue handler, or formatted now."""
+    if record.exc_text:
+        return record.exc_text
+    return formatter.formatException(record.exc_info) if record.exc_info else None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'ts': _timestamp(record),
+            'level': record.levelname.lower(),
+            'logger': record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + '.') else record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'event_fields', {}))
+        if record.levelno >= logging.WARNING:
+            entry['at'] = f'{record.pathname}:{record.lineno}'
+        exception = _exception_text(self, record)
+        if exception:
+            entry['exception'] = exception
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable one-line records for terminals: time, level, event and key=value fields."""
+
+    def format(self, record):
+        fields = ' '.join(f'{name}={json.dumps(value, default=str, ensure_ascii=False)}'
+                          for name, value in getattr(record, 'event_fields', {}).items())
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} {record.getMessage()}"
+        if fields:
+            line = f'{line} {fields}'
+        exception = _exception_text(self, record)
+        if exception:
+            line = f'{line}\n{exception}'
+        return line
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Enqueue records (fields are already redacted); drop them when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        """
+        Resolve on the calling thread what must not cross to the listener, as the stdlib
+        handler does: merge args into the message and format exc_info into exc_text (a
+        live traceback keeps its frames alive). The event fields stay structured.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of raising queue.Full."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # the listener thread is draining the queue
+
+
+# -- setup -----------------------------------------------------------------------------
+
+_lock = threading.Lock()
+_queue = None
+_handler = None
+_listener = None
+_file_handler = None
+
+
+def _formatter():
+    return TextFormatter() if Config.LOG_FORMAT == 'text' else JsonFormatter()
+
+
+def _start():
+    """Create the queue, its handler and the listener thread (once per process)."""
+    global _queue, _handler, _listener
+    with _lock:
+        if _listener is not None:
+            return
+        _queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        _handler = _DroppingQueueHandler(_queue)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_formatter())
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(logging.getLevelName(Config.LOG_LEVEL.upper()))
+        root.addHandler(_handler)
+        root.propagate = False
+        _listener = _Listener(_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)  # flush what is queued at exit
+
+
+def get_logger(name):
+    """Event logger for a module (its name is shown without the package prefix)."""
+    _start()
+    short = name.rsplit('.', 2)
+    short = '.'.join(short[-2:]) if name.startswith('trainings.') else short[-1]
+    return EventLogger(logging.getLogger(f'{ROOT_LOGGER}.{short}'))
+
+
+def configure_logging(app=None, log_file=None):
+    """
+    Route the Flask app logger through the queue, and write every event to a rotating
+    log file as well when log_file is given.
+    """
+    global _file_handler
+    _start()
+    if app is not None and _handler not in app.logger.handlers:
+        from flask.logging import default_handler
+        app.logger.removeHandler(default_handler)  # it writes to stderr inline
+        app.logger.addHandler(_handler)
+        app.logger.setLevel(logging.getLogger(ROOT_LOGGER).level)
+    if log_file:
+        with _lock:
+            if _file_handler is not None:
+                return
+            _file_handler = RotatingFileHandler(log_file, maxBytes=Config.LOG_FILE_MAX_BYTES, backupCount=Config.LOG_FILE_BACKUPS)
+            _file_handler.setFormatter(JsonFormatter())
+            # The listener thread iterates its handlers: stop it (queued records are written
+            # first), add the file, restart; records logged meanwhile wait in the queue
+            _listener.stop()
+            _listener.handlers = _listener.handlers + (_file_handler,)
+            _listener.start()
+
+
+def logging_stats():
+    """Return queue depth, dropped records and the logging configuration."""
+    return {
+        'level': Config.LOG_LEVEL.upper(),
+        'format': Config.LOG_FORMAT,
+        'queued': _queue.qsize() if _queue is not None else 0,
+        'dropped': _handler.dropped if _handler is not None else 0,
+        'sampled_events': _sample_rates,
+        'file': _file_handler.baseFilename if _file_handler is not None else None,
+    }
@@ -0,0 +1,206 @@
+"""
+Word Template Cache Module
+==========================
+
+FUNCTION: In-process registry of parsed Word templates with cheap per-request cloning.
+
+RESPONSIBILITIES:
+- Parse each .docx template once per process instead of on every submission
+- Detect template changes on disk (mtime/size, confirmed by content hash)
+- Hand every request its own deep copy of the parsed package and XML tree
+- Share immutable media/binary parts between the template and its clones
+- Report cache hit/miss counts and clone vs. cold load timings
+- Keep the raw template archive so unchanged parts can be copied on save
+
+KEY FUNCTIONS:
+- load_template(): Returns a private, editable Document for a template path
+- load_template_with_anchors(): Same, plus an AnchorIndex remapped onto the clone
+- TemplateRegistry.stats(): Hit/miss counters and average clone/load times
+
+FEATURES:
+- Thread-safe: concurrent requests can clone the same template; a cold parse only
+  holds that template's lock, so lookups of other cached templates are not blocked
+- Clones never touch the cached master package, so edits cannot leak
+- The master is kept as a bare package (no python-docx proxies are ever
+  created on it), so cached proxies cannot end up pointing at detached copies
+- Binary parts (images, fonts, theme blobs) are immutable bytes and are
+  shared by reference across clones rather than re-read from the zip
+
+Template cache utilities for Word document generation.
+"""
+import copy
+import hashlib
+import io
+import os
+import threading
+import time
+
+from docx import Document
+from docx.opc.part import XmlPart
+
+from .anchor_index import AnchorIndex
+from .package_writer import PackageSource
+from .instrumentation import instrumented
+
+
+def _file_digest(data):
+    """Return the SHA-256 hex digest of the given bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class _TemplateEntry:
+    """A parsed master package plus the file identity it was loaded from."""
+
+    def __init__(self, path, package, source, digest, mtime_ns, size):
+        self.path = path
+        self.package = package
+        self.source = source
+        self.digest = digest
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.anchor_positions = None
+        self._master_parts = None
+
+    def master_parts(self):
+        """
+        Return {partname: blob} of the pristine template, used to detect unchanged parts.
+        XML parts map to None: their edits are tracked (package_writer.mark_dirty), not compared.
+        """
+        if self._master_parts is None:
+            self._master_parts = {part.partname: None if isinstance(part, XmlPart) else part.blob
+                                  for part in self.package.iter_parts()}
+        return self._master_parts
+
+
+class TemplateRegistry:
+    """Caches parsed templates and returns deep copies for each request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._path_locks = {}  # template path -> lock held while it is read and parsed
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._clone_count = 0
+        self._clone_seconds = 0.0
+        self._load_count = 0
+        self._load_seconds = 0.0
+
+    def get_document(self, template_path):
+        """Return a private copy of the template at template_path."""
+        return self._clone(self._get_entry(os.path.abspath(template_path)))
+
+    def get_document_with_anchors(self, template_path):
+        """Return a private copy of the template and its remapped AnchorIndex."""
+        entry = self._get_entry(os.path.abspath(template_path))
+        document = self._clone(entry)
+
+        positions = entry.anchor_positions
+        if positions is None:
+            # First use of this template: index the pristine clone and keep the positions
+            anchors = AnchorIndex.build(document)
+            entry.anchor_positions = anchors.positions()
+            return document, anchors
+        return document, AnchorIndex.from_positions(document, positions)
+
+    def get_entry(self, template_path):
+        """Return the cached entry (master package, digest) for a template."""
+        return self._get_entry(os.path.abspath(template_path))
+
+    def _clone(self, entry):
+        start = time.perf_counter()
+        package = copy.deepcopy(entry.package)
+        document = package.main_document_part.document
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._clone_count += 1
+            self._clone_seconds += elapsed
+        return document
+
+    def _get_entry(self, path):
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._fresh_entry(path, stat)
+            if entry is not None:
+                return entry
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+
+        # Read and parse under this template's own lock: lookups of other templates go on
+        with path_lock:
+            with self._lock:
+                entry = self._fresh_entry(path, stat)  # loaded by another thread meanwhile
+                if entry is not None:
+                    return entry
+                entry = self._entries.get(path)
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = _file_digest(data)
+            if entry is not None and digest == entry.digest:
+                # mtime/size changed but the content did not: no reparse
+                with self._lock:
+                    entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+                    self.hits += 1
+                return entry
+
+            start = time.perf_counter()
+            document = Document(io.BytesIO(data))
+            elapsed = time.perf_counter() - start
+            new_entry = _TemplateEntry(path, document.part.package, PackageSource(data), digest,
+                                       stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                if entry is not None:
+                    self.reloads += 1
+                self.misses += 1
+                self._load_seconds += elapsed
+                self._load_count += 1
+                self._entries[path] = new_entry
+            return new_entry
+
+    def _fresh_entry(self, path, stat):
+        """Return the cached entry if the file's mtime/size still match (counted as a hit); call with _lock held."""
+        entry = self._entries.get(path)
+        if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+            self.hits += 1
+            return entry
+        return None
+
+    def clear(self):
+        """Drop all cached templates (they are reparsed on next use)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache counters and average clone vs. cold load times in ms."""
+        with self._lock:
+            avg_clone = (self._clone_seconds / self._clone_count * 1000) if self._clone_count else None
+            avg_load = (self._load_seconds / self._load_count * 1000) if self._load_count else None
+            lookups = self.hits + self.misses
+            return {
+                'templates': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'hit_ratio': (self.hits / lookups) if lookups else None,
+                'avg_clone_ms': avg_clone,
+                'avg_cold_load_ms': avg_load,
+                'clone_speedup': (avg_load / avg_clone) if avg_clone and avg_load else None,
+            }
+
+
+# Shared per-process registry used by the training routes
+template_registry = TemplateRegistry()
+
+
+@instrumented('template_load')
+def load_template(template_path):
+    """Return an editable Document for template_path, parsed at most once per process."""
+    return template_registry.get_document(template_path)
+
+
+@instrumented('template_load')
+def load_template_with_anchors(template_path):
+    """Return (Document, AnchorIndex) for template_path; anchors are indexed once per template."""
+    return template_registry.get_document_with_anchors(template_path)
@@ -0,0 +1,512 @@
+"""
+Content-Addressed Upload Store Module
+=====================================
+
+FUNCTION: Stores each uploaded file once by content digest and caches derived image variants.
+
+RESPONSIBILITIES:
+- Ingest multipart file parts as they arrive: hash them (SHA-256), check the
+  image magic number, keep them in memory up to Config.UPLOAD_SPILL_THRESHOLD
+  and write larger ones straight into the store as <digest>.<ext>
+- Enforce per-file and per-request upload limits while the body is parsed
+- Deduplicate re-uploads of the same photo across report regenerations
+- Cache resized/normalized variants per (digest, target size, quality)
+- Bound the variant cache by total bytes (LRU) and age (TTL)
+- Report dedup and variant cache statistics (hit ratio, bytes saved, evictions)
+
+KEY FUNCTIONS:
+- get_upload_store(): Shared store for Config.UPLOAD_FOLDER
+- UploadStore.receive(): Reads a FileStorage into an Upload (in memory, or spilled when large)
+- UploadStore.save(): Streams a FileStorage into the store and returns its path
+- UploadStore.get_variant(): Returns a cached variant, building it on a miss
+- StreamingUploadRequest: Flask request class that ingests file parts into the store while parsing
+- IngestStream: Writable file part that hashes, sniffs and spills as bytes arrive
+- UploadStore.stats(): Dedup and variant cache counters
+
+FEATURES:
+- Memory per file part is bounded by the spill threshold, whatever the upload size
+- Oversized files, too many files or too many bytes abort the parse with 413;
+  content that is not an allowed image type aborts it with 415
+- Uploads are never read or copied a second time: the route gets the digest and
+  bytes (or stored path) computed while the request body was parsed
+- Writes go to a temporary file first and are renamed into place atomically,
+  so concurrent workers never see partial files
+- Variants are indexed in memory, rebuilt from the variants directory on start
+- Variants identical to the original are not written; the original upload is used
+- A freshly built variant is handed back from memory; the variants directory is
+  only read on a cache hit, and the hit is opened at once, so evicting the file
+  before it is embedded cannot fail the report
+- The names of originals that are their own variant share the variants' TTL and
+  are bounded LRU
+
+Upload storage utilities for the Training Report Generator.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.utils import secure_filename
+
+import sys
+sys.path.append('..')
+from config import Config
+from .retention import storage_manager
+
+_CHUNK_SIZE = 1024 * 1024
+_DIGEST_LENGTH = 64  # hex length of a SHA-256 digest
+_MAX_PASSTHROUGH = 10000  # remembered originals that are their own variant (LRU, like the variants)
+
+
+# Magic numbers of the accepted image formats -> (stored extension, names in Config.ALLOWED_EXTENSIONS)
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg', {'jpg', 'jpeg'}),
+    (b'\x89PNG\r\n\x1a\n', '.png', {'png'}),
+    (b'GIF87a', '.gif', {'gif'}),
+    (b'GIF89a', '.gif', {'gif'}),
+)
+_SNIFF_LENGTH = max(len(magic) for magic, _, _ in _IMAGE_SIGNATURES)
+
+
+def _sniff_image(data):
+    """Return (extension, extension names) for the image magic number of data, or None."""
+    for magic, ext, names in _IMAGE_SIGNATURES:
+        if data.startswith(magic):
+            return ext, names
+    return None
+
+
+def _image_extension(data):
+    """Return the file extension matching the image magic number of data."""
+    match = _sniff_image(data)
+    return match[0] if match else '.img'
+
+
+class Upload:
+    """An uploaded file: its content digest and either its bytes (in memory) or its stored path."""
+
+    __slots__ = ('filename', 'digest', 'size', 'data', 'path')
+
+    def __init__(self, filename, digest, size, data=None, path=None):
+        self.filename = filename
+        self.digest = digest
+        self.size = size
+        self.data = data
+        self.path = path
+
+    def source(self):
+        """Return a readable source for Pillow and add_picture(): a fresh BytesIO, or the stored path."""
+        return io.BytesIO(self.data) if self.data is not None else self.path
+
+
+class IngestLimits:
+    """Per-request upload limits, counted across all file parts of one request body."""
+
+    def __init__(self, max_file_size=None, max_files=None, max_total_size=None, allowed_extensions=None):
+        self.max_file_size = max_file_size if max_file_size is not None else Config.UPLOAD_MAX_FILE_SIZE
+        self.max_files = max_files if max_files is not None else Config.UPLOAD_MAX_FILES
+        self.max_total_size = max_total_size if max_total_size is not None else Config.UPLOAD_MAX_TOTAL_SIZE
+        self.allowed_extensions = allowed_extensions if allowed_extensions is not None else Config.ALLOWED_EXTENSIONS
+        self.files = 0
+        self.total_size = 0
+        self.streams = []
+
+    def abort(self, error):
+        """Discard every part ingested so far and raise error."""
+        for stream in self.streams:
+            stream.close()
+        raise error
+
+
+class IngestStream(io.RawIOBase):
+    """
+    Container Werkzeug writes one multipart file part into. The digest, size and
+    image type are computed as bytes arrive; the part is kept in memory up to the
+    spill threshold and then written to a temporary file inside the upload store.
+    """
+
+    def __init__(self, store, limits, filename=None, spill_threshold=None):
+        super().__init__()
+        self.store = store
+        self.limits = limits
+        self.filename = filename
+        self.spill_threshold = spill_threshold if spill_threshold is not None else Config.UPLOAD_SPILL_THRESHOLD
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.image_type = None
+        self._header = b''
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._tmp_path = None
+        self._upload = None
+        limits.streams.append(self)
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        if not data:
+            return 0
+        limits = self.limits
+        if self.size == 0:
+            limits.files += 1
+            if limits.files > limits.max_files:
+                limits.abort(RequestEntityTooLarge(f'more than {limits.max_files} files in one request'))
+        self.size += len(data)
+        limits.total_size += len(data)
+        if self.size > limits.max_file_size:
+            limits.abort(RequestEntityTooLarge(
+                f"'{self.filename}' is larger than {limits.max_file_size / (1024 * 1024):.3g}MB"))
+        if limits.total_size > limits.max_total_size:
+            limits.abort(RequestEntityTooLarge(
+                f'more than {limits.max_total_size / (1024 * 1024):.3g}MB of files in one request'))
+        if self.image_type is None and len(self._header) < _SNIFF_LENGTH:
+            self._header += data[:_SNIFF_LENGTH - len(self._header)]
+            if len(self._header) >= _SNIFF_LENGTH:
+                self._check_type()
+
+        self.digest.update(data)
+        if self._file is None and self.size > self.spill_threshold:
+            # Move what is buffered so far into the store and keep appending there
+            fd, self._tmp_path = tempfile.mkstemp(dir=self.store.root, suffix='.part')
+            self._file = os.fdopen(fd, 'wb+')
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        (self._file or self._buffer).write(data)
+        return len(data)
+
+    def _check_type(self):
+        match = _sniff_image(self._header)
+        if match is None or not (match[1] & self.limits.allowed_extensions):
+            self.limits.abort(UnsupportedMediaType(
+                f"'{self.filename}' is not a supported image ({', '.join(sorted(self.limits.allowed_extensions))})"))
+        self.image_type = match[0]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Werkzeug rewinds the container once the part is complete: check short files now
+        if self.size and self.image_type is None:
+            self._check_type()
+        return (self._file or self._buffer).seek(offset, whence)
+
+    def tell(self):
+        return (self._file or self._buffer).tell()
+
+    def read(self, size=-1):
+        return (self._file or self._buffer).read(size)
+
+    def readinto(self, buffer):
+        return (self._file or self._buffer).readinto(buffer)
+
+    def to_upload(self, persist=False):
+        """Return the Upload of this part; persist=True stores in-memory parts in the store as well."""
+        if self._upload is not None and (self._upload.path is not None or not persist):
+            return self._upload
+        digest = self.digest.hexdigest()
+        ext = os.path.splitext(secure_filename(self.filename or ''))[1].lower()
+        if self._file is None and not persist:
+            self._upload = Upload(self.filename, digest, self.size, data=self._buffer.getvalue())
+            self.store._count_in_memory()
+            return self._upload
+        if self._file is None:
+            fd, self._tmp_path = tempfile.mkstemp(dir=self.store.root, suffix='.part')
+            with os.fdopen(fd, 'wb') as out:
+                out.write(self._buffer.getbuffer())
+        else:
+            self._file.flush()
+        path = self.store._commit(self._tmp_path, digest, ext, self.size)
+        self._tmp_path = None
+        self._upload = Upload(self.filename, digest, self.size,
+                              data=self._upload.data if self._upload is not None else None, path=path)
+        return self._upload
+
+    def close(self):
+        if self.closed:
+            return
+        if self._file is not None:
+            self._file.close()
+        if self._tmp_path is not None and os.path.exists(self._tmp_path):
+            # Never handed to the store (unused part, or an aborted request)
+            os.remove(self._tmp_path)
+        self._buffer = None
+        super().close()
+
+
+class StreamingUploadRequest(Request):
+    """Flask request that ingests file parts into the upload store while the body is parsed."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limits = self.__dict__.get('_ingest_limits')
+        if limits is None:
+            limits = self.__dict__['_ingest_limits'] = IngestLimits()
+        return IngestStream(get_upload_store(), limits, filename=filename)
+
+
+class UploadStore:
+    """Content-addressed storage for uploads plus a bounded cache of derived variants."""
+
+    def __init__(self, root, variant_max_bytes=None, variant_ttl=None):
+        self.root = root
+        self.variants_dir = os.path.join(root, 'variants')
+        self.variant_max_bytes = variant_max_bytes if variant_max_bytes is not None else Config.VARIANT_CACHE_MAX_BYTES
+        self.variant_ttl = variant_ttl if variant_ttl is not None else Config.VARIANT_CACHE_TTL
+        os.makedirs(self.variants_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._variants = OrderedDict()  # name -> (path, size, last_access); oldest first
+        self._variant_bytes = 0
+        self._passthrough = OrderedDict()  # variant name -> last access, where the original is its own variant
+
+        self.uploads = 0
+        self.in_memory = 0
+        self.dedup_hits = 0
+        self.bytes_saved = 0
+        self.variant_hits = 0
+        self.variant_misses = 0
+        self.variant_evictions = 0
+        self._load_variant_index()
+
+    def _load_variant_index(self):
+        entries = []
+        for name in os.listdir(self.variants_dir):
+            if name.endswith('.part'):
+                continue
+            path = os.path.join(self.variants_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+        for mtime, key, path, size in sorted(entries):
+            self._variants[key] = (path, size, mtime)
+            self._variant_bytes += size
+
+    # -- originals ---------------------------------------------------------
+
+    def receive(self, file, spill_threshold=None):
+        """
+        Read a FileStorage into an Upload (or None for an empty slot). Files up to
+        spill_threshold (default Config.UPLOAD_SPILL_THRESHOLD) stay in memory;
+        larger ones are streamed into the store.
+        """
+        if isinstance(file, Upload):
+            return file  # already stored (pre-uploaded in chunks)
+        if not file or not file.filename:
+            return None
+        if isinstance(file.stream, IngestStream):
+            return file.stream.to_upload()
+        threshold = spill_threshold if spill_threshold is not None else Config.UPLOAD_SPILL_THRESHOLD
+
+        digest = hashlib.sha256()
+        chunks = []
+        size = 0
+        while True:
+            chunk = file.stream.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > threshold:
+                return self._spill(file, digest, chunks, size)
+
+        self._count_in_memory()
+        return Upload(file.filename, digest.hexdigest(), size, data=b''.join(chunks))
+
+    def _count_in_memory(self):
+        with self._lock:
+            self.uploads += 1
+            self.in_memory += 1
+
+    def save(self, file):
+        """Stream a FileStorage into the store and return the stored file path (or None)."""
+        if not file or not file.filename:
+            return None
+        if isinstance(file.stream, IngestStream):
+            return file.stream.to_upload(persist=True).path
+        return self._spill(file, hashlib.sha256(), [], 0).path
+
+    def _spill(self, file, digest, chunks, size):
+        """Write already-read chunks plus the rest of file into the store; returns an Upload."""
+        ext = os.path.splitext(secure_filename(file.filename))[1].lower()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                while True:
+                    chunk = file.stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            hexdigest = digest.hexdigest()
+            path = self._commit(tmp_path, hexdigest, ext, size)
+            return Upload(file.filename, hexdigest, size, path=path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _commit(self, tmp_path, digest, ext, size):
+        """Move a fully written temporary file to its content address."""
+        final_path = os.path.join(self.root, f'{digest}{ext}')
+        with self._lock:
+            self.uploads += 1
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+                storage_manager.touch(final_path)  # keep recently used uploads fresh for retention
+                self.dedup_hits += 1
+                self.bytes_saved += size
+            else:
+                os.replace(tmp_path, final_path)
+                storage_manager.track(final_path, size)
+        return final_path
+
+    @staticmethod
+    def digest_for(path):
+        """Return the content digest of a stored upload (hashing it if not content-addressed)."""
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if len(stem) == _DIGEST_LENGTH and all(c in '0123456789abcdef' for c in stem):
+            return stem
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    # -- variants ----------------------------------------------------------
+
+    def get_variant(self, digest, size, quality, build):
+        """
+        Return the variant of the upload with the given digest for (size, quality):
+        the cached file opened for reading on a hit, a BytesIO when it was just built,
+        or None when the original upload is its own variant. On a miss, build() is
+        called and must return the variant bytes, or None when the original can be
+        used as-is. The caller closes the returned stream.
+        """
+        name = f'{digest}_{size[0]}x{size[1]}_q{quality}'
+        now = time.time()
+
+        with self._lock:
+            last = self._passthrough.get(name)
+            if last is not None and now - last <= self.variant_ttl:
+                self._passthrough[name] = now
+                self._passthrough.move_to_end(name)
+                self.variant_hits += 1
+                return None
+            entry = self._variants.get(name)
+            if entry is not None and now - entry[2] <= self.variant_ttl:
+                # Opened under the lock: the open file stays readable if eviction or
+                # retention removes it before the picture is embedded
+                try:
+                    variant = open(entry[0], 'rb')
+                except OSError:
+                    variant = None
+                if variant is not None:
+                    self._variants[name] = (entry[0], entry[1], now)
+                    self._variants.move_to_end(name)
+                    self.variant_hits += 1
+                    storage_manager.touch(entry[0])
+                    return variant
+            if entry is not None:
+                self._drop_variant(name)
+            self.variant_misses += 1
+
+        data = build()
+        if data is None:
+            with self._lock:
+                self._passthrough[name] = now
+                self._passthrough.move_to_end(name)
+                self._evict(now)
+            return None
+
+        path = os.path.join(self.variants_dir, f'{name}{_image_extension(data)}')
+        fd, tmp_path = tempfile.mkstemp(dir=self.variants_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if name in self._variants:
+                self._drop_variant(name, remove_file=False)
+            self._variants[name] = (path, len(data), now)
+            self._variant_bytes += len(data)
+            self._evict(now)
+        storage_manager.track(path, len(data))
+        return io.BytesIO(data)
+
+    def forget_variant(self, path):
+        """Drop a variant file removed by storage retention from the index."""
+        name = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            entry = self._variants.get(name)
+            if entry is not None and entry[0] == path:
+                self._drop_variant(name, remove_file=False)
+
+    def _drop_variant(self, name, remove_file=True):
+        path, size, _ = self._variants.pop(name)
+        self._variant_bytes -= size
+        if remove_file:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self, now):
+        """Drop expired variants, then least recently used ones until under budget (passthrough names alike)."""
+        expired = [name for name, (_, _, last) in self._variants.items() if now - last > self.variant_ttl]
+        for name in expired:
+            self._drop_variant(name)
+            self.variant_evictions += 1
+        while self._passthrough and (now - next(iter(self._passthrough.values())) > self.variant_ttl
+                                     or len(self._passthrough) > _MAX_PASSTHROUGH):
+            self._passthrough.popitem(last=False)
+        while self._variant_bytes > self.variant_max_bytes and len(self._variants) > 1:
+            self._drop_variant(next(iter(self._variants)))
+            self.variant_evictions += 1
+
+    def stats(self):
+        """Return dedup and variant cache statistics."""
+        with self._lock:
+            lookups = self.variant_hits + self.variant_misses
+            return {
+                'uploads': self.uploads,
+                'in_memory': self.in_memory,
+                'dedup_hits': self.dedup_hits,
+                'bytes_saved': self.bytes_saved,
+                'variants': len(self._variants),
+                'passthrough_variants': len(self._passthrough),
+                'variant_bytes': self._variant_bytes,
+                'variant_max_bytes': self.variant_max_bytes,
+                'variant_hits': self.variant_hits,
+                'variant_misses': self.variant_misses,
+                'variant_hit_ratio': (self.variant_hits / lookups) if lookups else None,
+                'variant_evictions': self.variant_evictions,
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_upload_store(root=None):
+    """Return the shared UploadStore for root (default Config.UPLOAD_FOLDER)."""
+    root = os.path.abspath(root or Config.UPLOAD_FOLDER)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            os.makedirs(root, exist_ok=True)
+            store = _stores[root] = UploadStore(root)
+        return store
@@ -0,0 +1,96 @@
+"""
+Startup Warm-Up Module
+======================
+
+FUNCTION: Optionally loads heavy, lazily imported dependencies after boot, off the request path.
+
+RESPONSIBILITIES:
+- Start the chart worker processes (or import matplotlib/numpy when charts render in-process)
+- Parse every Word template into the template cache
+- Run all of this in a background thread so the worker can serve requests immediately
+- Record how long each warm-up step took
+
+KEY FUNCTIONS:
+- warm_up(): Runs every warm-up step on the calling thread and returns their timings
+- start_background_warm_up(): Runs warm_up() in a daemon thread (once per process)
+- warm_up_status(): Whether warm-up ran, and the per-step timings in ms
+
+FEATURES:
+- Enabled with Config.WARMUP_ON_STARTUP; without it everything still loads on first use
+- A failing step is reported and skipped; it never prevents the app from starting
+- Requests arriving during warm-up simply load what they need themselves
+
+Warm-up utilities for the Training Report Generator.
+"""
+import glob
+import multiprocessing
+import os
+import threading
+import time
+
+import sys
+sys.path.append('..')
+from config import Config
+from .structured_logging import get_logger
+
+log = get_logger(__name__)
+
+_status = {'state': 'not started', 'timings_ms': {}, 'errors': {}}
+_started = False
+_start_lock = threading.Lock()
+
+
+def _warm_charts():
+    from .chart_service import chart_service
+    if chart_service.workers > 0:
+        chart_service.warm_up()
+    else:
+        from .chart_processing import load_pyplot
+        load_pyplot()
+
+
+def _warm_templates():
+    from .template_cache import template_registry
+    for path in glob.glob(os.path.join(Config.TEMPLATE_FOLDER, '**', '*.docx'), recursive=True):
+        template_registry.get_entry(path)
+
+
+_STEPS = (
+    ('charts', _warm_charts),
+    ('templates', _warm_templates),
+)
+
+
+def warm_up():
+    """Run every warm-up step and return {step: milliseconds}."""
+    _status['state'] = 'running'
+    for name, step in _STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            _status['errors'][name] = str(e)
+            log.warning('warm_up_step_failed', step=name, error=str(e))
+        _status['timings_ms'][name] = round((time.perf_counter() - start) * 1000, 1)
+    _status['state'] = 'done'
+    log.info('warm_up_finished', timings_ms=_status['timings_ms'])
+    return dict(_status['timings_ms'])
+
+
+def start_background_warm_up():
+    """Start warm_up() in a daemon thread, at most once per process."""
+    global _started
+    if multiprocessing.parent_process() is not None:
+        # Spawned chart workers re-import the app module; they must not warm up (or spawn) again
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+def warm_up_status():
+    """Return the warm-up state and per-step timings."""
+    return {'state': _status['state'], 'timings_ms': dict(_status['timings_ms']),
+            'errors': dict(_status['errors'])}
@@ -0,0 +1,108 @@
+"""
+Shared Worker Pool Module
+=========================
+
+FUNCTION: Process-wide, bounded thread pool for the CPU/IO heavy image work of a request.
+
+RESPONSIBILITIES:
+- Own a single pool sized by Config.IMAGE_WORKERS, shared by all requests
+- Fan a list of work items out to the pool and hand the futures back in order
+- Run work inline on the calling thread when the pool size is 1
+- Report pool size and submitted/completed task counts
+
+KEY FUNCTIONS:
+- get_image_pool(): Returns the shared ThreadPoolExecutor (created on first use)
+- submit_all(): Submits func(item, *args) for every item, returning futures in item order
+- gather(): Waits for a list of futures and returns their results in order
+- run_inline(): Runs a call on the current thread, returning a completed Future
+- pool_stats(): Configured size and task counters
+
+FEATURES:
+- Threads, not processes: uploads are FileStorage streams that cannot be pickled,
+  and Pillow releases the GIL while decoding, resizing and encoding
+- Bounded: never more than Config.IMAGE_WORKERS images are processed at once,
+  however many requests are in flight
+- Exceptions raised by a task are re-raised by gather() on the request thread
+
+Worker pool utilities for the Training Report Generator.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import sys
+sys.path.append('..')
+from config import Config
+
+_pool = None
+_pool_lock = threading.Lock()
+_submitted = 0
+_completed = 0
+
+
+def get_image_pool():
+    """Return the shared image preparation pool, or None when running sequentially."""
+    global _pool
+    if Config.IMAGE_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config.IMAGE_WORKERS, thread_name_prefix='image-prep')
+        return _pool
+
+
+def run_inline(func, item, *args):
+    """Run func on the calling thread and wrap the outcome in a completed Future."""
+    future = Future()
+    try:
+        future.set_result(func(item, *args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _count_completed(_future):
+    global _completed
+    with _pool_lock:
+        _completed += 1
+
+
+def submit_all(func, items, *args):
+    """Submit func(item, *args) for each item and return the futures in item order."""
+    global _submitted
+    pool = get_image_pool()
+    futures = []
+    for item in items:
+        with _pool_lock:
+            _submitted += 1
+        if pool is None:
+            future = run_inline(func, item, *args)
+        else:
+            future = pool.submit(func, item, *args)
+        future.add_done_callback(_count_completed)
+        futures.append(future)
+    return futures
+
+
+def gather(futures, timeout=None):
+    """Return the results of futures in order, re-raising the first task exception."""
+    return [future.result(timeout) for future in futures]
+
+
+def pool_stats():
+    """Return the configured pool size and task counters."""
+    with _pool_lock:
+        return {
+            'workers': Config.IMAGE_WORKERS,
+            'submitted': _submitted,
+            'completed': _completed,
+            'pending': _submitted - _completed,
+        }
+
+
+def shutdown(wait=True):
+    """Stop the shared pool (a new one is created on next use)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
@@ -0,0 +1,117 @@
+"""
+Low-Level XML Traversal Module
+==============================
+
+FUNCTION: Fast document traversal directly on the w:p / w:r / w:t lxml elements.
+
+RESPONSIBILITIES:
+- Enumerate every story of a document (body, headers, footers) in one pass
+- Yield paragraphs at any depth: nested tables, text boxes and content controls
+- Read and rewrite run text without building python-docx proxy objects
+- Enumerate table cells without resolving the table grid (no row.cells)
+
+KEY FUNCTIONS:
+- iter_stories() / iter_story_elements(): Body followed by each unique header/footer (with its part)
+- iter_all_paragraphs(): Every w:p in every story, in document order
+- runs_text(): Joined run text of a paragraph (same as ''.join(run.text for run in paragraph.runs))
+- set_runs_text(): Rewrites a paragraph's runs the same way find_and_replace_text always has
+- iter_cells() / cell_text(): w:tc elements and their text (same as _Cell.text)
+
+FEATURES:
+- Produces exactly the text python-docx would (tabs, breaks, hyphens included)
+- Paragraph lists are materialized before yielding so callers may edit freely
+- No XPath compilation per call; only element iteration and tag comparison
+
+XML traversal utilities for Word document manipulation.
+"""
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+
+W_P = qn('w:p')
+W_R = qn('w:r')
+W_TC = qn('w:tc')
+W_TBL = qn('w:tbl')
+W_FLD_CHAR = qn('w:fldChar')
+
+# Run children that contribute to run.text (python-docx maps each via str())
+_RUN_TEXT_TAGS = frozenset(qn(tag) for tag in (
+    'w:t', 'w:tab', 'w:br', 'w:cr', 'w:noBreakHyphen', 'w:ptab',
+))
+
+_STORY_RELTYPES = (RT.HEADER, RT.FOOTER)
+
+
+def iter_stories(doc, headers_footers=True):
+    """Yield (part, root element): the body first, then each unique header and footer part."""
+    yield doc.part, doc.element.body
+    if not headers_footers:
+        return
+    seen = set()
+    for rel in doc.part.rels.values():
+        if rel.is_external or rel.reltype not in _STORY_RELTYPES:
+            continue
+        part = rel.target_part
+        if id(part) in seen:
+            continue
+        seen.add(id(part))
+        yield part, part.element
+
+
+def iter_story_elements(doc, headers_footers=True):
+    """Yield the body element, then the root element of each header and footer part."""
+    for _, root in iter_stories(doc, headers_footers):
+        yield root
+
+
+def iter_all_paragraphs(doc, headers_footers=True):
+    """Yield every w:p element in the document, including nested tables and text boxes."""
+    for root in iter_story_elements(doc, headers_footers):
+        # Materialize first: rewriting a paragraph may detach nested text box content
+        yield from list(root.iter(W_P))
+
+
+def iter_body_paragraphs(doc):
+    """Yield the top-level body w:p elements (the same set as doc.paragraphs)."""
+    return doc.element.body.iterchildren(W_P)
+
+
+def run_text(r):
+    """Return the text of a w:r element, identical to Run.text."""
+    return ''.join(str(child) for child in r if child.tag in _RUN_TEXT_TAGS)
+
+
+def runs_text(p):
+    """Return the joined text of the direct runs of a w:p element."""
+    return ''.join(run_text(r) for r in p.iterchildren(W_R))
+
+
+def set_runs_text(p, text):
+    """
+    Replace the run text of a w:p element: every run is emptied and the first
+    run receives the new text (a run is added if the paragraph has none).
+    Run formatting of the first run is kept.
+    """
+    runs = list(p.iterchildren(W_R))
+    for r in runs:
+        r.text = ''
+    if runs:
+        runs[0].text = text
+    else:
+        r = p.add_r()
+        if text:
+            r.text = text
+
+
+def iter_cells(root):
+    """Yield every w:tc element below root (nested tables included), in document order."""
+    return root.iter(W_TC)
+
+
+def cell_text(tc):
+    """Return the text of a w:tc element, identical to _Cell.text."""
+    return '\n'.join(p.text for p in tc.iterchildren(W_P))
+
+
+def has_field_char(r):
+    """Return True if a w:r element contains a field character at any depth."""
+    return next(r.iter(W_FLD_CHAR), None) is not None
@@ -0,0 +1,153 @@
+// Training Report Generator - Resumable image pre-upload
+//
+// Forms with a data-upload-url attribute upload each picked image straight away,
+// in chunks, to the /uploads API. When an image is stored, its file input loses
+// its name and a hidden "<field>_id" input carries the upload id instead, so the
+// final form submission only sends ids and captions. If a pre-upload fails for
+// good, the file input keeps its name and the image is sent with the form as before.
+
+(function() {
+    const MAX_RETRIES = 5;
+    const pending = new Set();
+
+    class FatalUploadError extends Error {}
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function readJson(response) {
+        try {
+            return await response.json();
+        } catch (error) {
+            return {};
+        }
+    }
+
+    // Upload one file in chunks; returns the upload id once the server has stored it
+    async function uploadFile(uploadUrl, file, onProgress) {
+        const created = await fetch(uploadUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        let state = await readJson(created);
+        if (!created.ok) {
+            throw new FatalUploadError(state.error || `Upload refused (${created.status})`);
+        }
+
+        let failures = 0;
+        while (!state.complete) {
+            const end = Math.min(state.offset + state.chunk_size, file.size);
+            try {
+                const response = await fetch(`${uploadUrl}/${state.id}?offset=${state.offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(state.offset, end)
+                });
+                const body = await readJson(response);
+                if (response.ok || response.status === 409) {
+                    // 409: the server already has a different offset; continue from there
+                    state = body;
+                    failures = 0;
+                    onProgress(state.offset / state.size);
+                    continue;
+                }
+                if (response.status < 500) {
+                    throw new FatalUploadError(body.error || `Upload refused (${response.status})`);
+                }
+                throw new Error(body.error || `Server error (${response.status})`);
+            } catch (error) {
+                if (error instanceof FatalUploadError || ++failures > MAX_RETRIES) {
+                    throw error;
+                }
+                await sleep(1000 * Math.pow(2, failures - 1));
+                // Ask the server how much it has received, and resume from there
+                try {
+                    const response = await fetch(`${uploadUrl}/${state.id}`);
+                    if (response.ok) {
+                        state = await response.json();
+                    }
+                } catch (statusError) {
+                    // Still offline: retry the same chunk
+                }
+            }
+        }
+        return state.id;
+    }
+
+    function statusElement(input) {
+        let status = input.parentElement.querySelector('.upload-status');
+        if (!status) {
+            status = document.createElement('div');
+            status.className = 'upload-status';
+            status.style.fontSize = '0.85em';
+            status.style.color = '#6c757d';
+            status.style.marginTop = '0.3em';
+            input.insertAdjacentElement('afterend', status);
+        }
+        return status;
+    }
+
+    function idInputFor(input, field) {
+        let idInput = input.parentElement.querySelector(`input[type="hidden"][name="${field}_id"]`);
+        if (!idInput) {
+            idInput = document.createElement('input');
+            idInput.type = 'hidden';
+            idInput.name = `${field}_id`;
+            input.insertAdjacentElement('afterend', idInput);
+        }
+        return idInput;
+    }
+
+    function startUpload(form, input) {
+        const field = input.dataset.field || (input.dataset.field = input.name);
+        const file = input.files[0];
+        const idInput = idInputFor(input, field);
+        const status = statusElement(input);
+        const token = {};
+
+        // Until the pre-upload finishes, the file still travels with the form
+        input.name = field;
+        idInput.value = '';
+        input.uploadToken = token;
+        status.textContent = 'Uploading 0%';
+
+        const task = uploadFile(form.dataset.uploadUrl, file, fraction => {
+            if (input.uploadToken === token) {
+                status.textContent = `Uploading ${Math.round(fraction * 100)}%`;
+            }
+        }).then(uploadId => {
+            if (input.uploadToken !== token) {
+                return;  // another file was picked meanwhile
+            }
+            idInput.value = uploadId;
+            input.removeAttribute('name');
+            status.textContent = 'Uploaded ✓';
+        }).catch(error => {
+            console.warn(`Pre-upload of ${file.name} failed:`, error);
+            if (input.uploadToken === token) {
+                status.textContent = 'Will be uploaded with the form';
+            }
+        }).finally(() => {
+            pending.delete(task);
+        });
+        pending.add(task);
+    }
+
+    document.addEventListener('change', function(e) {
+        const input = e.target;
+        const form = input.form;
+        if (input.type !== 'file' || !form || !form.dataset.uploadUrl || !input.files.length) {
+            return;
+        }
+        startUpload(form, input);
+    });
+
+    window.ChunkedUploads = {
+        // Number of pre-uploads still running
+        pending: () => pending.size,
+        // Resolves when every running pre-upload has finished (or given up)
+        whenDone: () => Promise.all([...pending])
+    };
+})();
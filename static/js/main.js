@@ -88,6 +88,17 @@ document.addEventListener('DOMContentLoaded', function() {
             // Get generate button once
             const generateBtn = document.querySelector('button[type="submit"]');
             
+            // Wait for images still pre-uploading, then submit again
+            if (window.ChunkedUploads && ChunkedUploads.pending()) {
+                e.preventDefault();
+                if (generateBtn) {
+                    generateBtn.disabled = true;
+                    generateBtn.textContent = 'Finishing uploads...';
+                }
+                ChunkedUploads.whenDone().then(() => multiStepForm.requestSubmit());
+                return false;
+            }
+            
             // Always allow form submission and handle button state properly
             if (generateBtn) {
                 console.log('📤 Submitting form - disabling button temporarily');
@@ -0,0 +1,19 @@
+"""
+Cold import budget of the application module: `import app` must stay fast and
+must not import matplotlib or numpy (they load when a chart is first drawn).
+The budget (seconds, fastest of 3 fresh interpreters) can be raised on slow
+machines with IMPORT_TIME_BUDGET.
+"""
+import os
+
+from benchmarks.import_time import measure_import
+
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', 1.0))
+
+
+def test_import_app_is_lazy_and_within_budget():
+    # No storage sweeps against the checkout
+    env = dict(os.environ, STORAGE_RETENTION_ENABLED='false')
+    best, loaded = measure_import(runs=3, env=env)
+    assert loaded == [], f'imported eagerly: {", ".join(loaded)}'
+    assert best <= IMPORT_TIME_BUDGET, f'import app took {best:.3f}s (budget {IMPORT_TIME_BUDGET}s)'
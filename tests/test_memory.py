@@ -0,0 +1,19 @@
+"""
+Memory bound of a large Type C report: generating MEMORY_CHECK_IMAGES photos (half
+in the gallery, the rest over the annexures) in a fresh process must not grow its
+peak RSS by more than MEMORY_CEILING_MB over a warmed-up process (see
+benchmarks/check_memory.py, which also checks that time per image stays linear).
+"""
+import os
+
+from benchmarks.check_memory import measure
+
+MEMORY_CHECK_IMAGES = int(os.environ.get('MEMORY_CHECK_IMAGES', 100))
+MEMORY_CEILING_MB = float(os.environ.get('MEMORY_CEILING_MB', 80.0))
+
+
+def test_large_report_peak_rss_growth_within_ceiling():
+    [result] = measure([MEMORY_CHECK_IMAGES])
+    growth = result['rss_peak_growth_mb']
+    assert growth <= MEMORY_CEILING_MB, (
+        f"{result['images']} images: peak RSS growth {growth} MB > ceiling {MEMORY_CEILING_MB} MB")
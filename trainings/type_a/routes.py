@@ -6,116 +6,157 @@ Routes and logic for Type A (ECBC Compliance) training reports.
 This contains the exact same logic as your current app_clean.py.
 """
 from flask import Blueprint, render_template, request, redirect, url_for
+from werkzeug.exceptions import HTTPException
 import os
 from datetime import datetime
 from docx import Document
 from docx.shared import Inches, Cm
 
 # Import existing modules (no changes needed)
-from modules.document_utils import find_and_replace_text, find_and_replace_image, save_uploaded_file
-from modules.image_processing import insert_gallery_table, get_annexure_images_and_captions, insert_annexure_images
-from modules.form_processing import process_form_data, process_gallery_images
+from modules.document_utils import find_and_replace_text, find_and_replace_text_bulk, find_and_replace_image, save_uploaded_file
+from modules.image_processing import insert_gallery_table, submit_annexure_images, insert_annexure_images
+from modules.form_processing import process_form_data, submit_gallery_images
+from modules.template_cache import load_template_with_anchors, template_registry
+from modules.package_writer import save_document
+from modules.job_queue import job_queue, Submission, no_progress, output_suffix
+from modules.admission import admission_controlled
+from modules.retention import storage_manager
+from modules.structured_logging import get_logger
 from config import Config
 
 # Create Type A blueprint
 type_a_bp = Blueprint('type_a', __name__)
+log = get_logger(__name__)
 
 @type_a_bp.route('/')
 def form():
     """Type A Training form page."""
-    print("📋 Type A form page accessed")
+    log.debug('form_viewed')
     return render_template('type_a/form.html')
 
+def resolve_template_file(form):
+    """Return the Word template path for the template selected in the form."""
+    # Map template numbers to file names
+    template_mapping = {
+        '1': 'templates/type_a/word_templates/word_template_1.docx',  # RRECL
+        '2': 'templates/type_a/word_templates/word_template_2.docx',  # GEDA
+        '3': 'templates/type_a/word_templates/word_template_3.docx',  # HAREDA
+        '4': 'templates/type_a/word_templates/word_template_4.docx',  # UREDA
+        '5': 'templates/type_a/word_templates/word_template_5.docx'   # SDA Odisha
+    }
+    
+    # Get the template file name
+    return template_mapping.get(form.get('selected_template', '1'), 'templates/type_a/word_templates/word_template_1.docx')
+
 @type_a_bp.route('/generate', methods=['POST'])
+@admission_controlled
 def generate_report():
     """Generate Type A training report - EXACT logic from your app_clean.py."""
     try:
-        print("🎯 Type A generate route accessed")
-        print(f"📝 Form data received: {dict(request.form)}")
-        
         # Get the selected template number
         selected_template = request.form.get('selected_template', '1')
         organization = request.form.get('cell_name', 'Unknown')
         
-        print(f"DEBUG: Selected template: {selected_template}")
-        print(f"DEBUG: Organization: {organization}")
-        print(f"DEBUG: All form data keys: {list(request.form.keys())}")
+        template_file = resolve_template_file(request.form)
         
-        # Map template numbers to file names
-        template_mapping = {
-            '1': 'templates/type_a/word_templates/word_template_1.docx',  # RRECL
-            '2': 'templates/type_a/word_templates/word_template_2.docx',  # GEDA
-            '3': 'templates/type_a/word_templates/word_template_3.docx',  # HAREDA
-            '4': 'templates/type_a/word_templates/word_template_4.docx',  # UREDA
-            '5': 'templates/type_a/word_templates/word_template_5.docx'   # SDA Odisha
-        }
-        
-        # Get the template file name
-        template_file = template_mapping.get(selected_template, 'templates/type_a/word_templates/word_template_1.docx')
-        
-        print(f"DEBUG: Using template file: {template_file}")
+        log.info('generate_requested', template=selected_template, organization=organization)
+        log.debug('form_received', form=request.form, template_file=template_file)
         
         # Check if template file exists (use absolute path)
         if not os.path.exists(os.path.abspath(template_file)):
             return f"Error: Template file '{template_file}' not found at {os.path.abspath(template_file)}. Please ensure all template files are present.", 400
         
-        # Load the Word template
-        doc = Document(template_file)
-
-        # Process form data
-        text_replacements = process_form_data(request)
-        
-        # Apply text replacements
-        for placeholder, value in text_replacements.items():
-            if value:
-                find_and_replace_text(doc, placeholder, value)
-
-        # Process gallery images
-        gallery_images_clean, gallery_captions_clean = process_gallery_images(request)
-        
-        # Insert the gallery table if images exist with 2×3 layout (6 images per page)
-        if gallery_images_clean:
-            insert_gallery_table(doc, gallery_images_clean, gallery_captions_clean, 
-                                images_per_row=2, image_width=Cm(8.13))
-
-        # Process annexure images with improved dimensions
-        annexure_placeholders = [
-            ('annexure1', '{{ANNEXURE1_TABLE}}'),
-            ('annexure2', '{{ANNEXURE2_TABLE}}'),
-            ('annexure3', '{{ANNEXURE3_TABLE}}'),
-            ('annexure4', '{{ANNEXURE4_TABLE}}'),
-            ('annexure5', '{{ANNEXURE5_TABLE}}'),
-        ]
-
-        for i, (prefix, placeholder) in enumerate(annexure_placeholders):
-            images, captions = get_annexure_images_and_captions(prefix, request)
-            if images:
-                # Only skip page break for the last annexure (annexure5)
-                is_last_annexure = (i == len(annexure_placeholders) - 1)
-                insert_annexure_images(doc, images, captions, placeholder, 
-                                     image_width=Cm(15), image_height=Cm(20),
-                                     add_final_page_break=not is_last_annexure)
-
-        # Generate output filename
-        event_date = request.form.get('event_date', '').replace('-', '')
-        cell_name = request.form.get('cell_name', '').replace(' ', '_')
-        filename = f"TypeA_{event_date}_{cell_name}_report.docx"
-        output_path = os.path.join(Config.OUTPUT_FOLDER, filename)
+        if Config.ASYNC_JOBS:
+            # Generate in the background; the success page polls the job until the report is ready
+            job_id = job_queue.enqueue('type_a', Submission.from_request(request))
+            return redirect(url_for('type_a.success', job=job_id))
         
-        # Save the document
-        doc.save(output_path)
+        filename = build_report(request)
         
         # After successful generation, redirect to success page
-        return redirect(url_for('type_a.success', filename=os.path.basename(output_path)))
+        return redirect(url_for('type_a.success', filename=filename))
         
+    except HTTPException:
+        # Upload limit and type errors raised while parsing the form (413/415), full job backlog (503)
+        raise
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
+        log.error('generation_failed', error=str(e), exc_info=True)
         return render_template('error.html', error=str(e))
 
+def build_report(submission, progress=no_progress):
+    """Build the Type A report for a submission (the request or a queued Submission); returns the filename."""
+    template_file = resolve_template_file(submission.form)
+    
+    # Annexure sections with improved dimensions
+    annexure_placeholders = [
+        ('annexure1', '{{ANNEXURE1_TABLE}}'),
+        ('annexure2', '{{ANNEXURE2_TABLE}}'),
+        ('annexure3', '{{ANNEXURE3_TABLE}}'),
+        ('annexure4', '{{ANNEXURE4_TABLE}}'),
+        ('annexure5', '{{ANNEXURE5_TABLE}}'),
+    ]
+
+    progress('preparing images', 10)
+    # Start preparing every uploaded image on the shared pool while the document is filled in
+    gallery_batch = submit_gallery_images(submission)
+    annexure_batches = [submit_annexure_images(prefix, submission) for prefix, _ in annexure_placeholders]
+
+    progress('filling template', 25)
+    # Load the Word template (parsed once per process, cloned per request)
+    doc, anchors = load_template_with_anchors(template_file)
+
+    progress('replacing text', 30)
+    # Process form data
+    text_replacements = process_form_data(submission)
+    
+    # Apply all text replacements in a single pass over the document
+    find_and_replace_text_bulk(doc, {
+        placeholder: value for placeholder, value in text_replacements.items() if value
+    })
+
+    progress('inserting gallery', 45)
+    # Insert the gallery images as they are prepared (in upload order), 2×3 layout (6 images per page)
+    insert_gallery_table(doc, gallery_batch.pairs(), None,
+                         images_per_row=2, image_width=Cm(8.13), anchors=anchors)
+
+    progress('inserting annexures', 70)
+    # Insert the annexure images as they are prepared
+    for i, (prefix, placeholder) in enumerate(annexure_placeholders):
+        # Only skip page break for the last annexure (annexure5)
+        is_last_annexure = (i == len(annexure_placeholders) - 1)
+        insert_annexure_images(doc, annexure_batches[i].pairs(), None, placeholder,
+                             image_width=Cm(15), image_height=Cm(20),
+                             add_final_page_break=not is_last_annexure, anchors=anchors)
+
+    # Generate output filename
+    event_date = submission.form.get('event_date', '').replace('-', '')
+    cell_name = submission.form.get('cell_name', '').replace(' ', '_')
+    filename = f"TypeA_{event_date}_{cell_name}{output_suffix(submission)}_report.docx"
+    output_path = os.path.join(Config.OUTPUT_FOLDER, filename)
+    
+    progress('saving', 90)
+    # Save the document, copying unchanged template parts without recompressing
+    save_document(doc, output_path, template=template_registry.get_entry(template_file))
+    storage_manager.track(output_path)
+    
+    return os.path.basename(output_path)
+
+# Queued Type A submissions are generated by build_report
+job_queue.register('type_a', build_report, 'type_a.success')
+
 @type_a_bp.route('/success')
 def success():
     """Display success page with download option."""
     filename = request.args.get('filename')
+    job_id = request.args.get('job')
+    if not filename and job_id:
+        job = job_queue.get(job_id)
+        if job is None:
+            return redirect(url_for('type_a.form'))
+        if job['state'] == 'done':
+            return redirect(url_for('type_a.success', filename=job['result']))
+        # Still generating (or failed): the page polls the job status
+        return render_template('type_a/success.html', job=job, status_url=url_for('job_status', job_id=job_id))
     if not filename:
         return redirect(url_for('type_a.form'))
     
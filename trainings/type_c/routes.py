@@ -6,6 +6,7 @@ Routes and logic for Type C (Professional Development) training reports.
 Handles gallery images and 6 annexure documents with table insertion.
 """
 from flask import Blueprint, render_template, request, redirect, url_for, current_app
+from werkzeug.exceptions import HTTPException
 import os
 import sys
 from datetime import datetime
@@ -14,13 +15,21 @@ from docx.shared import Inches, Cm
 
 # Import existing modules (using sys.path to resolve from parent directory)
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from modules.document_utils import find_and_replace_text, find_and_replace_image, save_uploaded_file
-from modules.image_processing import insert_gallery_table, get_annexure_images_and_captions, insert_annexure_images
-from modules.form_processing import process_form_data, process_gallery_images
-from modules.chart_processing import generate_feedback_charts, insert_charts_in_document
+from modules.document_utils import find_and_replace_text, find_and_replace_text_bulk, find_and_replace_image, save_uploaded_file
+from modules.image_processing import insert_gallery_table, submit_annexure_images, insert_annexure_images
+from modules.form_processing import process_form_data, submit_gallery_images
+from modules.template_cache import load_template_with_anchors, template_registry
+from modules.package_writer import save_document
+from modules.chart_processing import submit_feedback_charts, collect_feedback_charts, insert_charts_in_document
+from modules.job_queue import job_queue, Submission, no_progress, output_suffix
+from modules.admission import admission_controlled
+from modules.retention import storage_manager
+from modules.structured_logging import get_logger
+from config import Config
 
 # Create Type C blueprint
 type_c_bp = Blueprint('type_c', __name__, url_prefix='/type-c')
+log = get_logger(__name__)
 
 def process_type_c_form_data(request):
     """Process Type C specific form data with the exact placeholders provided."""
@@ -203,134 +212,179 @@ def process_type_c_form_data(request):
 @type_c_bp.route('/')
 def form():
     """Type C Training form page."""
-    print("📋 Type C form page accessed")
+    log.debug('form_viewed')
     return render_template('type_c/form.html')
 
+def resolve_template_file(form):
+    """Return the Word template path for the template selected in the form."""
+    # Map template numbers to Type C file names (using absolute paths)
+    base_path = current_app.root_path
+    template_mapping = {
+        '1': os.path.join(base_path, 'templates', 'type_c', 'word_template_1.docx'),
+        '2': os.path.join(base_path, 'templates', 'type_c', 'word_template_2.docx'),
+        '3': os.path.join(base_path, 'templates', 'type_c', 'word_template_3.docx'),
+        '4': os.path.join(base_path, 'templates', 'type_c', 'word_template_4.docx'),
+        '5': os.path.join(base_path, 'templates', 'type_c', 'word_template_5.docx')
+    }
+    
+    # Get the template file name
+    return template_mapping.get(form.get('selected_template', '1'), os.path.join(base_path, 'templates', 'type_c', 'word_template_1.docx'))
+
 @type_c_bp.route('/generate', methods=['POST'])
+@admission_controlled
 def generate_report():
     """Generate Type C training report with gallery and 6 annexures."""
     try:
-        print("🎯 Type C generate route accessed")
-        print(f"📝 Form data received: {dict(request.form)}")
-        
         # Get the selected template number
         selected_template = request.form.get('selected_template', '1')
         organization = request.form.get('cell_name', 'Unknown')
         
-        print(f"DEBUG: Selected template: {selected_template}")
-        print(f"DEBUG: Organization: {organization}")
-        print(f"DEBUG: All form data keys: {list(request.form.keys())}")
-        
-        # Map template numbers to Type C file names (using absolute paths)
-        base_path = current_app.root_path
-        template_mapping = {
-            '1': os.path.join(base_path, 'templates', 'type_c', 'word_template_1.docx'),
-            '2': os.path.join(base_path, 'templates', 'type_c', 'word_template_2.docx'),
-            '3': os.path.join(base_path, 'templates', 'type_c', 'word_template_3.docx'),
-            '4': os.path.join(base_path, 'templates', 'type_c', 'word_template_4.docx'),
-            '5': os.path.join(base_path, 'templates', 'type_c', 'word_template_5.docx')
-        }
+        template_file = resolve_template_file(request.form)
         
-        # Get the template file name
-        template_file = template_mapping.get(selected_template, os.path.join(base_path, 'templates', 'type_c', 'word_template_1.docx'))
-        
-        print(f"DEBUG: Using template file: {template_file}")
+        log.info('generate_requested', template=selected_template, organization=organization)
+        log.debug('form_received', form=request.form, template_file=template_file)
         
         # Check if template file exists (use absolute path)
         if not os.path.exists(os.path.abspath(template_file)):
             return f"Error: Template file '{template_file}' not found at {os.path.abspath(template_file)}. Please ensure all template files are present.", 400
         
-        # Load the Word template
-        doc = Document(template_file)
-
-        # Process Type C specific form data
-        text_replacements = process_type_c_form_data(request)
+        if Config.ASYNC_JOBS:
+            # Generate in the background; the success page polls the job until the report is ready
+            job_id = job_queue.enqueue('type_c', Submission.from_request(request))
+            return redirect(url_for('type_c.success', job=job_id))
         
-        # Apply text replacements
-        for placeholder, value in text_replacements.items():
-            if value:
-                find_and_replace_text(doc, placeholder, value)
-
-        # Process gallery images
-        gallery_images_clean, gallery_captions_clean = process_gallery_images(request)
+        filename = build_report(request)
         
-        print(f"🖼️ Gallery images processed: {len(gallery_images_clean)} images")
-        print(f"📝 Gallery captions: {gallery_captions_clean}")
+        # After successful generation, redirect to success page
+        return redirect(url_for('type_c.success', filename=filename))
         
-        # Insert the gallery table if images exist with 2×3 layout (6 images per page)
-        if gallery_images_clean:
-            print("🏗️ Inserting gallery table...")
-            insert_gallery_table(doc, gallery_images_clean, gallery_captions_clean, 
-                                images_per_row=2, image_width=Cm(8.13))
-            print("✅ Gallery table inserted")
-        else:
-            print("⚠️ No gallery images to insert")
-            # Remove the {{GALLERY_TABLE}} placeholder even if no images
-            find_and_replace_text(doc, '{{GALLERY_TABLE}}', 'No gallery images uploaded')
+    except HTTPException:
+        # Upload limit and type errors raised while parsing the form (413/415), full job backlog (503)
+        raise
+    except Exception as e:
+        log.error('generation_failed', error=str(e), exc_info=True)
+        return render_template('error.html', error=str(e))
 
-        # Generate and insert feedback charts
-        try:
-            print("📊 Generating feedback charts...")
-            chart_paths = generate_feedback_charts(request)
-            insert_charts_in_document(doc, chart_paths)
-            print(f"✅ Feedback charts processed: {len(chart_paths)} charts generated")
-        except ImportError as e:
-            print(f"⚠️ Chart generation requires matplotlib: {str(e)}")
-            # Handle both old and new placeholder formats
-            find_and_replace_text(doc, '{{FEEDBACK_CHARTS}}', 'Chart generation unavailable - matplotlib not installed')
-            for i in range(1, 5):
-                find_and_replace_text(doc, f'{{{{FEEDBACK_CHART_{i}}}}}', 'Chart generation unavailable')
-        except Exception as e:
-            print(f"❌ Error generating charts: {str(e)}")
-            # Handle both old and new placeholder formats
-            find_and_replace_text(doc, '{{FEEDBACK_CHARTS}}', f'Error generating charts: {str(e)}')
-            for i in range(1, 5):
-                find_and_replace_text(doc, f'{{{{FEEDBACK_CHART_{i}}}}}', f'Error generating charts')
+def build_report(submission, progress=no_progress):
+    """Build the Type C report for a submission (the request or a queued Submission); returns the filename."""
+    template_file = resolve_template_file(submission.form)
+    
+    # Annexure sections for Type C (6 annexures)
+    annexure_placeholders = [
+        ('annexure1', '{{ANNEXURE1_TABLE}}'),  # Annexure-I (Flyer of the Training)
+        ('annexure2', '{{ANNEXURE2_TABLE}}'),  # Annexure-II (Attendance Sheet)
+        ('annexure3', '{{ANNEXURE3_TABLE}}'),  # Annexure-III (Feedback Form)
+        ('annexure4', '{{ANNEXURE4_TABLE}}'),  # Annexure-IV (Registration Form)
+        ('annexure5', '{{ANNEXURE5_TABLE}}'),  # Annexure-V (Registration Form continued)
+        ('annexure6', '{{ANNEXURE6_TABLE}}'),  # Annexure-VI (Brochure)
+    ]
 
-        # Process annexure images for Type C (6 annexures)
-        annexure_placeholders = [
-            ('annexure1', '{{ANNEXURE1_TABLE}}'),  # Annexure-I (Flyer of the Training)
-            ('annexure2', '{{ANNEXURE2_TABLE}}'),  # Annexure-II (Attendance Sheet)
-            ('annexure3', '{{ANNEXURE3_TABLE}}'),  # Annexure-III (Feedback Form)
-            ('annexure4', '{{ANNEXURE4_TABLE}}'),  # Annexure-IV (Registration Form)
-            ('annexure5', '{{ANNEXURE5_TABLE}}'),  # Annexure-V (Registration Form continued)
-            ('annexure6', '{{ANNEXURE6_TABLE}}'),  # Annexure-VI (Brochure)
-        ]
+    progress('preparing images', 10)
+    # Start preparing every uploaded image on the shared pool while the document is filled in
+    gallery_batch = submit_gallery_images(submission)
+    annexure_batches = [submit_annexure_images(prefix, submission) for prefix, _ in annexure_placeholders]
 
-        for i, (prefix, placeholder) in enumerate(annexure_placeholders):
-            images, captions = get_annexure_images_and_captions(prefix, request)
-            if images:
-                print(f"📎 Processing {placeholder} with {len(images)} images")
-                # Only skip page break for the last annexure (annexure6)
-                is_last_annexure = (i == len(annexure_placeholders) - 1)
-                insert_annexure_images(doc, images, captions, placeholder, 
-                                     image_width=Cm(15), image_height=Cm(20),
-                                     add_final_page_break=not is_last_annexure)
-            else:
-                print(f"⚠️ No images for {placeholder}, removing placeholder")
-                # Remove placeholder if no images
-                find_and_replace_text(doc, placeholder, 'No images uploaded for this annexure')
+    # Start rendering the feedback charts in the chart worker processes
+    try:
+        chart_job = submit_feedback_charts(submission)
+        chart_error = None
+    except Exception as e:
+        chart_job, chart_error = None, e
 
-        # Generate output filename for Type C
-        start_date = request.form.get('start_date', request.form.get('event_date', '')).replace('-', '')
-        cell_name = request.form.get('cell_name', '').replace(' ', '_')
-        filename = f"TypeC_{start_date}_{cell_name}_report.docx"
-        output_path = os.path.join(current_app.root_path, 'output', filename)
-        
-        # Save the document
-        doc.save(output_path)
-        
-        # After successful generation, redirect to success page
-        return redirect(url_for('type_c.success', filename=os.path.basename(output_path)))
-        
+    progress('filling template', 25)
+    # Load the Word template (parsed once per process, cloned per request)
+    doc, anchors = load_template_with_anchors(template_file)
+
+    progress('replacing text', 30)
+    # Process Type C specific form data
+    text_replacements = process_type_c_form_data(submission)
+    
+    # Apply all text replacements in a single pass over the document
+    find_and_replace_text_bulk(doc, {
+        placeholder: value for placeholder, value in text_replacements.items() if value
+    })
+
+    # Placeholder fallback texts, applied together in one pass before saving
+    placeholder_fallbacks = {}
+
+    progress('inserting gallery', 45)
+    # Insert the gallery images as they are prepared (in upload order), 2×3 layout (6 images per page)
+    gallery_images = insert_gallery_table(doc, gallery_batch.pairs(), None,
+                                          images_per_row=2, image_width=Cm(8.13), anchors=anchors)
+    if gallery_images:
+        log.debug('gallery_inserted', images=gallery_images)
+    else:
+        log.debug('gallery_empty')
+        # Remove the {{GALLERY_TABLE}} placeholder even if no images
+        placeholder_fallbacks['{{GALLERY_TABLE}}'] = 'No gallery images uploaded'
+
+    progress('inserting charts', 60)
+    # Generate and insert feedback charts
+    try:
+        if chart_error is not None:
+            raise chart_error
+        charts = collect_feedback_charts(chart_job)
+        insert_charts_in_document(doc, charts, anchors=anchors)
+        log.debug('charts_inserted', charts=len(charts))
+    except ImportError as e:
+        log.warning('charts_unavailable', error=str(e))
+        # Handle both old and new placeholder formats
+        placeholder_fallbacks['{{FEEDBACK_CHARTS}}'] = 'Chart generation unavailable - matplotlib not installed'
+        for i in range(1, 5):
+            placeholder_fallbacks[f'{{{{FEEDBACK_CHART_{i}}}}}'] = 'Chart generation unavailable'
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        return render_template('error.html', error=str(e))
+        log.error('charts_failed', error=str(e))
+        # Handle both old and new placeholder formats
+        placeholder_fallbacks['{{FEEDBACK_CHARTS}}'] = f'Error generating charts: {str(e)}'
+        for i in range(1, 5):
+            placeholder_fallbacks[f'{{{{FEEDBACK_CHART_{i}}}}}'] = 'Error generating charts'
+
+    progress('inserting annexures', 75)
+    # Insert the annexure images as they are prepared
+    for i, (prefix, placeholder) in enumerate(annexure_placeholders):
+        # Only skip page break for the last annexure (annexure6)
+        is_last_annexure = (i == len(annexure_placeholders) - 1)
+        images = insert_annexure_images(doc, annexure_batches[i].pairs(), None, placeholder,
+                                        image_width=Cm(15), image_height=Cm(20),
+                                        add_final_page_break=not is_last_annexure, anchors=anchors)
+        if images:
+            log.debug('annexure_inserted', placeholder=placeholder, images=images)
+        else:
+            log.debug('annexure_empty', placeholder=placeholder)
+            # Remove placeholder if no images
+            placeholder_fallbacks[placeholder] = 'No images uploaded for this annexure'
+
+    find_and_replace_text_bulk(doc, placeholder_fallbacks)
+
+    # Generate output filename for Type C
+    start_date = submission.form.get('start_date', submission.form.get('event_date', '')).replace('-', '')
+    cell_name = submission.form.get('cell_name', '').replace(' ', '_')
+    filename = f"TypeC_{start_date}_{cell_name}{output_suffix(submission)}_report.docx"
+    output_path = os.path.join(Config.OUTPUT_FOLDER, filename)
+    
+    progress('saving', 90)
+    # Save the document, copying unchanged template parts without recompressing
+    save_document(doc, output_path, template=template_registry.get_entry(template_file))
+    storage_manager.track(output_path)
+    
+    return os.path.basename(output_path)
+
+# Queued Type C submissions are generated by build_report
+job_queue.register('type_c', build_report, 'type_c.success')
 
 @type_c_bp.route('/success')
 def success():
     """Display success page with download option."""
     filename = request.args.get('filename')
+    job_id = request.args.get('job')
+    if not filename and job_id:
+        job = job_queue.get(job_id)
+        if job is None:
+            return redirect(url_for('type_c.form'))
+        if job['state'] == 'done':
+            return redirect(url_for('type_c.success', filename=job['result']))
+        # Still generating (or failed): the page polls the job status
+        return render_template('type_c/success.html', job=job, status_url=url_for('job_status', job_id=job_id))
     if not filename:
         return redirect(url_for('type_c.form'))
     